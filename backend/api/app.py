@@ -1,14 +1,10 @@
 import os
-from flask import Flask, jsonify
+from typing import Optional
+from flask import Flask, jsonify, current_app
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 from routes import api as api_bp
-from api.core.llm_manager import LLMManager
-from api.core.memory_manager import MemoryManager
-from api.core.system_manager import SystemManager
-from api.core.workflow_manager import WorkflowManager
-from api.core.agent_manager import AgentManager
-from api.core.analytics_manager import AnalyticsManager
-from api.core.rag_pipeline import RAGPipeline
+from core.services import ServiceContainer
 from utils.config import Config
 import logging
 
@@ -16,31 +12,42 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+services = LocalProxy(lambda: current_app.extensions['services'])
 
-# Initialize managers
-config = Config()
-memory_manager = MemoryManager(
-    cache_dir=config.MODEL_CACHE_DIR,
-    offload_dir=config.MODEL_WEIGHTS_OFFLOAD_DIR
-)
-system_manager = SystemManager()
-llm_manager = LLMManager(memory_manager=memory_manager, system_manager=system_manager)
-workflow_manager = WorkflowManager(llm_manager)
-agent_manager = AgentManager(llm_manager)
-analytics_manager = AnalyticsManager()
-rag_pipeline = RAGPipeline()
+def create_app(container: Optional[ServiceContainer] = None, start: bool = True) -> Flask:
+    """Create the Flask app; all blueprints share the managers of one service container.
 
-# Register blueprints
-app.register_blueprint(api_bp)
+    With `start` the model and the default collection begin loading in the
+    background, and the app serves requests (/live, /ready, dashboard) meanwhile.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    container = container or ServiceContainer(Config())
+    app.extensions['services'] = container
+    
+    # Register blueprints
+    app.register_blueprint(api_bp)
+    app.add_url_rule('/live', 'liveness', liveness, methods=['GET'])
+    app.add_url_rule('/ready', 'readiness', readiness, methods=['GET'])
+    app.add_url_rule('/health', 'health_check', health_check, methods=['GET'])
+    app.add_url_rule('/system/cleanup', 'system_cleanup', system_cleanup, methods=['POST'])
+    if start:
+        container.start()
+    return app
+
+# Liveness: o processo responde; não consulta nenhum manager
+def liveness():
+    return jsonify({"status": "alive"}), 200
+
+# Readiness: modelo carregado e aquecido, coleção padrão e encoder carregados
+def readiness():
+    status = services.readiness()
+    return jsonify(status), 200 if status['ready'] else 503
 
 # Health check
-@app.route('/health', methods=['GET'])
 def health_check():
     try:
-        system_status = system_manager.get_system_status()
+        system_status = services.system_manager.get_system_status()
         return jsonify({
             "status": "healthy",
             "system": system_status
@@ -50,14 +57,13 @@ def health_check():
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 # System cleanup
-@app.route('/system/cleanup', methods=['POST'])
 def system_cleanup():
     try:
         # Tentar limpar o sistema
-        cleanup_result = system_manager.cleanup_system()
+        cleanup_result = services.system_manager.cleanup_system()
         
         # Obter o status atualizado do sistema
-        system_status = system_manager.get_system_status()
+        system_status = services.system_manager.get_system_status()
         
         return jsonify({
             "status": "success",
@@ -73,6 +79,8 @@ def system_cleanup():
         }), 500
 
 if __name__ == '__main__':
+    # `flask run` (FLASK_APP=app.py) encontra e chama create_app sozinho
+    app = create_app()
     # Usar configurações do .env
     port = int(os.environ.get('API_PORT', 3000))
     host = os.environ.get('API_HOST', '0.0.0.0')
@@ -6,6 +6,17 @@ from .workflow_manager import WorkflowManager
 from .agent_manager import AgentManager
 from .analytics_manager import AnalyticsManager
 from .rag_pipeline import RAGPipeline
+from .collection_manager import CollectionManager
+from .answer_pipeline import AnswerPipeline
+from .semantic_cache import SemanticCache
+from .context_compressor import ContextCompressor
+from .services import ServiceContainer
+from .generation_scheduler import GenerationScheduler
+from .prefix_cache import PrefixCache
+from .admission import AdmissionController
+from .speculative import SpeculativeDecoder
+from .response_cache import ResponseCache
+from .generation_params import GenerationParams
 
 __all__ = [
     'LLMManager',
@@ -14,5 +25,16 @@ __all__ = [
     'WorkflowManager',
     'AgentManager',
     'AnalyticsManager',
-    'RAGPipeline'
+    'RAGPipeline',
+    'CollectionManager',
+    'AnswerPipeline',
+    'SemanticCache',
+    'ContextCompressor',
+    'ServiceContainer',
+    'GenerationScheduler',
+    'PrefixCache',
+    'AdmissionController',
+    'SpeculativeDecoder',
+    'ResponseCache',
+    'GenerationParams'
 ]
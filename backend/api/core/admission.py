@@ -0,0 +1,193 @@
+import math
+import time
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when an operation cannot be admitted; carries the HTTP status and Retry-After"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class Permit:
+    """Capacity held by an admitted operation until release() (or the end of the with block)"""
+
+    def __init__(self, controller: 'AdmissionController', operation: str, cost: float):
+        self.controller = controller
+        self.operation = operation
+        self.cost = cost
+        self.admitted_at = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+    def wrap(self, events: Iterator[Any]) -> Iterator[Any]:
+        """Hold the permit while a stream is consumed, releasing it when it ends or is closed"""
+        try:
+            yield from events
+        finally:
+            close = getattr(events, 'close', None)
+            if close is not None:
+                close()
+            self.release()
+
+    def __enter__(self) -> 'Permit':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int, operation: str, cost: float):
+        self.priority = priority
+        self.seq = seq
+        self.operation = operation
+        self.cost = cost
+
+class AdmissionController:
+    """Admission control in front of generation, ingestion and embedding.
+
+    Each operation costs a number of capacity units (estimate_cost); operations run
+    while their total stays within `capacity` and otherwise wait in a bounded queue
+    per priority class, served strictly by priority and first come, first served
+    within a class. A full queue is refused immediately with 429, a wait longer than
+    `max_wait` (or too little free memory) with 503, both with a Retry-After
+    estimated from how long admitted operations have been holding capacity.
+    """
+
+    PRIORITIES = ('interactive', 'normal', 'background')
+
+    def __init__(self, capacity: float = 16, queue_limits: Optional[Dict[str, int]] = None,
+                 max_wait: float = 30.0, min_free_memory: int = 0):
+        self.capacity = capacity
+        self.queue_limits = {'interactive': 32, 'normal': 16, 'background': 4}
+        self.queue_limits.update(queue_limits or {})
+        self.max_wait = max_wait
+        self.min_free_memory = min_free_memory
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+        self.in_flight = 0.0
+        self.running = 0
+        # Tempo médio (EWMA) que uma unidade de custo fica ocupada, para estimar o Retry-After
+        self._seconds_per_unit = 1.0
+        self._memory_checked_at = 0.0
+        self._memory_available: Optional[int] = None
+        self.admitted: Counter = Counter()
+        self.rejected: Counter = Counter()
+        self.waits = {priority: deque(maxlen=512) for priority in self.PRIORITIES}
+
+    def estimate_cost(self, operation: str, tokens: int = 0, nbytes: int = 0) -> float:
+        """Capacity units of an operation: generation by tokens to produce, ingestion by upload size"""
+        if operation == 'generation':
+            cost = 1 + tokens / 512
+        elif operation == 'ingestion':
+            cost = 1 + nbytes / (4 * 1024 * 1024)
+        else:
+            cost = 1.0
+        # Uma operação maior que a capacidade ainda roda, sozinha
+        return min(cost, self.capacity)
+
+    def acquire(self, operation: str, cost: float = 1.0, priority: str = 'normal') -> Permit:
+        """Wait for capacity and return a Permit, or raise AdmissionRejected"""
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        self._check_memory(operation, priority)
+        start = time.perf_counter()
+        with self._cond:
+            queued = [w for w in self._waiters if w.priority == self.PRIORITIES.index(priority)]
+            if not self._waiters and self._fits(cost):
+                return self._admit(operation, cost, priority, start)
+            if len(queued) >= self.queue_limits[priority]:
+                self.rejected[priority] += 1
+                raise AdmissionRejected(
+                    f"Too many queued {priority} requests ({len(queued)})", 429, self._retry_after(cost)
+                )
+            waiter = _Waiter(self.PRIORITIES.index(priority), self._seq, operation, cost)
+            self._seq += 1
+            self._waiters.append(waiter)
+            self._waiters.sort(key=lambda w: (w.priority, w.seq))
+            deadline = start + self.max_wait
+            while not (self._waiters[0] is waiter and self._fits(cost)):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    # O próximo da fila pode caber agora que este saiu
+                    self._cond.notify_all()
+                    self.rejected[priority] += 1
+                    raise AdmissionRejected(
+                        f"Timed out after {self.max_wait:.0f}s waiting for capacity", 503, self._retry_after(cost)
+                    )
+                self._cond.wait(remaining)
+            self._waiters.remove(waiter)
+            permit = self._admit(operation, cost, priority, start)
+            self._cond.notify_all()
+            return permit
+
+    def _fits(self, cost: float) -> bool:
+        return self.in_flight == 0 or self.in_flight + cost <= self.capacity
+
+    def _admit(self, operation: str, cost: float, priority: str, start: float) -> Permit:
+        self.in_flight += cost
+        self.running += 1
+        self.admitted[operation] += 1
+        self.waits[priority].append(time.perf_counter() - start)
+        return Permit(self, operation, cost)
+
+    def _release(self, permit: Permit) -> None:
+        held = time.perf_counter() - permit.admitted_at
+        with self._cond:
+            self.in_flight = max(0.0, self.in_flight - permit.cost)
+            self.running -= 1
+            self._seconds_per_unit = 0.9 * self._seconds_per_unit + 0.1 * held / permit.cost
+            self._cond.notify_all()
+
+    def _retry_after(self, cost: float) -> int:
+        queued_cost = sum(w.cost for w in self._waiters)
+        return max(1, math.ceil(self._seconds_per_unit * (self.in_flight + queued_cost + cost) / self.capacity))
+
+    def _check_memory(self, operation: str, priority: str) -> None:
+        if not self.min_free_memory:
+            return
+        now = time.monotonic()
+        # Amostrado no máximo uma vez por segundo: não consulta o sistema a cada requisição
+        if now - self._memory_checked_at > 1.0:
+            self._memory_available = psutil.virtual_memory().available
+            self._memory_checked_at = now
+        if self._memory_available < self.min_free_memory:
+            with self._cond:
+                self.rejected[priority] += 1
+            logger.warning(f"Rejecting {operation}: {self._memory_available / 1024 ** 3:.1f}GB of memory available")
+            raise AdmissionRejected("Insufficient memory available", 503, 5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for index, priority in enumerate(self.PRIORITIES):
+                waits = sorted(self.waits[priority])
+                classes[priority] = {
+                    'queued': sum(1 for w in self._waiters if w.priority == index),
+                    'queue_limit': self.queue_limits[priority],
+                    'rejected': self.rejected[priority],
+                    'avg_wait_ms': 1000 * sum(waits) / len(waits) if waits else 0.0,
+                    'p95_wait_ms': 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+                }
+            return {
+                'capacity': self.capacity,
+                'in_flight': self.in_flight,
+                'running': self.running,
+                'admitted': dict(self.admitted),
+                'priorities': classes,
+                'max_wait_seconds': self.max_wait
+            }
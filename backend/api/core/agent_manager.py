@@ -1,3 +1,5 @@
+from .generation_params import GenerationParams
+
 class AgentManager:
     def __init__(self, llm_manager):
         self.llm_manager = llm_manager
@@ -15,15 +17,38 @@ class AgentManager:
         return agent
 
     def get_agent(self, agent_id):
-        return self.agents.get(agent_id)
+        # Ids chegam como texto na URL
+        return self.agents.get(int(agent_id) if str(agent_id).isdigit() else agent_id)
+
+    def _params(self, agent, input_data):
+        return GenerationParams.from_dict(
+            input_data, agent.get('config'),
+            {'max_new_tokens': self.llm_manager.config.LLM_MAX_NEW_TOKENS, 'stop': ['\nUser:']}
+        )
+
+    def generation_tokens(self, agent_id, input_data):
+        """Token budget of one execute_agent call (0 for an unknown agent)"""
+        agent = self.get_agent(agent_id)
+        return self._params(agent, input_data).max_new_tokens if agent else 0
 
     def execute_agent(self, agent_id, input_data):
+        """Answer input_data's `input` (or `message`) as the agent, one turn.
+
+        Generation settings come from the request, then the agent's `config`, then
+        the server default; the answer stops at the next "User:" turn by default.
+        """
         agent = self.get_agent(agent_id)
         if not agent:
             return None
         
-        # TODO: Implement real agent execution
+        instructions = agent.get('system_prompt') or agent.get('description') or ''
+        message = input_data.get('input') or input_data.get('message') or ''
+        prompt = f"You are {agent.get('name', 'an assistant')}. {instructions}\n\nUser: {message}\nAssistant:"
+        params = self._params(agent, input_data)
+        result = self.llm_manager.complete(prompt, params)
         return {
-            'result': 'Agent execution placeholder',
-            'status': 'completed'
+            'result': result['text'].strip(),
+            'status': 'completed',
+            'finish_reason': result['finish_reason'],
+            'usage': result['usage']
         }
@@ -0,0 +1,222 @@
+import time
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+from utils.config import Config
+from .rag_pipeline import RAGPipeline, query_batcher_stats, encode_texts
+from .collection_manager import CollectionManager
+from .llm_manager import LLMManager
+from .generation_params import GenerationParams
+from .semantic_cache import SemanticCache
+from .context_compressor import ContextCompressor
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = """Use the context below to answer the question. If the context does not contain the answer, say so.
+
+Context:
+{context}
+
+Question: {question}
+Answer:"""
+
+class AnswerPipeline:
+    """Runs retrieve -> pack -> generate inside the server for a single question"""
+
+    def __init__(self, collections: CollectionManager, llm_manager: LLMManager):
+        self.config = Config()
+        self.collections = collections
+        self.llm_manager = llm_manager
+        self.cache = None
+        if self.config.SEMANTIC_CACHE_ENABLED:
+            self.cache = SemanticCache(
+                threshold=self.config.SEMANTIC_CACHE_THRESHOLD,
+                ttl_seconds=self.config.SEMANTIC_CACHE_TTL,
+                max_entries=self.config.SEMANTIC_CACHE_MAX_ENTRIES
+            )
+        self.compressor = ContextCompressor(encode_texts, self._count_tokens_batch)
+
+    def _count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Count tokens with the LLM tokenizer, or estimate them if it is not loaded"""
+        counted = self.llm_manager.count_tokens(texts) if texts else None
+        if counted is not None:
+            return counted[1]
+        return [max(1, len(text) // 4) for text in texts]
+
+    def pack_context(self, results: List[Dict[str, Any]], max_tokens: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Keep the best ranked chunks that fit into the context token budget"""
+        packed = []
+        used_tokens = 0
+        ranked = sorted(results, key=lambda r: r['score'], reverse=True)
+        # token_count vem da ingestão, em tokens do LLM carregado; só os chunks sem ele são contados agora
+        recounted = iter(self._count_tokens_batch([r['chunk'] for r in ranked if r.get('token_count') is None]))
+        for result in ranked:
+            tokens = result['token_count'] if result.get('token_count') is not None else next(recounted)
+            if used_tokens + tokens > max_tokens:
+                continue
+            packed.append(result)
+            used_tokens += tokens
+        return packed, used_tokens
+
+    def build_prompt(self, question: str, packed: List[Dict[str, Any]]) -> str:
+        context = "\n\n".join(result['chunk'] for result in packed)
+        return PROMPT_TEMPLATE.format(context=context, question=question)
+
+    def _prepare(self, rag_pipeline: RAGPipeline, question: str, top_k: Optional[int],
+                 max_context_tokens: Optional[int], mmr: Optional[bool] = None,
+                 mmr_lambda: Optional[float] = None, compress: Optional[bool] = None) -> Dict[str, Any]:
+        retrieval = rag_pipeline.retrieve(
+            question, top_k or self.config.RAG_ANSWER_TOP_K, mmr=mmr, mmr_lambda=mmr_lambda
+        )
+        timings = dict(retrieval['timings'])
+
+        start = time.perf_counter()
+        packed, context_tokens = self.pack_context(
+            retrieval['results'],
+            max_context_tokens or self.config.RAG_CONTEXT_MAX_TOKENS
+        )
+        timings['pack'] = time.perf_counter() - start
+
+        compression = None
+        if compress if compress is not None else self.config.RAG_COMPRESSION_ENABLED:
+            start = time.perf_counter()
+            model_name = retrieval['embedding_model']
+            packed, compression = self.compressor.compress(
+                retrieval['query_embedding'], packed,
+                min(self.config.RAG_COMPRESSION_MAX_TOKENS, max_context_tokens or self.config.RAG_CONTEXT_MAX_TOKENS),
+                encode=lambda texts: encode_texts(texts, model_name)
+            )
+            context_tokens = compression['compressed_tokens']
+            timings['compress'] = time.perf_counter() - start
+        prompt = self.build_prompt(question, packed)
+
+        return {
+            'retrieval': retrieval,
+            'packed': packed,
+            'context_tokens': context_tokens,
+            'compression': compression,
+            'prompt': prompt,
+            'timings': timings
+        }
+
+    def stream_answer(self, question: str, top_k: Optional[int] = None,
+                      max_context_tokens: Optional[int] = None,
+                      params: Optional[GenerationParams] = None,
+                      use_cache: bool = True,
+                      collection: Optional[str] = None,
+                      mmr: Optional[bool] = None,
+                      mmr_lambda: Optional[float] = None,
+                      compress: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a context event, one event per generated piece of text, then a done event.
+
+        `params` defaults to RAG_ANSWER_MAX_NEW_TOKENS new tokens at the default sampling settings.
+        """
+        start = time.perf_counter()
+        rag_pipeline = self.collections.get(collection)
+        if not rag_pipeline.has_documents():
+            yield {'type': 'error', 'status': 'error', 'code': 'no_documents', 'error': 'No documents indexed'}
+            return
+
+        prepared = self._prepare(rag_pipeline, question, top_k, max_context_tokens, mmr, mmr_lambda, compress)
+        timings = prepared['timings']
+        yield {
+            'type': 'context',
+            'results': prepared['packed'],
+            'context_tokens': prepared['context_tokens']
+        }
+
+        # use_cache=False também dispensa o cache de respostas do LLM (gera de novo)
+        response_cache = None if use_cache else False
+        use_cache = use_cache and self.cache is not None
+        query_embedding = prepared['retrieval']['query_embedding']
+        # O modelo entra na chave: embeddings de modelos diferentes não são comparáveis
+        model_name = prepared['retrieval']['embedding_model']
+        chunk_ids = [f"{result['collection']}/{result['chunk_id']}@{model_name}" for result in prepared['packed']]
+        params = params or GenerationParams(max_new_tokens=self.config.RAG_ANSWER_MAX_NEW_TOKENS)
+        if use_cache:
+            cached = self.cache.lookup(query_embedding, chunk_ids, params.cache_key())
+            if cached:
+                yield {'type': 'token', 'text': cached['answer']}
+                timings.update({'prefill': 0.0, 'decode': 0.0, 'total': time.perf_counter() - start})
+                yield {
+                    'type': 'done',
+                    'status': 'completed',
+                    'finish_reason': cached['finish_reason'],
+                    'cached': True,
+                    'cache_similarity': cached['similarity'],
+                    'timings': timings,
+                    # Mesmas chaves da resposta gerada, com os tokens da geração que foi guardada
+                    'usage': {
+                        'context_tokens': prepared['context_tokens'],
+                        'prompt_tokens': cached['usage'].get('prompt_tokens', 0),
+                        'completion_tokens': cached['usage'].get('completion_tokens', 0)
+                    }
+                }
+                return
+
+        generation_stats = {}
+        pieces = []
+        for text in self.llm_manager.stream_response(
+            prepared['prompt'],
+            params,
+            stats=generation_stats,
+            use_cache=response_cache
+        ):
+            pieces.append(text)
+            yield {'type': 'token', 'text': text}
+
+        timings['prefill'] = generation_stats.get('prefill', 0.0)
+        timings['decode'] = generation_stats.get('decode', 0.0)
+        timings['total'] = time.perf_counter() - start
+        logger.info(f"Answer timings: {timings}")
+
+        usage = {
+            'prompt_tokens': generation_stats.get('prompt_tokens', 0),
+            'completion_tokens': generation_stats.get('completion_tokens', 0)
+        }
+        answer = "".join(pieces).strip()
+        # Respostas cortadas pelo prazo não são guardadas
+        if use_cache and answer and generation_stats.get('finish_reason') != 'deadline':
+            self.cache.store(
+                query_embedding, chunk_ids, answer, timings['prefill'] + timings['decode'], params.cache_key(),
+                finish_reason=generation_stats.get('finish_reason'), usage=usage
+            )
+
+        done = {
+            'type': 'done',
+            'status': 'completed',
+            'finish_reason': generation_stats.get('finish_reason'),
+            'cached': False,
+            'timings': timings,
+            'usage': {'context_tokens': prepared['context_tokens'], **usage}
+        }
+        compression = prepared['compression']
+        if compression is not None:
+            # Custo de prefill por token medido nesta requisição, aplicado aos tokens removidos
+            compression['prefill_seconds_saved'] = self.compressor.record_prefill(
+                compression, timings['prefill'], generation_stats.get('prompt_tokens', 0)
+            )
+            done['compression'] = compression
+        yield done
+
+    def answer(self, question: str, **kwargs) -> Dict[str, Any]:
+        """Run the full pipeline and return the answer with per-stage timings"""
+        answer = []
+        response = {'query': question, 'results': []}
+        for event in self.stream_answer(question, **kwargs):
+            if event['type'] == 'context':
+                response['results'] = event['results']
+            elif event['type'] == 'token':
+                answer.append(event['text'])
+            else:
+                response.update({k: v for k, v in event.items() if k != 'type'})
+        response['answer'] = "".join(answer).strip()
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'semantic_cache': self.cache.get_stats() if self.cache else {'enabled': False},
+            'collections': self.collections.get_stats(),
+            'query_embedding': query_batcher_stats(),
+            'context_compression': self.compressor.get_stats()
+        }
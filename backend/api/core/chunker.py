@@ -0,0 +1,121 @@
+import os
+import copy
+import mmap
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Caracteres que encerram uma frase ou parágrafo: preferidos como fim de chunk
+BOUNDARY_CHARS = frozenset('.!?;:\n')
+# Textos grandes são tokenizados em segmentos (cortados em quebras de linha) com encode_batch
+SEGMENT_CHARS = 4096
+
+def read_text_windows(path: str, window_bytes: int = 4 * 1024 * 1024) -> Iterator[str]:
+    """Yield the UTF-8 text of a file in pieces of about `window_bytes`, read through mmap.
+
+    Pieces end after a line break when the window has one (else after a space, else
+    on a character boundary), so no token or multi-byte character is cut in half.
+    """
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        start = 0
+        while start < size:
+            end = min(start + window_bytes, size)
+            if end < size:
+                cut = data.rfind(b'\n', start, end)
+                if cut < 0:
+                    cut = data.rfind(b' ', start, end)
+                if cut >= 0:
+                    end = cut + 1
+                else:
+                    # Sem separador: recua até o início de um caractere UTF-8
+                    while end > start + 1 and data[end] & 0xC0 == 0x80:
+                        end -= 1
+            yield data[start:end].decode('utf-8')
+            start = end
+
+class TokenChunker:
+    """Splits text into windows of encoder tokens using the fast tokenizer's offsets.
+
+    The text is tokenized once; chunks are `chunk_tokens` long with `overlap_tokens`
+    shared between neighbours. Within the last quarter of a window the chunk ends
+    at a sentence boundary when there is one, so sentences are cut less often.
+    """
+
+    def __init__(self, tokenizer, chunk_tokens: int = 254, overlap_tokens: int = 32):
+        if not getattr(tokenizer, 'is_fast', False):
+            raise ValueError("TokenChunker needs a fast tokenizer with offset mapping")
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError(f"Overlap must be smaller than the chunk size, got {overlap_tokens} >= {chunk_tokens}")
+        # Cópia própria: o encoder ativa truncamento no mesmo tokenizer durante consultas concorrentes
+        self.tokenizer = copy.deepcopy(tokenizer.backend_tokenizer)
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Character offsets of every token, tokenizing newline-aligned segments in parallel"""
+        starts = [0]
+        while starts[-1] < len(text):
+            cut = text.find('\n', starts[-1] + SEGMENT_CHARS)
+            starts.append(len(text) if cut < 0 else cut + 1)
+        segments = [text[a:b] for a, b in zip(starts, starts[1:])]
+        offsets = []
+        for base, encoding in zip(starts, self.tokenizer.encode_batch(segments, add_special_tokens=False)):
+            offsets.extend((a + base, b + base) for a, b in encoding.offsets)
+        return offsets
+
+    def split(self, text: str) -> List[Tuple[str, int]]:
+        """Return (chunk text, token count) pairs"""
+        return list(self.split_stream([text]))
+
+    def split_stream(self, pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Yield (chunk text, token count) pairs for text that arrives in pieces.
+
+        Pieces should end on a line break, like those of `read_text_windows`. Only the
+        tokens that do not yet fill a chunk are carried into the next piece, so memory
+        depends on the piece size and not on the length of the whole text.
+        """
+        carry = ''
+        for piece in pieces:
+            text = carry + piece
+            offsets = self._offsets(text)
+            start = yield from self._windows(text, offsets, final=False)
+            carry = text[offsets[start][0]:] if start < len(offsets) else ''
+        if carry:
+            yield from self._windows(carry, self._offsets(carry), final=True)
+
+    def _windows(self, text: str, offsets, final: bool):
+        """Yield the chunks of `text` and return the token where the unfinished tail starts"""
+        count = len(offsets)
+        start = 0
+        while start < count:
+            end = start + self.chunk_tokens
+            if end >= count:
+                # Com mais texto por vir, a última janela pode crescer: fica para o próximo pedaço
+                if not final:
+                    return start
+                end = count
+            else:
+                end = self._sentence_end(text, offsets, start, end)
+            chunk = text[offsets[start][0]:offsets[end - 1][1]].strip()
+            if chunk:
+                yield chunk, end - start
+            if end == count:
+                break
+            start = max(end - self.overlap_tokens, start + 1)
+        return count
+
+    def _sentence_end(self, text: str, offsets, start: int, end: int) -> int:
+        """Move `end` back to just after a sentence boundary in the last quarter of the window"""
+        earliest = max(start + 1, end - self.chunk_tokens // 4)
+        for i in range(end - 1, earliest - 1, -1):
+            char_end = offsets[i][1]
+            # Pontuação no fim do token, ou quebra de linha logo depois dele
+            if text[char_end - 1] in BOUNDARY_CHARS or text[char_end:char_end + 1] == '\n':
+                return i + 1
+        return end
@@ -0,0 +1,144 @@
+import os
+import re
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, List, Optional
+
+from utils.config import Config
+from .rag_pipeline import RAGPipeline, get_encoder
+from .sharded_index import get_shard_pool
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+class CollectionManager:
+    """Named RAG collections, each with its own index and chunk store on disk.
+
+    Collections are loaded lazily on first use and the least recently used ones
+    are evicted from memory when the loaded total exceeds the memory budget.
+    """
+
+    def __init__(self, storage_dir: Optional[str] = None, memory_budget_bytes: Optional[int] = None,
+                 token_counter=None):
+        self.config = Config()
+        # Conta os tokens do LLM dos chunks na ingestão (LLMManager); ver RAGPipeline
+        self.token_counter = token_counter
+        self.storage_dir = storage_dir or self.config.RAG_COLLECTIONS_DIR
+        self.memory_budget_bytes = memory_budget_bytes or self.config.RAG_MEMORY_BUDGET_MB * 1024 * 1024
+        self.default_collection = self.config.RAG_DEFAULT_COLLECTION
+        self.collections: Dict[str, RAGPipeline] = {}
+        # Ordem de uso das coleções carregadas (a mais antiga primeiro)
+        self._lru: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0
+        # Coleção padrão e seu encoder carregados (ver warm_up)
+        self.ready = False
+        self.ready_error: Optional[str] = None
+        os.makedirs(self.storage_dir, exist_ok=True)
+        if self.config.RAG_SEARCH_SHARDS > 1:
+            if self.config.RAG_VECTOR_STORAGE != 'float32':
+                # Os shards guardam os vetores em float32 e não fazem re-score
+                raise ValueError("RAG_SEARCH_SHARDS > 1 requires RAG_VECTOR_STORAGE=float32")
+            # Iniciar os shards na inicialização, antes de qualquer busca
+            get_shard_pool(self.config.RAG_SEARCH_SHARDS)
+
+    def _validate_name(self, name: Optional[str]) -> str:
+        name = name or self.default_collection
+        if not COLLECTION_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return name
+
+    def get(self, name: Optional[str] = None) -> RAGPipeline:
+        """Get a collection, creating it if needed and loading it from disk on first use"""
+        name = self._validate_name(name)
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = RAGPipeline(
+                    name=name,
+                    storage_dir=os.path.join(self.storage_dir, name),
+                    token_counter=self.token_counter
+                )
+            pipeline = self.collections[name]
+        pipeline.load()
+        self.touch(name)
+        return pipeline
+
+    def warm_up(self) -> None:
+        """Load the default collection and its embedding model ahead of the first query"""
+        try:
+            pipeline = self.get()
+            get_encoder(pipeline.embedding_model)
+            self.ready = True
+            logger.info(f"Collection '{pipeline.name}' and encoder {pipeline.embedding_model} ready")
+        except Exception as e:
+            logger.error(f"Error warming up collections: {str(e)}")
+            self.ready_error = str(e)
+
+    def touch(self, name: Optional[str] = None) -> None:
+        """Mark a collection as recently used and enforce the memory budget"""
+        name = self._validate_name(name)
+        with self._lock:
+            self._lru[name] = None
+            self._lru.move_to_end(name)
+            victims = self._select_evictions(keep=name)
+        # Descarregar fora do lock: unload espera as buscas da coleção e não deve travar as outras
+        for pipeline in victims:
+            with self._lock:
+                if pipeline.name in self._lru:
+                    # Usada de novo enquanto isso
+                    continue
+            pipeline.unload()
+
+    def _select_evictions(self, keep: str) -> List[RAGPipeline]:
+        """Remove least recently used collections from the LRU until the budget fits; returns them to unload"""
+        loaded = [n for n in self._lru if self.collections[n].loaded]
+        total = sum(self.collections[n].memory_usage() for n in loaded)
+        victims = []
+        for name in loaded:
+            if total <= self.memory_budget_bytes:
+                break
+            pipeline = self.collections[name]
+            if name == keep or pipeline.writing:
+                continue
+            total -= pipeline.memory_usage()
+            victims.append(pipeline)
+            del self._lru[name]
+            self.evictions += 1
+        if total > self.memory_budget_bytes:
+            logger.warning(
+                f"Loaded collections use {total / (1024 * 1024):.1f}MB, "
+                f"above the {self.memory_budget_bytes / (1024 * 1024):.1f}MB budget"
+            )
+        return victims
+
+    def list_collections(self) -> List[Dict[str, Any]]:
+        names = set(self.collections)
+        names.update(
+            entry for entry in os.listdir(self.storage_dir)
+            if os.path.isdir(os.path.join(self.storage_dir, entry)) and COLLECTION_NAME_PATTERN.match(entry)
+        )
+        collections = []
+        for name in sorted(names):
+            pipeline = self.collections.get(name)
+            collections.append({
+                'name': name,
+                'loaded': bool(pipeline and pipeline.loaded),
+                'memory_bytes': pipeline.memory_usage() if pipeline else 0,
+                'index': pipeline.index_stats() if pipeline else None,
+                'texts': pipeline.text_stats() if pipeline else None,
+                'embedding_model': pipeline.embedding_model if pipeline and pipeline.loaded else None,
+                'migration': pipeline.migration_status() if pipeline else None
+            })
+        return collections
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = [n for n in self._lru if self.collections[n].loaded]
+            return {
+                'loaded': loaded,
+                'memory_bytes': sum(self.collections[n].memory_usage() for n in loaded),
+                'memory_budget_bytes': self.memory_budget_bytes,
+                'evictions': self.evictions
+            }
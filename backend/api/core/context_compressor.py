@@ -0,0 +1,126 @@
+import re
+import time
+import logging
+from threading import Lock
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fim de frase seguido de espaço, ou quebra de linha
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n+')
+
+class ContextCompressor:
+    """Extractive compression of retrieved chunks before generation.
+
+    Chunks are split into sentences (fragments shorter than `min_sentence_chars`,
+    such as a number on its own line, are joined to a neighbouring sentence), all
+    sentences are embedded in one batch and scored by cosine similarity to the query; the best ones are kept, in their
+    original order, until the token budget is spent.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray],
+                 count_tokens: Callable[[List[str]], List[int]], min_sentence_chars: int = 8):
+        self._encode = encode
+        self._count_tokens = count_tokens
+        self.min_sentence_chars = min_sentence_chars
+        self._lock = Lock()
+        self.stats = {
+            'requests': 0,
+            'original_tokens': 0,
+            'compressed_tokens': 0,
+            'prefill_seconds_saved': 0.0,
+            'compress_seconds': 0.0
+        }
+
+    def split_sentences(self, text: str) -> List[str]:
+        sentences = []
+        # Fragmentos antes da primeira frase completa entram no início dela
+        leading = []
+        for sentence in (s.strip() for s in SENTENCE_BREAK.split(text)):
+            if not sentence:
+                continue
+            if len(sentence) >= self.min_sentence_chars:
+                sentences.append(" ".join(leading + [sentence]))
+                leading = []
+            elif sentences:
+                sentences[-1] += " " + sentence
+            else:
+                leading.append(sentence)
+        if leading:
+            sentences.append(" ".join(leading))
+        return sentences
+
+    def compress(self, query_embedding: np.ndarray, results: List[Dict[str, Any]], max_tokens: int,
+                 encode: Optional[Callable[[List[str]], np.ndarray]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Return the results with each chunk reduced to its selected sentences, and the sizes.
+
+        `encode` overrides the default encoder, e.g. with the model of the collection
+        the query embedding came from.
+        """
+        start = time.perf_counter()
+        sentences, owners = [], []
+        for position, result in enumerate(results):
+            for sentence in self.split_sentences(result['chunk']):
+                sentences.append(sentence)
+                owners.append(position)
+        if not sentences:
+            return results, {'original_tokens': 0, 'compressed_tokens': 0, 'ratio': 1.0, 'sentences': 0, 'kept': 0}
+
+        tokens = np.asarray(self._count_tokens(sentences))
+        embeddings = np.asarray((encode or self._encode)(sentences), dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        scores = embeddings @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        # Melhores frases primeiro; as que estouram o orçamento são puladas, as menores ainda cabem
+        keep = np.zeros(len(sentences), dtype=bool)
+        used = 0
+        for i in np.argsort(-scores, kind='stable'):
+            if used + tokens[i] <= max_tokens:
+                keep[i] = True
+                used += int(tokens[i])
+
+        kept: Dict[int, List[int]] = {}
+        for i in np.flatnonzero(keep):
+            kept.setdefault(owners[i], []).append(i)
+        compressed = [
+            dict(results[position], chunk=" ".join(sentences[i] for i in ids), token_count=int(tokens[ids].sum()))
+            for position, ids in sorted(kept.items())
+        ]
+
+        original = int(tokens.sum())
+        report = {
+            'original_tokens': original,
+            'compressed_tokens': used,
+            'ratio': used / original if original else 1.0,
+            'sentences': len(sentences),
+            'kept': int(keep.sum())
+        }
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['original_tokens'] += original
+            self.stats['compressed_tokens'] += used
+            self.stats['compress_seconds'] += elapsed
+        logger.info(f"Compressed context from {original} to {used} tokens ({report['kept']}/{len(sentences)} sentences)")
+        return compressed, report
+
+    def record_prefill(self, report: Dict[str, Any], prefill_seconds: float, prompt_tokens: int) -> float:
+        """Estimate the prefill time saved from the measured per-token prefill cost"""
+        if not prompt_tokens:
+            return 0.0
+        saved = prefill_seconds / prompt_tokens * (report['original_tokens'] - report['compressed_tokens'])
+        with self._lock:
+            self.stats['prefill_seconds_saved'] += saved
+        return saved
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['enabled'] = True
+        stats['ratio'] = (
+            stats['compressed_tokens'] / stats['original_tokens'] if stats['original_tokens'] else 1.0
+        )
+        return stats
@@ -0,0 +1,94 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Groups concurrent single-text encode calls into one forward pass.
+
+    A worker thread takes the first waiting request, collects more for up to
+    `max_wait_ms` or until `max_batch_size` texts, encodes them together and
+    hands each caller its own row.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = 'embedding'):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.histogram: Counter = Counter()
+        self.requests = 0
+        self.queue_wait = 0.0
+        self.encode_time = 0.0
+
+    def _ensure_worker(self) -> None:
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text, batched with whatever other requests arrive meanwhile"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Já enfileirados entram sem esperar; depois, só até o prazo
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for text, _, _ in batch]
+            start = time.perf_counter()
+            try:
+                embeddings = np.asarray(self._encode(texts), dtype=np.float32)
+                for (_, future, _), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(batch)}: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            end = time.perf_counter()
+
+            with self._stats_lock:
+                self.histogram[len(batch)] += 1
+                self.requests += len(batch)
+                self.queue_wait += sum(start - queued for _, _, queued in batch)
+                self.encode_time += end - start
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batches = sum(self.histogram.values())
+            return {
+                'requests': self.requests,
+                'batches': batches,
+                'mean_batch_size': self.requests / batches if batches else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.histogram.items())},
+                'avg_queue_wait_ms': 1000 * self.queue_wait / self.requests if self.requests else 0.0,
+                'avg_encode_ms': 1000 * self.encode_time / batches if batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
@@ -0,0 +1,151 @@
+import time
+from typing import Any, Dict, List, Optional, Union
+
+# Nomes aceitos para cada parâmetro: os do frontend (maxTokens, topP) e o antigo max_length
+_ALIASES = {
+    'max_new_tokens': ('max_new_tokens', 'max_tokens', 'maxTokens', 'max_length'),
+    'temperature': ('temperature',),
+    'top_p': ('top_p', 'topP'),
+    'top_k': ('top_k', 'topK'),
+    'repetition_penalty': ('repetition_penalty', 'repetitionPenalty'),
+    'stop': ('stop',),
+    'timeout': ('timeout',)
+}
+
+MAX_STOP_SEQUENCES = 8
+
+def _normalize(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    values = {}
+    if not isinstance(data, dict):
+        return values
+    for name, keys in _ALIASES.items():
+        for key in keys:
+            if data.get(key) is not None:
+                values[name] = data[key]
+                break
+    return values
+
+class GenerationParams:
+    """Per-request generation settings: token budget, sampling, stop sequences and deadline.
+
+    `top_k` 0 disables top-k filtering and `repetition_penalty` 1.0 disables the
+    penalty. `deadline` is a time.monotonic() timestamp; generation ends there with
+    the text produced so far (finish reason `deadline`).
+    """
+
+    def __init__(self, max_new_tokens: int = 256, temperature: float = 0.7, top_p: float = 0.95,
+                 stop: Union[str, List[str], None] = None, deadline: Optional[float] = None,
+                 top_k: int = 0, repetition_penalty: float = 1.0):
+        if stop is None or isinstance(stop, str):
+            stop = [stop] if stop else []
+        if not isinstance(stop, (list, tuple)) or not all(isinstance(s, str) for s in stop):
+            raise ValueError("stop must be a string or a list of strings")
+        self.stop: List[str] = list(dict.fromkeys(s for s in stop if s))
+        if len(self.stop) > MAX_STOP_SEQUENCES:
+            raise ValueError(f"At most {MAX_STOP_SEQUENCES} stop sequences are allowed")
+        self.max_new_tokens = int(max_new_tokens)
+        self.temperature = float(temperature)
+        self.top_p = float(top_p)
+        self.top_k = int(top_k)
+        self.repetition_penalty = float(repetition_penalty)
+        self.deadline = deadline
+        if self.max_new_tokens < 1:
+            raise ValueError("max_new_tokens must be at least 1")
+        if self.temperature < 0:
+            raise ValueError("temperature must not be negative")
+        if not 0 < self.top_p <= 1:
+            raise ValueError("top_p must be in (0, 1]")
+        if self.top_k < 0:
+            raise ValueError("top_k must not be negative")
+        if self.repetition_penalty <= 0:
+            raise ValueError("repetition_penalty must be positive")
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], *defaults: Optional[Dict[str, Any]]) -> 'GenerationParams':
+        """Build from a request body; values missing there come from the first of `defaults` that has them.
+
+        `timeout` is in seconds from now. Raises ValueError on invalid values.
+        """
+        values = {}
+        for layer in reversed((data,) + defaults):
+            values.update(_normalize(layer))
+        timeout = values.pop('timeout', None)
+        if timeout is not None:
+            timeout = float(timeout)
+            if timeout <= 0:
+                raise ValueError("timeout must be positive")
+            values['deadline'] = time.monotonic() + timeout
+        return cls(**values)
+
+    def with_budget(self, max_new_tokens: int) -> 'GenerationParams':
+        """Copy with the token budget lowered to max_new_tokens (never raised)"""
+        return GenerationParams(
+            min(self.max_new_tokens, max(1, max_new_tokens)), self.temperature, self.top_p, self.stop, self.deadline,
+            self.top_k, self.repetition_penalty
+        )
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (None without one)"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cache_key(self) -> Dict[str, Any]:
+        """Parameters that change the output (the deadline only truncates it)"""
+        return {
+            'max_new_tokens': self.max_new_tokens,
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'repetition_penalty': self.repetition_penalty,
+            'stop': self.stop
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.cache_key(), timeout=self.remaining())
+
+class StopMatcher:
+    """Cuts streamed text at the first stop sequence.
+
+    push() takes the whole text decoded so far and returns the new part that is
+    safe to send: text that could still turn into a stop sequence is held back
+    until the next push (or flush() at the end).
+    """
+
+    def __init__(self, stop: Optional[List[str]] = None):
+        self.stop = [s for s in stop or [] if s]
+        self.text = ''
+        self.sent = 0
+        self.stopped = False
+
+    def push(self, text: str) -> str:
+        if self.stopped:
+            return ''
+        # O texto enviado nunca é início de uma stop sequence, então a busca começa nele
+        found = [i for i in (text.find(s, self.sent) for s in self.stop) if i >= 0]
+        if found:
+            self.stopped = True
+            self.text = text[:min(found)]
+            end = len(self.text)
+        else:
+            self.text = text
+            end = len(text) - self._partial(text)
+        piece = self.text[self.sent:end]
+        self.sent = max(self.sent, end)
+        return piece
+
+    def _partial(self, text: str) -> int:
+        """Length of the longest end of the text that is the beginning of a stop sequence"""
+        longest = 0
+        for s in self.stop:
+            for k in range(min(len(s) - 1, len(text) - self.sent), longest, -1):
+                if text.endswith(s[:k]):
+                    longest = k
+                    break
+        return longest
+
+    def flush(self) -> str:
+        piece = self.text[self.sent:]
+        self.sent = len(self.text)
+        return piece
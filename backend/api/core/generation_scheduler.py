@@ -0,0 +1,425 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+from .prefix_cache import PrefixCache, PastKeyValues
+from .generation_params import StopMatcher
+
+logger = logging.getLogger(__name__)
+
+def _legacy_cache(past) -> PastKeyValues:
+    """Past key/values as tuples, whatever Cache class the model returned"""
+    if hasattr(past, 'to_legacy_cache'):
+        return past.to_legacy_cache()
+    return tuple((k, v) for k, v in past)
+
+def token_probs(logits: torch.Tensor, temperature: float, top_p: float, top_k: int = 0) -> Optional[torch.Tensor]:
+    """Next-token distribution after temperature, top-k and top-p filtering (None at temperature 0, i.e. greedy)"""
+    if temperature <= 0:
+        return None
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    sorted_probs, order = probs.sort(descending=True)
+    # Menor conjunto de tokens cuja probabilidade somada atinge top_p, limitado aos top_k mais prováveis
+    keep = sorted_probs.cumsum(-1) - sorted_probs < top_p
+    if top_k > 0:
+        keep[..., top_k:] = False
+    filtered = torch.zeros_like(probs).scatter(-1, order, sorted_probs * keep)
+    return filtered / filtered.sum(-1, keepdim=True)
+
+def penalize_repetition(logits: torch.Tensor, token_ids: List[int], penalty: float) -> torch.Tensor:
+    """Make tokens already in the sequence less likely (as transformers' repetition_penalty)"""
+    if penalty == 1.0 or not token_ids:
+        return logits
+    index = torch.tensor(sorted(set(token_ids)), device=logits.device)
+    scores = logits.index_select(-1, index)
+    scores = torch.where(scores < 0, scores * penalty, scores / penalty)
+    return logits.index_copy(-1, index, scores)
+
+def _pad_cache_left(past: PastKeyValues, mask: torch.Tensor, count: int) -> Tuple[PastKeyValues, torch.Tensor]:
+    if count <= 0:
+        return past, mask
+    padded = tuple(
+        (torch.nn.functional.pad(k, (0, 0, count, 0)), torch.nn.functional.pad(v, (0, 0, count, 0)))
+        for k, v in past
+    )
+    return padded, torch.nn.functional.pad(mask, (count, 0))
+
+def _concat_cache(a: PastKeyValues, mask_a: torch.Tensor, b: PastKeyValues,
+                  mask_b: torch.Tensor) -> Tuple[PastKeyValues, torch.Tensor]:
+    """Stack two left-padded batches, padding the shorter one on the left"""
+    length = max(mask_a.shape[1], mask_b.shape[1])
+    a, mask_a = _pad_cache_left(a, mask_a, length - mask_a.shape[1])
+    b, mask_b = _pad_cache_left(b, mask_b, length - mask_b.shape[1])
+    merged = tuple((torch.cat([ka, kb]), torch.cat([va, vb])) for (ka, va), (kb, vb) in zip(a, b))
+    return merged, torch.cat([mask_a, mask_b])
+
+def _select_rows(past: PastKeyValues, mask: torch.Tensor, rows: List[int]) -> Tuple[PastKeyValues, torch.Tensor]:
+    """Keep the given rows and drop the leading columns that are padding in all of them"""
+    index = torch.tensor(rows, device=mask.device)
+    mask = mask.index_select(0, index)
+    start = int((mask.sum(0) == 0).long().cumprod(0).sum())
+    past = tuple((k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:]) for k, v in past)
+    return past, mask[:, start:]
+
+class GenerationRequest:
+    """A queued generation; iterate it to receive the decoded text pieces as they are produced.
+
+    Generation ends at the first of `stop` (which is left out of the text) or at
+    `deadline` (a time.monotonic() timestamp), besides EOS and the token budget.
+    """
+
+    def __init__(self, input_ids: List[int], max_new_tokens: int, temperature: float, top_p: float,
+                 stop: Optional[List[str]] = None, deadline: Optional[float] = None,
+                 top_k: int = 0, repetition_penalty: float = 1.0):
+        self.input_ids = input_ids
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.repetition_penalty = repetition_penalty
+        self.deadline = deadline
+        self.generated: List[int] = []
+        self.submitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # eos, length, stop, deadline, cancelled ou error
+        self.finish_reason: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self._stop = StopMatcher(stop)
+        # Decodificação incremental: texto já decodificado e janela de tokens [_prefix_offset, _read_offset)
+        self._decoded = ''
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._pieces: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stop generating; the sequence leaves the batch before the next decode step"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def text(self) -> str:
+        """Text generated so far, up to the stop sequence if one was found"""
+        return self._stop.text
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            piece = self._pieces.get()
+            if piece is None:
+                break
+            yield piece
+        if self.error is not None:
+            raise self.error
+
+    def _emit(self, tokenizer) -> bool:
+        """Queue the newly decoded text; True once a stop sequence was generated.
+
+        Only the tokens since the last emitted piece are decoded, after a few
+        already-decoded ones that give the tokenizer the context of word
+        boundaries (as TextIteratorStreamer does), so each step costs the same
+        however long the sequence gets.
+        """
+        prefix_text = tokenizer.decode(self.generated[self._prefix_offset:self._read_offset], skip_special_tokens=True)
+        new_text = tokenizer.decode(self.generated[self._prefix_offset:], skip_special_tokens=True)
+        # Caractere multi-byte incompleto: espera o próximo token
+        if len(new_text) > len(prefix_text) and not new_text.endswith('�'):
+            self._decoded += new_text[len(prefix_text):]
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(self.generated)
+            piece = self._stop.push(self._decoded)
+            if piece:
+                self._pieces.put(piece)
+        return self._stop.stopped
+
+    def _finish(self, reason: str, error: Optional[Exception] = None) -> None:
+        self.finish_reason = reason
+        self.error = error
+        self.finished_at = time.perf_counter()
+        # Texto retido por parecer o início de uma stop sequence
+        piece = self._stop.flush()
+        if piece:
+            self._pieces.put(piece)
+        self._pieces.put(None)
+
+class GenerationScheduler:
+    """Continuous batching: one worker thread owns the model and decodes all requests together.
+
+    New requests are prefilled as a left-padded group and merged into the running
+    batch between decode steps; each step feeds one token per sequence, and
+    finished or cancelled sequences are retired before the next one. Sequences
+    never wait for a whole batch to finish.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, max_prefill_tokens: int = 4096,
+                 prefix_cache: Optional[PrefixCache] = None, speculative=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        # SpeculativeDecoder opcional, usado quando uma única sequência está decodificando
+        self.speculative = speculative
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_prefill_tokens = max_prefill_tokens
+        self.eos_token_id = tokenizer.eos_token_id
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.histogram: Counter = Counter()
+        self.requests = 0
+        self.tokens = 0
+        self.steps = 0
+        self.prefill_time = 0.0
+        self.decode_time = 0.0
+        self._worker = threading.Thread(target=self._run, name='generation-scheduler', daemon=True)
+        self._worker.start()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def submit(self, input_ids: List[int], max_new_tokens: int = 256, temperature: float = 0.7,
+               top_p: float = 0.95, stop: Optional[List[str]] = None,
+               deadline: Optional[float] = None, top_k: int = 0,
+               repetition_penalty: float = 1.0) -> GenerationRequest:
+        """Queue a tokenized prompt; the returned request yields its text pieces"""
+        request = GenerationRequest(
+            list(input_ids), max_new_tokens, temperature, top_p, stop, deadline, top_k, repetition_penalty
+        )
+        self._queue.put(request)
+        return request
+
+    def _run(self) -> None:
+        active: List[GenerationRequest] = []
+        past, mask = None, None
+        while True:
+            incoming: List[GenerationRequest] = []
+            try:
+                incoming = self._admit(block=not active, free=self.max_batch_size - len(active))
+                if incoming:
+                    prefilled, new_past, new_mask = self._prefill(incoming)
+                    if prefilled and past is None:
+                        past, mask = new_past, new_mask
+                    elif prefilled:
+                        past, mask = _concat_cache(past, mask, new_past, new_mask)
+                    active.extend(prefilled)
+                    incoming = []
+                    active, past, mask = self._retire(active, past, mask)
+                if active:
+                    if (self.speculative and len(active) == 1 and self._queue.empty() and bool(mask.all())
+                            and active[0].repetition_penalty == 1.0):
+                        past, mask = self._speculative_step(active[0], past)
+                    else:
+                        past, mask = self._decode_step(active, past, mask)
+                    active, past, mask = self._retire(active, past, mask)
+                if not active:
+                    past, mask = None, None
+            except Exception as e:
+                logger.error(f"Generation step failed for {len(active) + len(incoming)} sequences: {str(e)}")
+                for request in active + incoming:
+                    if request.finish_reason is None:
+                        request._finish('error', e)
+                active, past, mask = [], None, None
+
+    def _admit(self, block: bool, free: int) -> List[GenerationRequest]:
+        """Take waiting requests for the free slots, within the prefill token budget"""
+        incoming = []
+        tokens = 0
+        while len(incoming) < free:
+            try:
+                request = self._queue.get(block=block and not incoming)
+            except queue.Empty:
+                break
+            if request.cancelled:
+                request._finish('cancelled')
+                continue
+            if request.expired():
+                # O prazo acabou ainda na fila: não gasta prefill
+                request._finish('deadline')
+                continue
+            incoming.append(request)
+            tokens += len(request.input_ids)
+            if tokens >= self.max_prefill_tokens:
+                break
+        return incoming
+
+    @torch.no_grad()
+    def _prefill(self, incoming: List[GenerationRequest]) -> Tuple[List[GenerationRequest], PastKeyValues, torch.Tensor]:
+        """Prefill new requests: cold prompts as one padded batch, cached prefixes one by one.
+
+        A request whose prefill fails is finished with the error; the others go on.
+        """
+        start = time.perf_counter()
+        groups = []
+        cold = []
+        for request in incoming:
+            try:
+                prefix, length = self.prefix_cache.match(request.input_ids) if self.prefix_cache else (None, 0)
+                if prefix is None:
+                    cold.append(request)
+                else:
+                    groups.append(([request],) + self._prefill_from_prefix(request, prefix, length))
+            except Exception as e:
+                self._prefill_failed(request, e)
+        if cold:
+            try:
+                groups.append((cold,) + self._prefill_batch(cold))
+            except Exception as e:
+                if len(cold) == 1:
+                    self._prefill_failed(cold[0], e)
+                else:
+                    # Refaz um a um para isolar a requisição com problema
+                    logger.warning(f"Batched prefill of {len(cold)} requests failed, retrying one by one: {e}")
+                    for request in cold:
+                        try:
+                            groups.append(([request],) + self._prefill_batch([request]))
+                        except Exception as e:
+                            self._prefill_failed(request, e)
+        with self._stats_lock:
+            self.requests += len(incoming)
+            self.prefill_time += time.perf_counter() - start
+        if not groups:
+            return [], None, None
+        
+        requests, past, mask = groups[0]
+        for more, more_past, more_mask in groups[1:]:
+            past, mask = _concat_cache(past, mask, more_past, more_mask)
+            requests = requests + more
+        return requests, past, mask
+
+    def _prefill_failed(self, request: GenerationRequest, error: Exception) -> None:
+        logger.error(f"Prefill failed for a request of {len(request.input_ids)} tokens: {error}")
+        request._finish('error', error)
+
+    def _prefill_batch(self, requests: List[GenerationRequest]) -> Tuple[PastKeyValues, torch.Tensor]:
+        length = max(len(r.input_ids) for r in requests)
+        pad_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.eos_token_id
+        input_ids = torch.tensor(
+            [[pad_id] * (length - len(r.input_ids)) + r.input_ids for r in requests], device=self.device
+        )
+        mask = torch.tensor(
+            [[0] * (length - len(r.input_ids)) + [1] * len(r.input_ids) for r in requests], device=self.device
+        )
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)
+        outputs = self.model(input_ids=input_ids, attention_mask=mask, position_ids=position_ids, use_cache=True)
+        past = _legacy_cache(outputs.past_key_values)
+        if self.prefix_cache:
+            for row, request in enumerate(requests):
+                self.prefix_cache.insert(request.input_ids, past, row=row, offset=length - len(request.input_ids))
+        self._sample(requests, outputs.logits[:, -1, :])
+        return past, mask
+
+    def _prefill_from_prefix(self, request: GenerationRequest, prefix: PastKeyValues,
+                             length: int) -> Tuple[PastKeyValues, torch.Tensor]:
+        # Só os tokens depois do prefixo em cache passam pelo modelo
+        total = len(request.input_ids)
+        input_ids = torch.tensor([request.input_ids[length:]], device=self.device)
+        mask = torch.ones((1, total), dtype=torch.long, device=self.device)
+        position_ids = torch.arange(length, total, device=self.device).unsqueeze(0)
+        outputs = self.model(
+            input_ids=input_ids, attention_mask=mask, position_ids=position_ids, past_key_values=prefix, use_cache=True
+        )
+        past = _legacy_cache(outputs.past_key_values)
+        self.prefix_cache.insert(request.input_ids, past)
+        self._sample([request], outputs.logits[:, -1, :])
+        return past, mask
+
+    @torch.no_grad()
+    def _decode_step(self, active: List[GenerationRequest], past: PastKeyValues,
+                     mask: torch.Tensor) -> Tuple[PastKeyValues, torch.Tensor]:
+        start = time.perf_counter()
+        input_ids = torch.tensor([[r.generated[-1]] for r in active], device=self.device)
+        mask = torch.cat([mask, mask.new_ones((mask.shape[0], 1))], dim=1)
+        position_ids = mask.sum(-1, keepdim=True) - 1
+        outputs = self.model(
+            input_ids=input_ids, attention_mask=mask, position_ids=position_ids, past_key_values=past, use_cache=True
+        )
+        self._sample(active, outputs.logits[:, -1, :])
+        with self._stats_lock:
+            self.steps += 1
+            self.histogram[len(active)] += 1
+            self.decode_time += time.perf_counter() - start
+        return _legacy_cache(outputs.past_key_values), mask
+
+    @torch.no_grad()
+    def _speculative_step(self, request: GenerationRequest, past: PastKeyValues) -> Tuple[PastKeyValues, torch.Tensor]:
+        start = time.perf_counter()
+        tokens, past = self.speculative.step(request, past)
+        now = time.perf_counter()
+        emitted = 0
+        for token in tokens:
+            self._accept_token(request, token, now)
+            emitted += 1
+            if request.finish_reason is not None:
+                break
+        with self._stats_lock:
+            self.steps += 1
+            self.histogram[1] += 1
+            self.tokens += emitted
+            self.decode_time += now - start
+        mask = torch.ones((1, past[0][0].shape[2]), dtype=torch.long, device=self.device)
+        return past, mask
+
+    def _sample(self, requests: List[GenerationRequest], logits: torch.Tensor) -> None:
+        """Pick the next token of each sequence (greedy at temperature 0, else top-p sampling)"""
+        now = time.perf_counter()
+        for request, row in zip(requests, logits):
+            row = penalize_repetition(row, request.input_ids + request.generated, request.repetition_penalty)
+            probs = token_probs(row, request.temperature, request.top_p, request.top_k)
+            token = int(row.argmax()) if probs is None else int(torch.multinomial(probs, 1))
+            self._accept_token(request, token, now)
+        with self._stats_lock:
+            self.tokens += len(requests)
+
+    def _accept_token(self, request: GenerationRequest, token: int, now: float) -> None:
+        if request.first_token_at is None:
+            request.first_token_at = now
+        if token == self.eos_token_id:
+            request._finish('eos')
+            return
+        request.generated.append(token)
+        if request._emit(self.tokenizer):
+            request._finish('stop')
+        elif len(request.generated) >= request.max_new_tokens:
+            request._finish('length')
+        elif request.expired():
+            request._finish('deadline')
+
+    def _retire(self, active: List[GenerationRequest], past: PastKeyValues,
+                mask: torch.Tensor) -> Tuple[List[GenerationRequest], Optional[PastKeyValues], Optional[torch.Tensor]]:
+        for request in active:
+            if request.finish_reason is None and request.cancelled:
+                request._finish('cancelled')
+        rows = [i for i, request in enumerate(active) if request.finish_reason is None]
+        if len(rows) == len(active):
+            return active, past, mask
+        if not rows:
+            return [], None, None
+        past, mask = _select_rows(past, mask, rows)
+        return [active[i] for i in rows], past, mask
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'requests': self.requests,
+                'queued': self._queue.qsize(),
+                'decode_steps': self.steps,
+                'tokens': self.tokens,
+                'mean_batch_size': sum(size * count for size, count in self.histogram.items()) / self.steps
+                if self.steps else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.histogram.items())},
+                'tokens_per_second': self.tokens / (self.prefill_time + self.decode_time)
+                if self.prefill_time + self.decode_time else 0.0,
+                'prefill_seconds': self.prefill_time,
+                'decode_seconds': self.decode_time,
+                'max_batch_size': self.max_batch_size
+            }
@@ -1,30 +1,252 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer, AutoConfig
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, AutoConfig, TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList,
+    MaxTimeCriteria
+)
 from accelerate import infer_auto_device_map
 from huggingface_hub import snapshot_download, hf_hub_download
 from tqdm import tqdm
+from threading import Thread, Event
+import torch
 import logging
 import os
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Iterator, Tuple
 
 logger = logging.getLogger(__name__)
 from utils.config import Config
 from .memory_manager import MemoryManager
 from .system_manager import SystemManager
+from .generation_scheduler import GenerationScheduler
+from .prefix_cache import PrefixCache
+from .speculative import SpeculativeDecoder
+from .response_cache import ResponseCache
+from .generation_params import GenerationParams, StopMatcher
+from . import quantization
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when generation is requested before the model finished loading"""
+
+class _CancelledCriteria(StoppingCriteria):
+    """Stops generate() at the next token once the consumer of the stream has gone away"""
+
+    def __init__(self, cancelled: Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+    def __deepcopy__(self, memo):
+        # generate() pode copiar os critérios; o Event precisa ser o mesmo
+        return self
 
 class LLMManager:
-    def __init__(self, memory_manager: Optional[MemoryManager] = None, system_manager: Optional[SystemManager] = None):
+    # Estados do carregamento: pending -> downloading -> loading_shards -> loading_tokenizer -> [quantizing] -> warming -> ready (ou error)
+    LOAD_STATES = (
+        'pending', 'downloading', 'loading_shards', 'loading_tokenizer', 'quantizing', 'warming', 'ready', 'error'
+    )
+
+    def __init__(self, memory_manager: Optional[MemoryManager] = None, system_manager: Optional[SystemManager] = None,
+                 background: Optional[bool] = None):
         self.config = Config()
         self.memory_manager = memory_manager
         self.system_manager = system_manager
         self.model = None
         self.tokenizer = None
-        self.initialize_model()
+        self.scheduler: Optional[GenerationScheduler] = None
+        self.prefix_cache: Optional[PrefixCache] = None
+        self.speculative: Optional[SpeculativeDecoder] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.state = 'pending'
+        self.state_error = None
+        self.load_seconds = None
+        self.quantization: Optional[Dict[str, Any]] = None
+        self._load_done = Event()
+        self._loader: Optional[Thread] = None
+        if background is None:
+            background = self.config.LLM_BACKGROUND_LOAD
+        if background:
+            self.start_loading()
+        else:
+            self._load()
+
+    def start_loading(self) -> None:
+        """Load the model in a background thread; the server answers requests meanwhile"""
+        if self.state == 'ready' or (self._loader is not None and self._loader.is_alive()):
+            return
+        self._load_done.clear()
+        self._loader = Thread(target=self._load, name='llm-loader', daemon=True)
+        self._loader.start()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finishes (or the timeout expires); True if the model is ready"""
+        self._load_done.wait(timeout)
+        return self.is_ready()
+
+    def _set_state(self, state: str, progress: Optional[float] = None, error: Optional[str] = None) -> None:
+        self.state = state
+        self.state_error = error
+        if self.system_manager:
+            self.system_manager.update_model_status(state, progress, error)
+
+    def _load(self) -> None:
+        start = time.perf_counter()
+        try:
+            if self._quantization_enabled():
+                self.load_quantized_model()
+            if self.model is None:
+                self.initialize_model()
+            if self.model is None:
+                raise RuntimeError("Model could not be loaded")
+            if self.tokenizer is None:
+                self._set_state('loading_tokenizer', 100)
+                self._load_tokenizer()
+            if self.config.LLM_WARMUP:
+                self._warm_up()
+            if self.config.LLM_SCHEDULER_ENABLED:
+                if self.config.LLM_PREFIX_CACHE_ENABLED:
+                    self.prefix_cache = PrefixCache(
+                        max_bytes=self.config.LLM_PREFIX_CACHE_MB * 1024 * 1024,
+                        block_size=self.config.LLM_PREFIX_CACHE_BLOCK_TOKENS
+                    )
+                if self.config.LLM_DRAFT_MODEL:
+                    self._load_draft_model()
+                # A partir daqui só o scheduler chama o modelo (batching contínuo entre requisições)
+                self.scheduler = GenerationScheduler(
+                    self.model, self.tokenizer, max_batch_size=self.config.LLM_MAX_BATCH_SIZE,
+                    prefix_cache=self.prefix_cache, speculative=self.speculative
+                )
+            if self.config.LLM_RESPONSE_CACHE_ENABLED:
+                self._open_response_cache()
+            self._set_state('ready', 100)
+            logger.info(f"Model ready after {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            error_msg = f"Error loading model: {e}"
+            logger.error(error_msg)
+            self._set_state('error', 0, error_msg)
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._load_done.set()
+
+    def _warm_up(self) -> None:
+        """Run one short generation so the first request does not pay for lazy initialisation"""
+        self._set_state('warming', 100)
+        try:
+            inputs = self.tokenizer("Hello", return_tensors="pt")
+            self.model.generate(
+                input_ids=inputs["input_ids"].to(self.model.device),
+                attention_mask=inputs["attention_mask"].to(self.model.device),
+                max_new_tokens=1,
+                do_sample=False
+            )
+        except Exception as e:
+            # O aquecimento é só uma otimização: o modelo carregado continua utilizável
+            logger.warning(f"Model warm-up failed: {e}")
+
+    def _quantization_enabled(self) -> bool:
+        mode = self.config.LLM_QUANTIZATION
+        if mode == 'auto':
+            # Quantização int8 dinâmica só tem kernels de CPU: em GPU o modelo carrega normalmente
+            return not torch.cuda.is_available()
+        return mode == 'int8'
+
+    def load_quantized_model(self) -> None:
+        """Load the int8 checkpoint, creating it from the bf16 weights on first use.
+
+        The first run loads the original weights in bf16 on CPU, quantizes the linear
+        layers to int8 and keeps the result only if perplexity stays within
+        LLM_QUANTIZED_MAX_PPL_INCREASE of bf16; later runs load the saved checkpoint
+        directly. Any failure leaves self.model unset so the regular loaders run.
+        """
+        path = self.config.LLM_QUANTIZED_DIR
+        report = quantization.read_report(path)
+        try:
+            if quantization.has_quantized(path):
+                self._set_state('loading_shards', 100)
+                self.model = quantization.load_quantized(path)
+                self.quantization = report
+                logger.info(f"Loaded int8 checkpoint from {path}")
+                return
+            if report and not report.get('accepted'):
+                logger.warning(f"Skipping int8 quantization, rejected before: {report}")
+                return
+            
+            self._set_state('downloading', 0)
+            if not self._check_model_downloaded():
+                self._download_model()
+            self._set_state('loading_shards', 100)
+            load_args = {"torch_dtype": torch.bfloat16, "device_map": "cpu", "low_cpu_mem_usage": True}
+            if self.memory_manager:
+                load_args["cache_dir"] = self.memory_manager.cache_dir
+            model = AutoModelForCausalLM.from_pretrained("deepseek-ai/deepseek-llm-7b-base", **load_args)
+            if self.tokenizer is None:
+                self._set_state('loading_tokenizer', 100)
+                self._load_tokenizer()
+            
+            self._set_state('quantizing', 100)
+            report = quantization.quantize_checked(
+                model, self.tokenizer, max_increase=self.config.LLM_QUANTIZED_MAX_PPL_INCREASE
+            )
+            quantization.save_quantized(model, path, report)
+            self.model = model.eval()
+            self.quantization = report
+            logger.info(f"Saved int8 checkpoint to {path}")
+        except quantization.QuantizationError as e:
+            logger.warning(f"Keeping the original weights: {e}")
+            quantization.write_report(path, e.report)
+        except Exception as e:
+            logger.error(f"Error loading quantized model, falling back to the regular loaders: {e}")
+
+    def _load_draft_model(self) -> None:
+        """Load the draft model for speculative decoding; it must share the main model's tokenizer"""
+        name = self.config.LLM_DRAFT_MODEL
+        try:
+            cache_dir = self.memory_manager.cache_dir if self.memory_manager else None
+            draft_tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=cache_dir)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                raise ValueError("its tokenizer differs from the main model's")
+            draft = AutoModelForCausalLM.from_pretrained(
+                name, cache_dir=cache_dir, low_cpu_mem_usage=True, torch_dtype=next(self.model.parameters()).dtype
+            ).to(self.model.device).eval()
+            if self.quantization and self.quantization.get('accepted'):
+                # Com o modelo principal em int8, o rascunho também: o ganho depende do custo relativo dos dois
+                quantization.quantize_int8(draft)
+            self.speculative = SpeculativeDecoder(self.model, draft, max_draft_tokens=self.config.LLM_DRAFT_MAX_TOKENS)
+            logger.info(f"Speculative decoding enabled with draft model {name}")
+        except Exception as e:
+            logger.warning(f"Speculative decoding disabled, could not use draft model {name}: {e}")
+
+    def _open_response_cache(self) -> None:
+        try:
+            self.response_cache = ResponseCache(
+                self.config.LLM_RESPONSE_CACHE_PATH,
+                ttl_seconds=self.config.LLM_RESPONSE_CACHE_TTL,
+                max_bytes=self.config.LLM_RESPONSE_CACHE_MB * 1024 * 1024
+            )
+        except Exception as e:
+            # Sem o cache as respostas continuam sendo geradas normalmente
+            logger.warning(f"Response cache disabled, could not open {self.config.LLM_RESPONSE_CACHE_PATH}: {e}")
+
+    def _response_cache_key(self, params: GenerationParams, use_cache: Optional[bool],
+                            prompt_ids: List[int]) -> Optional[str]:
+        """Cache key of a generation, or None when it must not use the response cache.
+
+        Greedy generations (temperature 0) are cached by default; sampled ones only
+        when the caller opts in (use_cache=True). use_cache=False always bypasses it.
+        """
+        if self.response_cache is None or use_cache is False or (params.temperature > 0 and not use_cache):
+            return None
+        # Pesos diferentes (outro checkpoint, int8) geram respostas diferentes para o mesmo prompt
+        model_id = getattr(self.model.config, '_name_or_path', '')
+        if self.quantization and self.quantization.get('accepted'):
+            model_id += f":{self.quantization.get('scheme')}"
+        else:
+            model_id += f":{str(next(self.model.parameters()).dtype).replace('torch.', '')}"
+        return ResponseCache.make_key(model_id, prompt_ids, params.cache_key())
 
     def initialize_model(self) -> None:
         """Initialize the DeepSeek LLM model with memory optimizations"""
         try:
-            if self.system_manager:
-                self.system_manager.update_model_status('downloading', 0)
+            self._set_state('downloading', 0)
             logger.info("Starting DeepSeek LLM model download...")
             
             # Primeiro baixar o modelo usando snapshot_download para evitar OOM
@@ -50,42 +272,41 @@ class LLMManager:
                 model_args["callbacks"] = [self._download_progress_callback]
             
             # First try loading with CPU offload
+            self._set_state('loading_shards', 100)
             self.model = AutoModelForCausalLM.from_pretrained(
                 "deepseek-ai/deepseek-llm-7b-base",
                 **model_args
             )
             
             logger.info("Model downloaded successfully, loading tokenizer...")
-            if self.system_manager:
-                self.system_manager.update_model_status('loading_tokenizer', 100)
-            
-            # Preparar argumentos para o tokenizer
-            tokenizer_args = {}
-            if self.memory_manager:
-                tokenizer_args["cache_dir"] = self.memory_manager.cache_dir
-            
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                "deepseek-ai/deepseek-llm-7b-base",
-                **tokenizer_args
-            )
+            self._set_state('loading_tokenizer', 100)
+            self._load_tokenizer()
             
             logger.info("Model and tokenizer loaded successfully")
-            if self.system_manager:
-                self.system_manager.update_model_status('ready', 100)
             
         except Exception as e:
             error_msg = f"Error loading model: {e}"
             logger.error(error_msg)
-            if self.system_manager:
-                self.system_manager.update_model_status('error', 0, error_msg)
             
             logger.info("Falling back to manual loading...")
             if self.memory_manager:
                 self.memory_manager.clean_corrupted_cache()
             self.load_model_manually()
 
+    def _load_tokenizer(self) -> None:
+        # Preparar argumentos para o tokenizer
+        tokenizer_args = {}
+        if self.memory_manager:
+            tokenizer_args["cache_dir"] = self.memory_manager.cache_dir
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            "deepseek-ai/deepseek-llm-7b-base",
+            **tokenizer_args
+        )
+
     def load_model_manually(self) -> None:
         """Manual loading approach with memory optimization"""
+        self._set_state('loading_shards', 100)
         try:
             # First try loading with device_map="cpu"
             logger.info("Attempting to load model with CPU device map...")
@@ -125,47 +346,282 @@ class LLMManager:
                 **load_args
             )
 
-    def generate_response(self, message: str, context: Optional[Dict[str, Any]] = None) -> str:
+    def generate_response(self, message: str, context: Optional[Dict[str, Any]] = None,
+                          params: Optional[GenerationParams] = None, use_cache: Optional[bool] = None) -> str:
         """Generate response using the LLM"""
+        if not self.is_ready():
+            raise ModelNotReadyError(f"Model not ready (state: {self.state})")
         try:
             # Prepare input with context
             input_text = self._prepare_input(message, context)
             
-            # Tokenize
-            inputs = self.tokenizer(input_text, return_tensors="pt")
-            
-            # Generate
-            outputs = self.model.generate(
-                inputs["input_ids"],
-                max_length=2048,
-                temperature=0.7,
-                top_p=0.95,
-                do_sample=True
-            )
-            
-            # Decode and return
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            return response.strip()
+            # O texto devolvido começa pelo prompt, como a saída de model.generate()
+            result = self.complete(input_text, params, use_cache=use_cache)
+            return (input_text + result['text']).strip()
             
         except Exception as e:
             error_msg = f"Error generating response: {e}"
             logger.error(error_msg)
             return error_msg
 
+    def complete(self, prompt: str, params: Optional[GenerationParams] = None,
+                 use_cache: Optional[bool] = None) -> Dict[str, Any]:
+        """Generate a completion of the prompt, with its finish reason and token usage"""
+        stats = {}
+        text = "".join(self.stream_response(prompt, params, stats=stats, use_cache=use_cache))
+        return {
+            'text': text,
+            'finish_reason': stats['finish_reason'],
+            'cached': stats.get('cached', False),
+            'usage': {
+                'prompt_tokens': stats['prompt_tokens'],
+                'completion_tokens': stats['completion_tokens']
+            }
+        }
+
+    def stream_chat(self, message: str, context: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of generate_response, as events (see stream_events)"""
+        return self.stream_events(self._prepare_input(message, context), **kwargs)
+
+    def stream_events(self, prompt: str, params: Optional[GenerationParams] = None,
+                      use_cache: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a token event per decoded piece, then a done event with time-to-first-token and usage"""
+        start = time.perf_counter()
+        stats = {}
+        for text in self.stream_response(prompt, params, stats=stats, use_cache=use_cache):
+            yield {'type': 'token', 'text': text}
+        yield {
+            'type': 'done',
+            'status': 'completed',
+            'finish_reason': stats['finish_reason'],
+            'cached': stats.get('cached', False),
+            'timings': {
+                'ttft': stats['ttft'],
+                'prefill': stats['prefill'],
+                'decode': stats['decode'],
+                'total': time.perf_counter() - start
+            },
+            'usage': {
+                'prompt_tokens': stats['prompt_tokens'],
+                'completion_tokens': stats['completion_tokens']
+            },
+            'tokens_per_second': stats['completion_tokens'] / stats['decode'] if stats['decode'] > 0 else 0.0
+        }
+
+    def stream_response(self, prompt: str, params: Optional[GenerationParams] = None,
+                        stats: Optional[Dict[str, Any]] = None, use_cache: Optional[bool] = None) -> Iterator[str]:
+        """Generate a response piece by piece, recording prefill/decode timings in stats.
+
+        Prefill is measured as the time until the first decoded text arrives (the
+        time-to-first-token, `ttft`), so it also includes the first decode step. If
+        the consumer stops iterating (e.g. the client disconnected), generation is
+        cancelled at the next token. Generation ends at EOS, after
+        `params.max_new_tokens` (capped by the model's context window), at the first
+        stop sequence or at the deadline; stats records which as `finish_reason`.
+        A response cache hit (see _response_cache_key) is yielded as a single
+        piece, with `cached` set in stats.
+        """
+        if not self.is_ready():
+            raise ModelNotReadyError(f"Model not ready (state: {self.state})")
+        
+        start = time.perf_counter()
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        params = params or GenerationParams(max_new_tokens=self.config.LLM_MAX_NEW_TOKENS)
+        # O prompt e a resposta precisam caber juntos na janela de contexto do modelo
+        params = params.with_budget(self.config.LLM_CONTEXT_TOKENS - len(prompt_ids))
+        key = self._response_cache_key(params, use_cache, prompt_ids)
+        if key:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                yield cached['response']
+                if stats is not None:
+                    elapsed = time.perf_counter() - start
+                    stats.update(cached['usage'])
+                    stats.update({"ttft": elapsed, "prefill": elapsed, "decode": 0.0, "cached": True})
+                return
+        
+        stats = {} if stats is None else stats
+        if self.scheduler:
+            pieces = self._stream_scheduled(prompt_ids, params, stats)
+        else:
+            pieces = self._stream_generate(prompt_ids, params, stats)
+        text = []
+        try:
+            for piece in pieces:
+                text.append(piece)
+                yield piece
+        finally:
+            # Fecha o gerador interno já (cancela a geração) em vez de esperar o coletor de lixo
+            pieces.close()
+        
+        # Só respostas completas vão para o cache (erros, cancelamentos e prazos estourados não)
+        if key and stats['finish_reason'] in ('eos', 'length', 'stop'):
+            self.response_cache.put(
+                key, "".join(text),
+                {
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'completion_tokens': stats['completion_tokens'],
+                    'finish_reason': stats['finish_reason']
+                },
+                stats['prefill'] + stats['decode']
+            )
+
+    def _stream_generate(self, prompt_ids: List[int], params: GenerationParams,
+                         stats: Dict[str, Any]) -> Iterator[str]:
+        """stream_response with model.generate() in a worker thread (scheduler disabled)"""
+        input_ids = torch.tensor([prompt_ids])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = Event()
+        criteria = [_CancelledCriteria(cancelled)]
+        if params.deadline is not None:
+            criteria.append(MaxTimeCriteria(max(0.0, params.remaining())))
+        generate_args = {
+            "input_ids": input_ids.to(self.model.device),
+            "attention_mask": torch.ones_like(input_ids).to(self.model.device),
+            "max_new_tokens": params.max_new_tokens,
+            "repetition_penalty": params.repetition_penalty,
+            "streamer": streamer,
+            "stopping_criteria": StoppingCriteriaList(criteria)
+        }
+        if params.temperature > 0:
+            generate_args.update({
+                "do_sample": True, "temperature": params.temperature, "top_p": params.top_p, "top_k": params.top_k
+            })
+        else:
+            generate_args["do_sample"] = False
+        
+        errors = []
+        
+        def _generate():
+            try:
+                self.model.generate(**generate_args)
+            except Exception as e:
+                # Liberar o consumidor do streamer em caso de falha
+                errors.append(e)
+                streamer.end()
+        
+        worker = Thread(target=_generate, daemon=True)
+        start = time.perf_counter()
+        first_token_at = None
+        received = ""
+        matcher = StopMatcher(params.stop)
+        worker.start()
+        finished = False
+        try:
+            for text in streamer:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                received += text
+                piece = matcher.push(received)
+                if piece:
+                    yield piece
+                if matcher.stopped:
+                    break
+            finished = True
+        finally:
+            # Sem consumidor (GeneratorExit) ou após a stop sequence, a thread de geração para no próximo token
+            cancelled.set()
+            worker.join()
+            if not finished:
+                logger.info(f"Generation cancelled after {len(received)} characters")
+        end = time.perf_counter()
+        
+        if errors:
+            raise errors[0]
+        piece = matcher.flush()
+        if piece:
+            yield piece
+        
+        completion_tokens = len(self.tokenizer.encode(received, add_special_tokens=False))
+        if matcher.stopped:
+            finish_reason = 'stop'
+        elif completion_tokens >= params.max_new_tokens:
+            finish_reason = 'length'
+        elif params.expired():
+            finish_reason = 'deadline'
+        else:
+            finish_reason = 'eos'
+        first_token_at = first_token_at or end
+        stats.update({
+            "ttft": first_token_at - start,
+            "prefill": first_token_at - start,
+            "decode": end - first_token_at,
+            "prompt_tokens": len(prompt_ids),
+            "completion_tokens": completion_tokens,
+            "finish_reason": finish_reason
+        })
+
+    def _stream_scheduled(self, prompt_ids: List[int], params: GenerationParams,
+                          stats: Dict[str, Any]) -> Iterator[str]:
+        """stream_response through the generation scheduler, batched with the other requests"""
+        request = self.scheduler.submit(
+            prompt_ids, max_new_tokens=params.max_new_tokens, temperature=params.temperature, top_p=params.top_p,
+            stop=params.stop, deadline=params.deadline, top_k=params.top_k,
+            repetition_penalty=params.repetition_penalty
+        )
+        pieces = 0
+        try:
+            for text in request:
+                pieces += 1
+                yield text
+        finally:
+            if request.finish_reason is None:
+                # Sem consumidor, a sequência sai do batch antes do próximo passo
+                request.cancel()
+                logger.info(f"Generation cancelled after {pieces} pieces")
+        
+        first_token_at = request.first_token_at or request.finished_at
+        stats.update({
+            "ttft": first_token_at - request.submitted_at,
+            "prefill": first_token_at - request.submitted_at,
+            "decode": request.finished_at - first_token_at,
+            "prompt_tokens": len(prompt_ids),
+            "completion_tokens": len(request.generated),
+            "finish_reason": request.finish_reason
+        })
+
+    @property
+    def tokenizer_name(self) -> Optional[str]:
+        """Name of the loaded tokenizer, which stored token counts are tied to (None before it is loaded)"""
+        tokenizer = self.tokenizer
+        return None if tokenizer is None else getattr(tokenizer, 'name_or_path', None) or type(tokenizer).__name__
+
+    def count_tokens(self, texts: List[str]) -> Optional[Tuple[str, List[int]]]:
+        """Token count of each text with the LLM tokenizer and the tokenizer's name, or None before it is loaded"""
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return None
+        name = getattr(tokenizer, 'name_or_path', None) or type(tokenizer).__name__
+        return name, [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']]
+
+    def is_ready(self) -> bool:
+        """Whether model and tokenizer are loaded and warmed up"""
+        return self.state == 'ready' and self.model is not None and self.tokenizer is not None
+
     def _download_progress_callback(self, progress: float) -> None:
         """Callback para atualizar o progresso do download"""
         if progress > 0:
             logger.info(f"Download progress: {progress:.1f}%")
-            if self.system_manager:
-                self.system_manager.update_model_status('downloading', progress)
+            self._set_state('downloading', progress)
     
     def get_model_status(self) -> Dict[str, Any]:
         """Get current model status"""
         status = {
             "model_loaded": self.model is not None,
             "tokenizer_loaded": self.tokenizer is not None,
-            "device": str(next(self.model.parameters()).device) if self.model else "none"
+            "device": str(next(self.model.parameters()).device) if self.model else "none",
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "quantization": self.quantization
         }
+        if self.scheduler:
+            status["scheduler"] = self.scheduler.get_stats()
+        if self.prefix_cache:
+            status["prefix_cache"] = self.prefix_cache.get_stats()
+        if self.speculative:
+            status["speculative"] = self.speculative.get_stats()
+        if self.response_cache:
+            status["response_cache"] = self.response_cache.get_stats()
         
         # Adicionar informações de memória se disponível
         if self.memory_manager:
@@ -234,8 +690,6 @@ class LLMManager:
         except Exception as e:
             error_msg = f"Error downloading model: {e}"
             logger.error(error_msg)
-            if self.system_manager:
-                self.system_manager.update_model_status('error', 0, error_msg)
             raise
     
     def _prepare_input(self, message: str, context: Optional[Dict[str, Any]] = None) -> str:
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Cache de atenção no formato legado: (chave, valor) por camada, cada um [batch, cabeças, posições, dim]
+PastKeyValues = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+class PrefixCache:
+    """Keeps the attention cache of frequently used prompt prefixes so prefill can skip them.
+
+    Prompts are split into blocks of `block_size` tokens and each block boundary is
+    keyed by a SHA-256 digest chained over all the token IDs before it; entries keep
+    the prefix token IDs and a hit requires them to match the prompt. A prefix is stored the second time it is
+    seen (system prompts, workflow templates and RAG context repeat; one-off prompts
+    do not) and entries are evicted least recently used once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024, block_size: int = 64, max_seen: int = 8192):
+        self.max_bytes = max_bytes
+        self.block_size = max(1, block_size)
+        self.max_seen = max_seen
+        # digest do prefixo -> (token IDs do prefixo, past_key_values com batch 1)
+        self._entries: "OrderedDict[bytes, Tuple[Tuple[int, ...], PastKeyValues]]" = OrderedDict()
+        self._seen: "OrderedDict[bytes, None]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.tokens_computed = 0
+
+    @staticmethod
+    def _chain(key: bytes, block: List[int]) -> bytes:
+        return hashlib.sha256(key + b''.join(int(t).to_bytes(8, 'little', signed=True) for t in block)).digest()
+
+    def _boundaries(self, token_ids: List[int]) -> List[Tuple[int, bytes]]:
+        """(length, digest) of each block boundary, leaving at least one token to prefill"""
+        boundaries = []
+        key = b''
+        for end in range(self.block_size, len(token_ids), self.block_size):
+            key = self._chain(key, token_ids[end - self.block_size:end])
+            boundaries.append((end, key))
+        return boundaries
+
+    def match(self, token_ids: List[int]) -> Tuple[Optional[PastKeyValues], int]:
+        """Longest cached prefix of the prompt and its length (None, 0 on a miss)"""
+        with self._lock:
+            for length, key in reversed(self._boundaries(token_ids)):
+                entry = self._entries.get(key)
+                # O digest só localiza a entrada: o prefixo tem que ser o mesmo token a token
+                if entry is not None and entry[0] == tuple(token_ids[:length]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.tokens_saved += length
+                    self.tokens_computed += len(token_ids) - length
+                    return entry[1], length
+            self.misses += 1
+            self.tokens_computed += len(token_ids)
+            return None, 0
+
+    def insert(self, token_ids: List[int], past: PastKeyValues, row: int = 0, offset: int = 0) -> None:
+        """Offer the cache just computed for a prompt (row `row` of a batch, starting at column `offset`)"""
+        with self._lock:
+            target = None
+            for length, key in self._boundaries(token_ids):
+                if key in self._seen or key in self._entries:
+                    target = (length, key)
+                self._seen[key] = None
+                self._seen.move_to_end(key)
+            while len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+            if target is None or target[1] in self._entries:
+                return
+            length, key = target
+            prefix = tuple(
+                (k[row:row + 1, :, offset:offset + length].clone(), v[row:row + 1, :, offset:offset + length].clone())
+                for k, v in past
+            )
+            size = sum(k.nbytes + v.nbytes for k, v in prefix)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (tuple(token_ids[:length]), prefix)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= sum(k.nbytes + v.nbytes for k, v in evicted)
+            logger.debug(f"Cached a {length}-token prefix ({size / 1024 / 1024:.1f}MB)")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'block_size': self.block_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'prefill_tokens_saved': self.tokens_saved,
+                'prefill_tokens_computed': self.tokens_computed
+            }
@@ -0,0 +1,152 @@
+import os
+import json
+import math
+import logging
+from typing import Any, Dict
+
+import torch
+from torch import nn
+from transformers import AutoConfig, AutoModelForCausalLM
+from accelerate import init_empty_weights
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_WEIGHTS = 'model.int8.pt'
+QUANTIZATION_REPORT = 'quantization.json'
+
+# Texto de referência para comparar a perplexidade antes e depois da quantização
+SAMPLE_TEXT = (
+    "The system reads documents, splits them into chunks and stores an embedding for each chunk. "
+    "When a question arrives, the most similar chunks are retrieved and given to the language model "
+    "as context, and the model writes an answer based on them. "
+    "O sistema lê documentos, divide o texto em trechos e guarda um vetor para cada trecho. "
+    "Quando chega uma pergunta, os trechos mais parecidos são recuperados e entregues ao modelo "
+    "como contexto, e o modelo escreve uma resposta com base neles. "
+    "def answer(question):\n    chunks = index.search(embed(question), top_k=5)\n"
+    "    return model.generate(prompt(question, chunks))\n"
+)
+
+class QuantizationError(RuntimeError):
+    """Raised when the quantized model loses too much quality against the original weights"""
+
+def _decoder_layers(model) -> nn.ModuleList:
+    return model.get_decoder().layers
+
+def _cast(value, dtype):
+    if torch.is_tensor(value):
+        return value.to(dtype) if value.is_floating_point() else value
+    if isinstance(value, tuple):
+        return tuple(_cast(v, dtype) for v in value)
+    return value
+
+def _install_casts(model) -> None:
+    """Run the int8 layers in float32 while embeddings and the output head keep the loaded dtype"""
+    def to_float32(module, args, kwargs):
+        return _cast(args, torch.float32), {key: _cast(value, torch.float32) for key, value in kwargs.items()}
+
+    def to_head_dtype(module, args):
+        return _cast(args, module.weight.dtype)
+
+    for layer in _decoder_layers(model):
+        layer.register_forward_pre_hook(to_float32, with_kwargs=True)
+    model.get_output_embeddings().register_forward_pre_hook(to_head_dtype)
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the decoder's linear layers, one layer at a time.
+
+    Weights become int8 and activations are quantized on the fly (CPU kernels).
+    Only the decoder layers go through float32: embeddings, the final norm and the
+    output head stay in the loaded dtype (e.g. bf16, half the memory), with casts
+    at the layer boundaries. Converting layer by layer keeps the peak memory at the
+    loaded model plus one float32 layer.
+    """
+    layers = _decoder_layers(model)
+    for i, layer in enumerate(layers):
+        layers[i] = torch.ao.quantization.quantize_dynamic(layer.float(), {nn.Linear}, dtype=torch.qint8)
+    _install_casts(model)
+    return model
+
+@torch.no_grad()
+def perplexity(model, tokenizer, text: str = SAMPLE_TEXT, max_tokens: int = 512) -> float:
+    input_ids = tokenizer(text, return_tensors='pt')['input_ids'][:, :max_tokens].to(model.device)
+    loss = model(input_ids=input_ids, labels=input_ids).loss
+    return math.exp(float(loss))
+
+def quantize_checked(model, tokenizer, max_increase: float = 0.1, text: str = SAMPLE_TEXT) -> Dict[str, Any]:
+    """Quantize in place, comparing perplexity on `text` with the original (e.g. bf16) weights.
+
+    Raises QuantizationError when perplexity grows by more than `max_increase`
+    (0.1 = 10%); the returned report is also attached to the error.
+    """
+    dtype = str(next(model.parameters()).dtype).replace('torch.', '')
+    reference = perplexity(model, tokenizer, text)
+    quantize_int8(model)
+    quantized = perplexity(model, tokenizer, text)
+    report = {
+        'scheme': 'dynamic_int8',
+        'reference_dtype': dtype,
+        'reference_perplexity': reference,
+        'quantized_perplexity': quantized,
+        'perplexity_increase': quantized / reference - 1,
+        'max_increase': max_increase
+    }
+    report['accepted'] = report['perplexity_increase'] <= max_increase
+    logger.info(
+        f"Perplexity {dtype}: {reference:.3f}, int8: {quantized:.3f} ({100 * report['perplexity_increase']:+.1f}%)"
+    )
+    if not report['accepted']:
+        error = QuantizationError(
+            f"int8 perplexity is {100 * report['perplexity_increase']:.1f}% above {dtype} "
+            f"(limit {100 * max_increase:.0f}%)"
+        )
+        error.report = report
+        raise error
+    return report
+
+def write_report(path: str, report: Dict[str, Any]) -> None:
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, QUANTIZATION_REPORT), 'w') as f:
+        json.dump(report, f, indent=2)
+
+def read_report(path: str) -> Dict[str, Any]:
+    report_path = os.path.join(path, QUANTIZATION_REPORT)
+    if not os.path.exists(report_path):
+        return {}
+    with open(report_path) as f:
+        return json.load(f)
+
+def has_quantized(path: str) -> bool:
+    return os.path.exists(os.path.join(path, QUANTIZED_WEIGHTS))
+
+def save_quantized(model, path: str, report: Dict[str, Any]) -> None:
+    """Save a quantized model as config + state dict, so it reloads without the original weights"""
+    os.makedirs(path, exist_ok=True)
+    model.config.save_pretrained(path)
+    tmp_path = os.path.join(path, QUANTIZED_WEIGHTS + '.tmp')
+    torch.save(model.state_dict(), tmp_path)
+    # Gravação atômica: um checkpoint incompleto nunca é encontrado por has_quantized
+    os.replace(tmp_path, os.path.join(path, QUANTIZED_WEIGHTS))
+    write_report(path, report)
+
+def _swap_linear(module: nn.Module) -> None:
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear):
+            setattr(module, name, torch.ao.nn.quantized.dynamic.Linear(
+                child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8
+            ))
+        else:
+            _swap_linear(child)
+
+def load_quantized(path: str):
+    """Rebuild a model saved by save_quantized: empty skeleton, int8 linear layers, then the weights"""
+    config = AutoConfig.from_pretrained(path)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32)
+    for layer in _decoder_layers(model):
+        _swap_linear(layer)
+    # mmap: os pesos vêm do arquivo sob demanda, sem uma segunda cópia em memória
+    state = torch.load(os.path.join(path, QUANTIZED_WEIGHTS), mmap=True, weights_only=True)
+    model.load_state_dict(state, assign=True)
+    model.tie_weights()
+    _install_casts(model)
+    return model.eval()
@@ -1,26 +1,192 @@
+import io
 import os
-from typing import List, Dict, Any
+import json
+import tempfile
+import time
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Union
 from PyPDF2 import PdfReader
 from docx import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
 import numpy as np
-import faiss
 import torch
 import logging
+from utils.config import Config
+from .sharded_index import ShardedIndex, get_shard_pool
+from .embedding_batcher import EmbeddingBatcher
+from .chunker import TokenChunker, read_text_windows
+from .text_store import ChunkTextStore
+from .vector_index import (
+    NumpyFlatIndex, QuantizedFlatIndex, VectorStore, DimensionReducer, ReducedIndex, load_faiss, mmr_select
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class RAGPipeline:
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Encoders compartilhados entre todas as coleções do processo
+_encoders: Dict[str, SentenceTransformer] = {}
+_encoders_lock = threading.Lock()
+_query_batchers: Dict[str, EmbeddingBatcher] = {}
+_query_batchers_lock = threading.Lock()
+_chunkers: Dict[str, TokenChunker] = {}
+_chunkers_lock = threading.Lock()
+
+def get_encoder(model_name: str) -> SentenceTransformer:
+    """Load a SentenceTransformer once per process and share it"""
+    with _encoders_lock:
+        if model_name not in _encoders:
+            logger.info(f"Loading SentenceTransformer model {model_name}")
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Using device: {device}")
+            _encoders[model_name] = SentenceTransformer(model_name, device=device)
+            logger.info("Model loaded successfully")
+        return _encoders[model_name]
+
+def get_query_batcher(model_name: str) -> EmbeddingBatcher:
+    """Query embedding batcher shared by every collection using the same encoder"""
+    with _query_batchers_lock:
+        if model_name not in _query_batchers:
+            config = Config()
+            encoder = get_encoder(model_name)
+            _query_batchers[model_name] = EmbeddingBatcher(
+                lambda texts: encoder.encode(
+                    texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False
+                ),
+                max_batch_size=config.QUERY_BATCH_MAX_SIZE,
+                max_wait_ms=config.QUERY_BATCH_MAX_WAIT_MS,
+                name=model_name
+            )
+        return _query_batchers[model_name]
+
+def get_chunker(model_name: str) -> Optional[TokenChunker]:
+    """Token chunker aligned with the encoder's tokenizer and window, or None if unavailable"""
+    with _chunkers_lock:
+        if model_name not in _chunkers:
+            config = Config()
+            encoder = get_encoder(model_name)
+            # A janela do encoder inclui os tokens especiais ([CLS] e [SEP])
+            chunk_tokens = min(config.RAG_CHUNK_TOKENS, encoder.max_seq_length - 2)
+            try:
+                _chunkers[model_name] = TokenChunker(
+                    encoder.tokenizer, chunk_tokens, min(config.RAG_CHUNK_OVERLAP_TOKENS, chunk_tokens - 1)
+                )
+            except ValueError as e:
+                logger.warning(f"Token chunking unavailable, splitting by characters: {e}")
+                _chunkers[model_name] = None
+        return _chunkers[model_name]
+
+def query_batcher_stats() -> Dict[str, Any]:
+    return {name: batcher.get_stats() for name, batcher in _query_batchers.items()}
+
+def encode_texts(texts: List[str], model_name: str = EMBEDDING_MODEL, batch_size: int = 64) -> np.ndarray:
+    """Embed texts with a shared encoder in one batched call"""
+    return get_encoder(model_name).encode(
+        texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+    )
+
+class _ReadWriteLock:
+    """Concurrent readers (searches) or one reentrant writer (load, upload, unload)"""
+
     def __init__(self):
-        logger.info("Initializing RAGPipeline")
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            nested = self._writer == me
+            if not nested:
+                # Escritores têm preferência para que uploads não esperem indefinidamente
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @property
+    def writing(self) -> bool:
+        """True while a writer holds or waits for the lock"""
+        return self._writer is not None or self._writers_waiting > 0
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+class RAGPipeline:
+    VECTORS_FILE = 'vectors.f32'
+    REDUCER_FILE = 'reducer.npz'
+    STORE_FILE = 'store.json'
+    TEXTS_FILE = 'chunks.dat'
+
+    def __init__(self, name: str = 'default', storage_dir: Optional[str] = None, token_counter=None):
+        logger.info(f"Initializing RAGPipeline for collection '{name}'")
+        self.config = Config()
+        self.name = name
+        self.storage_dir = storage_dir
+        self.loaded = storage_dir is None
+        self._lock = _ReadWriteLock()
+        # Serializa os uploads da coleção (a codificação dos lotes roda fora de self._lock)
+        self._ingest_lock = threading.Lock()
         self.documents = {}
-        self.chunks = {}
-        self.embeddings = None
+        # Próximo id de documento; nunca reaproveitado, nem de uploads desfeitos (chave do cache semântico)
+        self.next_document_id = 1
+        # Texto de cada chunk, na mesma ordem de chunk_ids e dos vetores, em blocos comprimidos
+        self.texts: Optional[ChunkTextStore] = None if storage_dir else self._open_texts()
+        # Conta tokens com o tokenizer do LLM (tokenizer_name e count_tokens, como no LLMManager)
+        self.token_counter = token_counter
+        # Tokens do LLM em cada chunk, por documento: (tokenizer usado, contagens); ausente sem o tokenizer
+        self.llm_tokens: Dict[int, Tuple[str, List[int]]] = {}
+        # Posição no índice -> (doc_id, posição do chunk no documento)
+        self.chunk_ids: List[Tuple[int, int]] = []
+        # Única cópia float32 dos vetores; o índice pode guardar só códigos quantizados
+        self.vectors: Optional[VectorStore] = None
+        self.reducer: Optional[DimensionReducer] = None
         self.index = None
         self.model = None
+        # Modelo dos vetores da coleção; trocado só pela migração (migrate_model)
+        self.embedding_model = self.config.RAG_EMBEDDING_MODEL
+        # Versão dos arquivos de vetores/redutor; cada migração grava uma versão nova ao lado da atual
+        self.vectors_version = 0
+        self._migration: Optional[Dict[str, Any]] = None
+        self._migration_thread: Optional[threading.Thread] = None
+        # Posição a partir da qual a migração em andamento precisa recodificar (upload desfeito)
+        self._migration_rewind: Optional[int] = None
+        # Progresso da ingestão em andamento, por arquivo; lido sem o lock da coleção
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._progress_lock = threading.Lock()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
@@ -29,35 +195,276 @@ class RAGPipeline:
         
     def _load_model(self):
         if self.model is None:
-            logger.info("Loading SentenceTransformer model")
             try:
-                model_name = "all-MiniLM-L6-v2"
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-                logger.info(f"Using device: {device}")
-                self.model = SentenceTransformer(model_name, device=device)
-                logger.info("Model loaded successfully")
+                self.model = get_encoder(self.embedding_model)
             except Exception as e:
                 logger.error(f"Error loading model: {str(e)}")
                 raise
     
-    def _extract_text_from_pdf(self, file_path: str) -> str:
-        logger.info(f"Extracting text from PDF: {file_path}")
+    def _open_texts(self) -> ChunkTextStore:
+        path = os.path.join(self.storage_dir, self.TEXTS_FILE) if self.storage_dir else None
+        if path:
+            os.makedirs(self.storage_dir, exist_ok=True)
+        return ChunkTextStore(
+            path,
+            codec=self.config.RAG_CHUNK_TEXT_CODEC,
+            block_bytes=self.config.RAG_CHUNK_TEXT_BLOCK_KB * 1024,
+            cache_bytes=self.config.RAG_CHUNK_TEXT_CACHE_MB * 1024 * 1024
+        )
+    
+    def load(self):
+        """Load the persisted vectors and chunk store of this collection"""
+        if self.loaded:
+            return
+        with self._lock.write():
+            if self.loaded:
+                return
+            store_path = os.path.join(self.storage_dir, self.STORE_FILE)
+            if os.path.exists(store_path):
+                logger.info(f"Loading collection '{self.name}' from {self.storage_dir}")
+                with open(store_path, 'r', encoding='utf-8') as f:
+                    store = json.load(f)
+                self.documents = {int(k): v for k, v in store['documents'].items()}
+                self.next_document_id = max(store.get('next_document_id', 1), max(self.documents, default=0) + 1)
+                # O antigo 'chunk_tokens' (tokens do encoder) não serve para o orçamento do LLM e é ignorado
+                self.llm_tokens = {int(k): (v[0], v[1]) for k, v in store.get('llm_tokens', {}).items()}
+                self.chunk_ids = [tuple(pair) for pair in store['chunk_ids']]
+                self.texts = self._open_texts()
+                if 'chunks' in store and not len(self.texts):
+                    # store.json antigo com os textos em JSON: importados uma vez para o arquivo de blocos
+                    chunks = {int(k): v for k, v in store['chunks'].items()}
+                    self.texts.append([chunks[doc_id][chunk_idx] for doc_id, chunk_idx in self.chunk_ids])
+                    self.texts.flush()
+                    del chunks, store['chunks']
+                # Textos gravados depois do último store.json válido são descartados
+                self.texts.truncate(len(self.chunk_ids))
+                # Coleções gravadas antes da migração de modelos usam o modelo original
+                self.embedding_model = store.get('embedding_model', EMBEDDING_MODEL)
+                self.vectors_version = store.get('vectors_version', 0)
+                if self.embedding_model != self.config.RAG_EMBEDDING_MODEL:
+                    logger.warning(
+                        f"Collection '{self.name}' is embedded with {self.embedding_model}, "
+                        f"not {self.config.RAG_EMBEDDING_MODEL}; run a model migration to switch"
+                    )
+                vectors_path = self._version_path(self.VECTORS_FILE, self.vectors_version)
+                reducer_path = self._version_path(self.REDUCER_FILE, self.vectors_version)
+                if os.path.exists(reducer_path):
+                    self.reducer = DimensionReducer.load(reducer_path)
+                if store.get('dimension') and os.path.exists(vectors_path):
+                    self.vectors = VectorStore(store['dimension'], vectors_path)
+                    # Linhas gravadas depois do último store.json válido são descartadas
+                    self.vectors.truncate(len(self.chunk_ids))
+                    self._build_index()
+            else:
+                self.texts = self._open_texts()
+                self.texts.truncate(0)
+            self.loaded = True
+    
+    @contextmanager
+    def _reading(self):
+        """Hold the read lock on a loaded collection, reloading it if it is evicted meanwhile"""
+        while True:
+            self.load()
+            with self._lock.read():
+                if self.loaded:
+                    yield
+                    return
+    
+    def save(self):
+        """Persist the vectors and chunk store, replacing the previous files atomically"""
+        if self.storage_dir is None:
+            return
+        with self._lock.write():
+            os.makedirs(self.storage_dir, exist_ok=True)
+            store_path = os.path.join(self.storage_dir, self.STORE_FILE)
+            # Blocos de texto e seu índice vão para o disco antes do store.json que os referencia
+            self.texts.flush()
+            with open(store_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'documents': self.documents,
+                    'next_document_id': self.next_document_id,
+                    'llm_tokens': self.llm_tokens,
+                    'chunk_ids': self.chunk_ids,
+                    'dimension': self.vectors.d if self.vectors else None,
+                    'embedding_model': self.embedding_model,
+                    'vectors_version': self.vectors_version
+                }, f)
+            # Os vetores já foram anexados ao arquivo em _index_batch; um 'chunks' antigo deixa de ser gravado
+            os.replace(store_path + '.tmp', store_path)
+    
+    @property
+    def writing(self) -> bool:
+        """True while an upload, load or model migration is changing this collection"""
+        migrating = self._migration_thread is not None and self._migration_thread.is_alive()
+        return self._lock.writing or self._ingest_lock.locked() or migrating
+    
+    def unload(self):
+        """Drop the in-memory index and chunks; they are reloaded lazily on next use"""
+        if self.storage_dir is None:
+            return
+        with self._lock.write():
+            logger.info(f"Evicting collection '{self.name}' from memory")
+            self.documents = {}
+            self.next_document_id = 1
+            if self.texts is not None:
+                self.texts.close()
+            self.texts = None
+            self.llm_tokens = {}
+            self.chunk_ids = []
+            self.vectors = None
+            self.reducer = None
+            self.model = None
+            self._release_index()
+            self.loaded = False
+    
+    def _base_index(self):
+        """The index holding the vectors, without the dimension reduction wrapper"""
+        return self.index.index if isinstance(self.index, ReducedIndex) else self.index
+    
+    def _release_index(self):
+        if isinstance(self._base_index(), ShardedIndex):
+            self._base_index().release()
+        self.index = None
+    
+    def _version_path(self, name: str, version: int) -> Optional[str]:
+        """Path of a vectors/reducer file for a version; version 0 keeps the original name"""
+        if self.storage_dir is None:
+            return None
+        if version:
+            base, ext = os.path.splitext(name)
+            name = f"{base}.v{version}{ext}"
+        return os.path.join(self.storage_dir, name)
+    
+    def _new_index(self, vectors: VectorStore, reducer: Optional[DimensionReducer], expected_vectors: int = 0):
+        """Create the search index, wrapped in a ReducedIndex once a reducer is fitted"""
+        if reducer is not None:
+            index = self._new_base_index(reducer.output_dim, expected_vectors, vectors, reducer, rescore=False)
+            # O re-score em float32 é feito na dimensão original, pelo ReducedIndex
+            return ReducedIndex(index, reducer, vectors, self.config.RAG_RESCORE_FACTOR)
+        return self._new_base_index(vectors.d, expected_vectors, vectors, None)
+    
+    def _new_base_index(self, dimension: int, expected_vectors: int, vectors: VectorStore,
+                        reducer: Optional[DimensionReducer], rescore: bool = True):
+        """Pick the search index for a collection of the given size.
+
+        Sharded when RAG_SEARCH_SHARDS > 1; quantized when RAG_VECTOR_STORAGE is
+        float16 or int8; otherwise NumPy exact search for small collections (or when
+        faiss is missing) and a FAISS flat index above RAG_EXACT_SEARCH_MAX_VECTORS.
+        """
+        if self.config.RAG_SEARCH_SHARDS > 1:
+            return ShardedIndex(get_shard_pool(self.config.RAG_SEARCH_SHARDS), dimension)
+        if self.config.RAG_VECTOR_STORAGE != 'float32':
+            return QuantizedFlatIndex(
+                dimension,
+                vectors,
+                kind=self.config.RAG_VECTOR_STORAGE,
+                rescore_factor=self.config.RAG_RESCORE_FACTOR if rescore else 1,
+                transform=reducer.transform if reducer is not None else None,
+                block_size=self.config.RAG_EXACT_SEARCH_BLOCK_SIZE
+            )
+        if expected_vectors > self.config.RAG_EXACT_SEARCH_MAX_VECTORS:
+            faiss = load_faiss()
+            if faiss is not None:
+                return faiss.IndexFlatL2(dimension)
+        return NumpyFlatIndex(dimension, block_size=self.config.RAG_EXACT_SEARCH_BLOCK_SIZE)
+    
+    def _make_index(self, vectors: VectorStore, reducer: Optional[DimensionReducer]):
+        """Build an index over every vector of a store, one block at a time"""
+        count = len(vectors)
+        index = self._new_index(vectors, reducer, count)
+        block_size = self.config.RAG_EXACT_SEARCH_BLOCK_SIZE
+        for start in range(0, count, block_size):
+            index.add(vectors.view(start, min(start + block_size, count)))
+        return index
+    
+    def _build_index(self):
+        """Rebuild the in-memory index from the vector store"""
+        self._release_index()
+        self.index = self._make_index(self.vectors, self.reducer)
+    
+    def _maybe_promote_index(self):
+        """Move a NumPy index that outgrew the exact search threshold to FAISS"""
+        if type(self._base_index()) is not NumpyFlatIndex:
+            return
+        if self.index.ntotal <= self.config.RAG_EXACT_SEARCH_MAX_VECTORS or load_faiss() is None:
+            return
+        logger.info(f"Collection '{self.name}' has {self.index.ntotal} vectors, switching to FAISS")
+        self._build_index()
+    
+    def _fit_reducer(self) -> bool:
+        """Fit the configured dimension reduction once there are enough vectors; True if fitted now"""
+        if self.reducer is not None:
+            return False
+        self.reducer = self._train_reducer(self.vectors, self.vectors_version)
+        return self.reducer is not None
+    
+    def _train_reducer(self, vectors: VectorStore, version: int) -> Optional[DimensionReducer]:
+        """Fit and persist the configured reducer for a vector store, or None if not applicable yet"""
+        method = self.config.RAG_DIM_REDUCTION
+        if method == 'none':
+            return None
+        if method == 'pca' and len(vectors) < max(self.config.RAG_PCA_MIN_VECTORS, self.config.RAG_REDUCED_DIM):
+            return None
         try:
-            with open(file_path, 'rb') as file:
-                reader = PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                logger.info(f"Successfully extracted {len(text)} characters from PDF")
-                return text
+            reducer = DimensionReducer(method, vectors.d, self.config.RAG_REDUCED_DIM)
+        except ValueError as e:
+            logger.warning(f"Dimension reduction disabled: {e}")
+            return None
+        reducer.fit(vectors.view(0, len(vectors)))
+        if self.storage_dir:
+            reducer.save(self._version_path(self.REDUCER_FILE, version))
+        logger.info(f"Collection '{self.name}' reduced to {reducer.output_dim} dimensions ({method})")
+        return reducer
+    
+    def index_stats(self) -> Dict[str, Any]:
+        if self.index is None:
+            return {'type': None, 'ntotal': 0}
+        base = self._base_index()
+        if isinstance(base, NumpyFlatIndex):
+            stats = base.get_stats()
+        else:
+            stats = {'type': 'sharded' if isinstance(base, ShardedIndex) else 'faiss', 'ntotal': base.ntotal}
+        if self.reducer is not None:
+            stats['reduction'] = self.reducer.get_stats()
+        return stats
+    
+    def text_stats(self) -> Optional[Dict[str, Any]]:
+        """Compression and hot-cache statistics of the chunk text store"""
+        return self.texts.get_stats() if self.texts is not None else None
+    
+    def memory_usage(self) -> int:
+        """Approximate bytes held in memory by this collection"""
+        if not self.loaded:
+            return 0
+        size = 0
+        base = self._base_index()
+        if isinstance(base, NumpyFlatIndex):
+            size += base.nbytes
+        elif base is not None:
+            size += base.ntotal * base.d * 4
+        if self.vectors is not None:
+            size += self.vectors.nbytes
+        if self.texts is not None:
+            size += self.texts.nbytes
+        return size
+    
+    def _extract_text_from_pdf(self, source: Union[str, io.BytesIO]) -> str:
+        logger.info(f"Extracting text from PDF: {getattr(source, 'name', 'in-memory upload')}")
+        try:
+            reader = PdfReader(source)
+            text = ""
+            for page in reader.pages:
+                text += page.extract_text() + "\n"
+            logger.info(f"Successfully extracted {len(text)} characters from PDF")
+            return text
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
     
-    def _extract_text_from_docx(self, file_path: str) -> str:
-        logger.info(f"Extracting text from DOCX: {file_path}")
+    def _extract_text_from_docx(self, source: Union[str, io.BytesIO]) -> str:
+        logger.info(f"Extracting text from DOCX: {getattr(source, 'name', 'in-memory upload')}")
         try:
-            doc = Document(file_path)
+            doc = Document(source)
             text = ""
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
@@ -67,19 +474,22 @@ class RAGPipeline:
             logger.error(f"Error extracting text from DOCX: {str(e)}")
             raise
     
-    def _extract_text(self, file_path: str) -> str:
-        logger.info(f"Extracting text from: {file_path}")
+    def _extract_text(self, source: Union[str, io.BytesIO], ext: str) -> str:
+        """Extract the text of a file path or an in-memory upload with the given extension"""
+        logger.info(f"Extracting text from {ext} upload")
         try:
-            ext = os.path.splitext(file_path)[1].lower()
             if ext == '.pdf':
-                return self._extract_text_from_pdf(file_path)
+                return self._extract_text_from_pdf(source)
             elif ext in ['.docx', '.doc']:
-                return self._extract_text_from_docx(file_path)
+                return self._extract_text_from_docx(source)
             elif ext == '.txt':
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
-                    logger.info(f"Successfully extracted {len(text)} characters from TXT")
-                    return text
+                if isinstance(source, io.BytesIO):
+                    text = source.getvalue().decode('utf-8')
+                else:
+                    with open(source, 'r', encoding='utf-8') as file:
+                        text = file.read()
+                logger.info(f"Successfully extracted {len(text)} characters from TXT")
+                return text
             else:
                 msg = f"Unsupported file type: {ext}"
                 logger.error(msg)
@@ -88,115 +498,493 @@ class RAGPipeline:
             logger.error(f"Error in _extract_text: {str(e)}")
             raise
     
-    def _create_chunks(self, text: str) -> List[str]:
-        logger.info(f"Creating chunks from text of length {len(text)}")
-        try:
-            chunks = self.text_splitter.split_text(text)
-            logger.info(f"Created {len(chunks)} chunks")
-            return chunks
-        except Exception as e:
-            logger.error(f"Error creating chunks: {str(e)}")
-            raise
+    def _iter_chunks(self, pieces) -> Iterator[Tuple[str, Optional[int]]]:
+        """Yield (chunk, token count) pairs for text arriving in line-aligned pieces.
+
+        The token chunker carries its unfinished window across pieces; the character
+        splitter (fallback, token count None) splits each piece on its own.
+        """
+        chunker = None
+        if self.config.RAG_CHUNKER == 'tokens':
+            self._load_model()
+            chunker = get_chunker(self.embedding_model)
+        if chunker is not None:
+            yield from chunker.split_stream(pieces)
+            return
+        for piece in pieces:
+            for chunk in self.text_splitter.split_text(piece):
+                yield chunk, None
     
     def _compute_embeddings(self, chunks: List[str]) -> np.ndarray:
         logger.info(f"Computing embeddings for {len(chunks)} chunks")
         try:
             self._load_model()
-            embeddings = self.model.encode(chunks, convert_to_tensor=True)
+            embeddings = self.model.encode(chunks, convert_to_tensor=True, show_progress_bar=False)
             logger.info(f"Successfully computed embeddings with shape {embeddings.shape}")
             return embeddings
         except Exception as e:
             logger.error(f"Error computing embeddings: {str(e)}")
             raise
     
-    def _update_index(self):
-        logger.info("Updating FAISS index")
+    def _update_index(self, doc_id: int, chunks: List[str], start: int = 0):
+        """Index chunks of a document, the first being its chunk `start`, in bounded batches.
+
+        Each batch is encoded without the collection lock, so searches keep running;
+        the write lock is only held to append it.
+        """
+        logger.info(f"Updating index with chunks from document {doc_id}")
         try:
-            if not self.chunks:
+            if not chunks:
                 logger.info("No chunks to index")
                 return
-                
-            all_chunks = []
-            for doc_chunks in self.chunks.values():
-                all_chunks.extend(doc_chunks)
-                
-            embeddings = self._compute_embeddings(all_chunks)
-            dimension = embeddings.shape[1]
-            
-            if self.index is None:
-                logger.info(f"Creating new FAISS index with dimension {dimension}")
-                self.index = faiss.IndexFlatL2(dimension)
-                
-            if isinstance(embeddings, torch.Tensor):
-                embeddings = embeddings.cpu().numpy()
-                
-            self.index.add(embeddings)
-            self.embeddings = embeddings
-            logger.info("Successfully updated index")
+            batch_size = max(1, self.config.RAG_EMBED_BATCH_SIZE)
+            for first in range(0, len(chunks), batch_size):
+                batch = chunks[first:first + batch_size]
+                model_name = self.embedding_model
+                embeddings = self._embed_batch(batch)
+                counted = self._count_llm_tokens(batch)
+                with self._lock.write():
+                    if model_name != self.embedding_model:
+                        # Uma migração trocou o modelo enquanto o lote era codificado
+                        embeddings = self._embed_batch(batch)
+                    self._index_batch(doc_id, start + first, batch, embeddings)
+                    self._record_llm_tokens(doc_id, start + first, counted)
+            with self._lock.write():
+                self._maybe_promote_index()
+                logger.info(f"Successfully updated index ({self.index.ntotal} vectors)")
         except Exception as e:
             logger.error(f"Error updating index: {str(e)}")
             raise
     
+    def _embed_batch(self, batch: List[str]) -> np.ndarray:
+        # Apenas os chunks novos são codificados; os anteriores já estão no índice
+        embeddings = self._compute_embeddings(batch)
+        if isinstance(embeddings, torch.Tensor):
+            embeddings = embeddings.cpu().numpy()
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def _count_llm_tokens(self, batch: List[str]) -> Optional[Tuple[str, List[int]]]:
+        """(tokenizer, counts) of a batch with the LLM tokenizer, or None if it is not available"""
+        if self.token_counter is None:
+            return None
+        try:
+            return self.token_counter.count_tokens(batch)
+        except Exception as e:
+            logger.warning(f"Could not count LLM tokens: {str(e)}")
+            return None
+    
+    def _record_llm_tokens(self, doc_id: int, first: int, counted: Optional[Tuple[str, List[int]]]):
+        # Só documentos contados inteiros com o mesmo tokenizer guardam contagens
+        entry = self.llm_tokens.get(doc_id)
+        if first == 0 and counted is not None:
+            self.llm_tokens[doc_id] = (counted[0], list(counted[1]))
+        elif entry is not None and counted is not None and counted[0] == entry[0] and len(entry[1]) == first:
+            entry[1].extend(counted[1])
+        else:
+            self.llm_tokens.pop(doc_id, None)
+    
+    def _index_batch(self, doc_id: int, first: int, batch: List[str], embeddings: np.ndarray):
+        dimension = embeddings.shape[1]
+        
+        if self.vectors is None:
+            vectors_path = self._version_path(self.VECTORS_FILE, self.vectors_version)
+            if vectors_path:
+                os.makedirs(self.storage_dir, exist_ok=True)
+            self.vectors = VectorStore(dimension, vectors_path)
+            
+        # Primeiro no arquivo float32: é a fonte do re-score e das reconstruções do índice
+        self.vectors.append(embeddings)
+        self.texts.append(batch)
+        self.chunk_ids.extend((doc_id, first + i) for i in range(len(batch)))
+        if self._fit_reducer() or self.index is None:
+            logger.info(f"Building index with dimension {self.reducer.output_dim if self.reducer else dimension}")
+            self._build_index()
+        else:
+            self.index.add(embeddings)
+    
+    def _receive_upload(self, file, name: str) -> Tuple[Union[str, io.BytesIO], int]:
+        """Read a small upload into memory, or spool a large one to a temporary file.
+
+        Uploads up to RAG_IN_MEMORY_UPLOAD_KB are returned as BytesIO and parsed
+        without touching the disk; larger ones are copied in RAG_UPLOAD_CHUNK_KB
+        blocks to a temporary file (the caller removes it), enforcing RAG_MAX_UPLOAD_MB.
+        """
+        stream = getattr(file, 'stream', file)
+        try:
+            stream.seek(0, os.SEEK_END)
+            self._set_progress(name, bytes_total=stream.tell())
+            stream.seek(0)
+        except (AttributeError, OSError):
+            pass
+        
+        in_memory = self.config.RAG_IN_MEMORY_UPLOAD_KB * 1024
+        head = stream.read(in_memory + 1)
+        if len(head) <= in_memory:
+            self._set_progress(name, bytes_spooled=len(head))
+            return io.BytesIO(head), len(head)
+        
+        block_size = self.config.RAG_UPLOAD_CHUNK_KB * 1024
+        max_bytes = self.config.RAG_MAX_UPLOAD_MB * 1024 * 1024
+        os.makedirs(self.config.RAG_UPLOAD_TMP_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1].lower(), dir=self.config.RAG_UPLOAD_TMP_DIR)
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                block = head
+                while block:
+                    written += len(block)
+                    if written > max_bytes:
+                        raise ValueError(f"File too large (max {self.config.RAG_MAX_UPLOAD_MB}MB)")
+                    out.write(block)
+                    self._set_progress(name, bytes_spooled=written)
+                    block = stream.read(block_size)
+        except Exception:
+            os.remove(path)
+            raise
+        logger.info(f"Spooled {written} bytes to {path}")
+        return path, written
+    
+    def _set_progress(self, name: str, **fields):
+        with self._progress_lock:
+            entry = self._progress.setdefault(name, {'file': name, 'status': 'uploading', 'started': time.time()})
+            entry.update(fields)
+            entry['elapsed'] = time.time() - entry['started']
+    
+    def get_progress(self) -> List[Dict[str, Any]]:
+        """Progress of the files in the current (or last) upload to this collection"""
+        with self._progress_lock:
+            return [dict(entry) for entry in self._progress.values()]
+    
+    def _ingest(self, doc_id: int, source: Union[str, io.BytesIO], ext: str, name: str):
+        """Chunk and index an upload, streaming spooled .txt files through mmap windows"""
+        # Só o lote ainda não indexado fica em memória; os textos indexados vão para self.texts
+        pending = []
+        if ext == '.txt' and not isinstance(source, io.BytesIO):
+            pieces = self._track_read(read_text_windows(source, self.config.RAG_TEXT_WINDOW_MB * 1024 * 1024), name)
+        else:
+            text = self._extract_text(source, ext)
+            logger.info(f"Extracted {len(text)} characters of text")
+            pieces = [text]
+        
+        self._set_progress(name, status='indexing')
+        batch_size = max(1, self.config.RAG_EMBED_BATCH_SIZE)
+        indexed = 0
+        for chunk, _ in self._iter_chunks(pieces):
+            pending.append(chunk)
+            if len(pending) >= batch_size:
+                self._update_index(doc_id, pending, start=indexed)
+                indexed += len(pending)
+                pending = []
+                self._set_progress(name, chunks=indexed)
+        self._update_index(doc_id, pending, start=indexed)
+        indexed += len(pending)
+        self._set_progress(name, chunks=indexed)
+        logger.info(f"Created {indexed} chunks")
+    
+    def _track_read(self, pieces, name: str):
+        read = 0
+        for piece in pieces:
+            read += len(piece.encode('utf-8'))
+            self._set_progress(name, bytes_read=read)
+            yield piece
+    
+    def _discard_document(self, doc_id: int, indexed_before: int):
+        """Remove a document whose ingestion failed, including vectors already appended"""
+        self.documents.pop(doc_id, None)
+        self.llm_tokens.pop(doc_id, None)
+        if len(self.chunk_ids) > indexed_before:
+            del self.chunk_ids[indexed_before:]
+            self.vectors.truncate(indexed_before)
+            self.texts.truncate(indexed_before)
+            self._build_index()
+            if self._migration_rewind is None or indexed_before < self._migration_rewind:
+                self._migration_rewind = indexed_before
+    
     def process_documents(self, files) -> List[Dict[str, Any]]:
-        logger.info(f"Processing {len(files)} documents")
+        # Um upload por vez em cada coleção; o lock de escrita só é tomado para anexar cada lote
+        with self._ingest_lock:
+            with self._progress_lock:
+                self._progress = {}
+            self.load()
+            processed = self._process_documents(files)
+            self.save()
+            return processed
+    
+    def _process_documents(self, files) -> List[Dict[str, Any]]:
+        logger.info(f"Processing {len(files)} documents into collection '{self.name}'")
         processed = []
         
         for file in files:
+            doc_id = None
+            source = None
+            indexed_before = len(self.chunk_ids)
             try:
                 # Log file info
                 logger.info(f"Processing file: {file.filename}")
                 logger.info(f"File object type: {type(file)}")
                 
-                # Salvar o arquivo
+                # Arquivos pequenos ficam em memória; grandes vão para um temporário em disco
                 filename = file.filename
-                filepath = os.path.join('uploads', filename)
-                logger.info(f"Saving file to: {filepath}")
+                ext = os.path.splitext(filename)[1].lower()
+                source, size = self._receive_upload(file, filename)
+                logger.info(f"Received {filename} ({size} bytes, {'in memory' if isinstance(source, io.BytesIO) else source})")
                 
-                # Criar diretório se não existir
-                os.makedirs('uploads', exist_ok=True)
-                
-                # Salvar arquivo
-                file.save(filepath)
-                logger.info(f"File saved successfully: {filepath}")
-                
-                # Extrair texto
-                text = self._extract_text(filepath)
-                logger.info(f"Extracted {len(text)} characters of text")
-                
-                # Criar chunks
-                doc_chunks = self._create_chunks(text)
-                logger.info(f"Created {len(doc_chunks)} chunks")
-                
-                # Armazenar documento e chunks
-                doc_id = len(self.documents) + 1
-                self.documents[doc_id] = {
-                    'id': doc_id,
-                    'name': filename,
-                    'path': filepath,
-                    'status': 'processed'
-                }
-                self.chunks[doc_id] = doc_chunks
+                # Armazenar documento; chunks e vetores são adicionados em lotes
+                with self._lock.write():
+                    indexed_before = len(self.chunk_ids)
+                    doc_id = self.next_document_id
+                    self.next_document_id += 1
+                    self.documents[doc_id] = {
+                        'id': doc_id,
+                        'name': filename,
+                        'size': size,
+                        'collection': self.name,
+                        'status': 'processed'
+                    }
+                self._ingest(doc_id, source, ext, filename)
+                self._set_progress(filename, status='processed', vectors=len(self.chunk_ids) - indexed_before)
                 
                 processed.append(self.documents[doc_id])
                 logger.info(f"Document {filename} processed successfully")
                 
-                # Atualizar índice
-                self._update_index()
-                
             except Exception as e:
                 logger.error(f"Error processing document {file.filename}: {str(e)}")
                 logger.exception("Full traceback:")
+                if doc_id is not None:
+                    with self._lock.write():
+                        self._discard_document(doc_id, indexed_before)
+                self._set_progress(file.filename, status='error', error=str(e))
                 processed.append({
                     'name': file.filename,
                     'status': 'error',
                     'error': str(e)
                 })
+            finally:
+                if isinstance(source, str) and os.path.exists(source):
+                    os.remove(source)
                 
         return processed
     
-    def query(self, query_text: str, top_k: int = 5) -> Dict[str, Any]:
-        logger.info(f"Querying with text: {query_text}")
-        if not self.index or not self.chunks:
+    def migrate_model(self, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """Start re-embedding the collection with another model in a background thread.
+
+        The stored chunk texts are encoded in throttled batches into a new vectors
+        version next to the live one; queries keep using the old version until the
+        new index is complete, then both are swapped under the write lock.
+        """
+        model_name = model_name or self.config.RAG_EMBEDDING_MODEL
+        self.load()
+        with self._progress_lock:
+            if self._migration_thread is not None and self._migration_thread.is_alive():
+                raise RuntimeError(f"A model migration of collection '{self.name}' is already running")
+            if model_name == self.embedding_model:
+                raise ValueError(f"Collection '{self.name}' is already embedded with {model_name}")
+            version = self.vectors_version + 1
+            self._migration = {
+                'status': 'running',
+                'from_model': self.embedding_model,
+                'to_model': model_name,
+                'version': version,
+                'embedded': 0,
+                'total': len(self.chunk_ids),
+                'started': time.time()
+            }
+            self._migration_rewind = None
+            self._migration_thread = threading.Thread(
+                target=self._run_migration, args=(model_name, version),
+                name=f"migrate-{self.name}", daemon=True
+            )
+            self._migration_thread.start()
+        logger.info(f"Migrating collection '{self.name}' to {model_name} (vectors version {version})")
+        return self.migration_status()
+    
+    def migration_status(self) -> Dict[str, Any]:
+        with self._progress_lock:
+            if self._migration is None:
+                return {'status': 'idle', 'embedding_model': self.embedding_model, 'version': self.vectors_version}
+            status = dict(self._migration)
+        status['elapsed'] = (status.get('finished') or time.time()) - status['started']
+        return status
+    
+    def _set_migration(self, **fields):
+        with self._progress_lock:
+            self._migration.update(fields)
+    
+    def _chunk_texts(self, start: int, stop: int) -> List[str]:
+        return self.texts.read_range(start, min(stop, len(self.chunk_ids)))
+    
+    def _embed_into(self, store: Optional[VectorStore], texts: List[str], model_name: str,
+                    path: Optional[str]) -> Tuple[VectorStore, np.ndarray]:
+        """Encode texts with the migration model and append them to the new vectors version"""
+        embeddings = np.asarray(encode_texts(texts, model_name, batch_size=len(texts)), dtype=np.float32)
+        if store is None:
+            store = VectorStore(embeddings.shape[1], path)
+        store.append(embeddings)
+        return store, embeddings
+    
+    def _run_migration(self, model_name: str, version: int):
+        path = self._version_path(self.VECTORS_FILE, version)
+        batch_size = max(1, self.config.RAG_MIGRATION_BATCH_SIZE)
+        pause = self.config.RAG_MIGRATION_PAUSE_MS / 1000
+        store = None
+        try:
+            # Restos de uma migração interrompida para a mesma versão são descartados
+            if path and os.path.exists(path):
+                os.remove(path)
+            get_encoder(model_name)
+            
+            done = 0
+            while True:
+                # Os textos são lidos sob o lock de leitura; a codificação fica fora dele
+                with self._reading():
+                    if self._migration_rewind is not None:
+                        done = min(done, self._migration_rewind)
+                        self._migration_rewind = None
+                        if store is not None:
+                            store.truncate(done)
+                    texts = self._chunk_texts(done, done + batch_size)
+                    total = len(self.chunk_ids)
+                if not texts:
+                    break
+                store, _ = self._embed_into(store, texts, model_name, path)
+                done += len(texts)
+                self._set_migration(embedded=done, total=total)
+                # Pausa entre lotes para não disputar a CPU com as consultas
+                time.sleep(pause)
+            
+            # Novo índice construído ao lado do atual, que continua atendendo as consultas
+            self._set_migration(status='building')
+            reducer = self._train_reducer(store, version) if store is not None else None
+            index = self._make_index(store, reducer) if store is not None else None
+            
+            with self._lock.write():
+                self.load()
+                if self._migration_rewind is not None:
+                    done = min(done, self._migration_rewind)
+                    self._migration_rewind = None
+                    # Sem store, nada foi codificado ainda (coleção vazia no início da migração)
+                    if store is not None:
+                        store.truncate(done)
+                        index = self._make_index(store, reducer)
+                # Chunks enviados durante a migração só existem na versão antiga
+                while done < len(self.chunk_ids):
+                    texts = self._chunk_texts(done, done + batch_size)
+                    store, embeddings = self._embed_into(store, texts, model_name, path)
+                    if index is None:
+                        index = self._make_index(store, reducer)
+                    else:
+                        index.add(embeddings)
+                    done += len(texts)
+                
+                old_version = self.vectors_version
+                self._release_index()
+                self.vectors, self.reducer, self.index = store, reducer, index
+                self.embedding_model, self.vectors_version = model_name, version
+                self.model = None
+                # store.json aponta para a nova versão: é o ponto de troca também em disco
+                self.save()
+                for name in (self.VECTORS_FILE, self.REDUCER_FILE):
+                    old_path = self._version_path(name, old_version)
+                    if old_path and os.path.exists(old_path):
+                        os.remove(old_path)
+            
+            self._set_migration(status='completed', embedded=done, total=done, finished=time.time())
+            logger.info(f"Collection '{self.name}' migrated to {model_name} ({done} vectors)")
+        except Exception as e:
+            logger.error(f"Model migration of collection '{self.name}' failed: {str(e)}")
+            logger.exception("Full traceback:")
+            self._set_migration(status='failed', error=str(e), finished=time.time())
+            if self.vectors_version != version:
+                for name in (self.VECTORS_FILE, self.REDUCER_FILE):
+                    new_path = self._version_path(name, version)
+                    if new_path and os.path.exists(new_path):
+                        os.remove(new_path)
+    
+    def has_documents(self) -> bool:
+        with self._reading():
+            return self.index is not None and bool(self.chunk_ids)
+    
+    def _encode_query(self, query_text: str, model_name: str) -> np.ndarray:
+        if self.config.QUERY_BATCH_MAX_SIZE > 1:
+            # Consultas concorrentes são codificadas juntas em um único forward
+            return get_query_batcher(model_name).encode(query_text)[None, :]
+        return np.asarray(encode_texts([query_text], model_name), dtype=np.float32)
+    
+    def retrieve(self, query_text: str, top_k: int = 5, mmr: Optional[bool] = None,
+                 mmr_lambda: Optional[float] = None) -> Dict[str, Any]:
+        """Embed the query and search the index, timing each stage.
+
+        With MMR (default RAG_MMR_ENABLED) the index is over-fetched and a diverse
+        top_k is picked from the candidates with weight `mmr_lambda` on relevance.
+        """
+        if mmr is None:
+            mmr = self.config.RAG_MMR_ENABLED
+        if mmr_lambda is None:
+            mmr_lambda = self.config.RAG_MMR_LAMBDA
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"mmr_lambda must be between 0 and 1, got {mmr_lambda}")
+        timings = {}
+        
+        while True:
+            # O encoder é compartilhado; a busca só impede uploads concorrentes nesta coleção
+            model_name = self.embedding_model
+            start = time.perf_counter()
+            query_embedding = self._encode_query(query_text, model_name)
+            timings['embed'] = time.perf_counter() - start
+            
+            with self._reading():
+                # Uma migração concluída entre a codificação e a busca troca o espaço dos vetores
+                if self.embedding_model != model_name:
+                    continue
+                start = time.perf_counter()
+                results = self._search(query_embedding, top_k, mmr_lambda if mmr else None, timings)
+                timings['search'] = time.perf_counter() - start - timings.get('mmr', 0.0)
+            
+            return {
+                'results': results,
+                'query_embedding': query_embedding[0],
+                'embedding_model': model_name,
+                'timings': timings
+            }
+    
+    def _search(self, query_embedding: np.ndarray, top_k: int, mmr_lambda: Optional[float] = None,
+                timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        fetch_k = top_k * max(1, self.config.RAG_MMR_FETCH_FACTOR) if mmr_lambda is not None else top_k
+        D, I = self.index.search(query_embedding, fetch_k)
+        hits = [(distance, idx) for distance, idx in zip(D[0], I[0]) if 0 <= idx < len(self.chunk_ids)]
+        
+        if mmr_lambda is not None and len(hits) > top_k:
+            start = time.perf_counter()
+            # Vetores float32 completos do arquivo, mesmo com índice quantizado ou reduzido
+            candidates = self.vectors.get(np.array([idx for _, idx in hits]))
+            hits = [hits[i] for i in mmr_select(query_embedding[0], candidates, top_k, mmr_lambda)]
+            if timings is not None:
+                timings['mmr'] = time.perf_counter() - start
+        
+        # Só os textos dos resultados finais são descomprimidos
+        hits = hits[:top_k]
+        texts = self.texts.get([idx for _, idx in hits])
+        # Contagens feitas com outro tokenizer (o LLM mudou) não valem; o pack conta esses chunks de novo
+        tokenizer = self.token_counter.tokenizer_name if self.token_counter is not None else None
+        results = []
+        for (distance, idx), text in zip(hits, texts):
+            doc_id, chunk_idx = self.chunk_ids[idx]
+            counted = self.llm_tokens.get(doc_id)
+            results.append({
+                'chunk': text,
+                'score': float(1 / (1 + distance)),
+                'rank': len(results) + 1,
+                'document_id': doc_id,
+                'chunk_id': f"{doc_id}:{chunk_idx}",
+                'collection': self.name,
+                'token_count': counted[1][chunk_idx] if counted and counted[0] == tokenizer else None
+            })
+        return results
+    
+    def query(self, query_text: str, top_k: int = 5, mmr: Optional[bool] = None,
+              mmr_lambda: Optional[float] = None) -> Dict[str, Any]:
+        logger.info(f"Querying collection '{self.name}' with text: {query_text}")
+        if not self.has_documents():
             logger.warning("No documents indexed")
             return {
                 'results': [],
@@ -206,33 +994,15 @@ class RAGPipeline:
             }
             
         try:
-            # Computar embedding da query
-            query_embedding = self._compute_embeddings([query_text])
-            if isinstance(query_embedding, torch.Tensor):
-                query_embedding = query_embedding.cpu().numpy()
-                
-            # Buscar chunks mais similares
-            D, I = self.index.search(query_embedding, top_k)
-            
-            # Mapear resultados
-            results = []
-            all_chunks = []
-            for doc_chunks in self.chunks.values():
-                all_chunks.extend(doc_chunks)
-                
-            for i, (distance, idx) in enumerate(zip(D[0], I[0])):
-                if idx < len(all_chunks):
-                    results.append({
-                        'chunk': all_chunks[idx],
-                        'score': float(1 / (1 + distance)),
-                        'rank': i + 1
-                    })
+            retrieval = self.retrieve(query_text, top_k, mmr=mmr, mmr_lambda=mmr_lambda)
+            results = retrieval['results']
             
             logger.info(f"Found {len(results)} results")
             return {
                 'results': results,
                 'query': query_text,
-                'status': 'completed'
+                'status': 'completed',
+                'timings': retrieval['timings']
             }
             
         except Exception as e:
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Persistent cache of generated responses, keyed by model, prompt token IDs and generation parameters.
+
+    Entries live in a SQLite file so they survive restarts; they expire after
+    `ttl_seconds` and the least recently used ones are evicted once the stored
+    responses exceed `max_bytes`. Only deterministic generations (or callers that
+    opt in) should be stored: LLMManager decides which requests use it.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.path = path or ':memory:'
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, usage TEXT NOT NULL, nbytes INTEGER NOT NULL, '
+            'generation_seconds REAL NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL, '
+            'hits INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self._db.commit()
+        self._bytes = self._db.execute('SELECT COALESCE(SUM(nbytes), 0) FROM responses').fetchone()[0]
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'saved_generation_seconds': 0.0
+        }
+
+    @staticmethod
+    def make_key(model: str, prompt_ids: List[int], params: Dict[str, Any]) -> str:
+        payload = json.dumps({'model': model, 'prompt': list(prompt_ids), 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response and its usage, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            row = self._db.execute(
+                'SELECT response, usage, nbytes, generation_seconds, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and now - row[4] > self.ttl_seconds:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+                self._bytes -= row[2]
+                self.stats['expirations'] += 1
+                row = None
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute('UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            self._db.commit()
+            self.stats['hits'] += 1
+            self.stats['saved_generation_seconds'] += row[3]
+            return {'response': row[0], 'usage': json.loads(row[1]), 'generation_seconds': row[3]}
+
+    def put(self, key: str, response: str, usage: Dict[str, Any], generation_seconds: float) -> None:
+        nbytes = len(response.encode('utf-8'))
+        if nbytes > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT nbytes FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, response, usage, nbytes, generation_seconds, created_at, accessed_at, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (key, response, json.dumps(usage), nbytes, generation_seconds, now, now)
+            )
+            self._bytes += nbytes - (previous[0] if previous else 0)
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        # Primeiro as expiradas, depois as menos usadas recentemente até caber no limite
+        expired = self._db.execute(
+            'SELECT key, nbytes FROM responses WHERE created_at < ?', (now - self.ttl_seconds,)
+        ).fetchall()
+        self._delete(expired)
+        self.stats['expirations'] += len(expired)
+        while self._bytes > self.max_bytes:
+            oldest = self._db.execute('SELECT key, nbytes FROM responses ORDER BY accessed_at LIMIT 64').fetchall()
+            if not oldest:
+                break
+            evicted = []
+            for key, nbytes in oldest:
+                if self._bytes - sum(n for _, n in evicted) <= self.max_bytes:
+                    break
+                evicted.append((key, nbytes))
+            self._delete(evicted)
+            self.stats['evictions'] += len(evicted)
+
+    def _delete(self, rows) -> None:
+        self._db.executemany('DELETE FROM responses WHERE key = ?', [(key,) for key, _ in rows])
+        self._bytes -= sum(nbytes for _, nbytes in rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.commit()
+            self._bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            stats = dict(self.stats)
+            stats.update({
+                'entries': entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+                'path': self.path
+            })
+            return stats
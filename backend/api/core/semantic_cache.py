@@ -0,0 +1,129 @@
+import time
+import json
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Answer cache keyed by query-embedding similarity and the retrieved chunk ids.
+
+    Two questions share an entry only when they retrieved exactly the same chunks,
+    were generated with the same parameters and their embeddings have a cosine
+    similarity above the threshold, so any index update that changes the retrieved
+    context naturally misses the cache.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = Lock()
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'saved_generation_seconds': 0.0
+        }
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    @staticmethod
+    def _chunk_key(chunk_ids: Sequence[str], params: Optional[Dict[str, Any]] = None) -> Tuple[Tuple[str, ...], str]:
+        return tuple(sorted(chunk_ids)), json.dumps(params or {}, sort_keys=True)
+
+    def _expire(self, now: float) -> None:
+        expired = [
+            entry_id for entry_id, entry in self.entries.items()
+            if now - entry['created_at'] > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            del self.entries[entry_id]
+        self.stats['expirations'] += len(expired)
+
+    def lookup(self, embedding: np.ndarray, chunk_ids: Sequence[str],
+               params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached answer for a similar query over the same chunks and generation parameters, if any"""
+        query = self._normalize(embedding)
+        key = self._chunk_key(chunk_ids, params)
+        now = time.time()
+
+        with self._lock:
+            self.stats['lookups'] += 1
+            self._expire(now)
+
+            candidates = [
+                (entry_id, entry) for entry_id, entry in self.entries.items()
+                if entry['chunk_key'] == key
+            ]
+            if candidates:
+                matrix = np.stack([entry['embedding'] for _, entry in candidates])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self.entries.move_to_end(entry_id)
+                    entry['hits'] += 1
+                    self.stats['hits'] += 1
+                    self.stats['saved_generation_seconds'] += entry['generation_seconds']
+                    return {
+                        'answer': entry['answer'],
+                        'similarity': float(similarities[best]),
+                        'generation_seconds': entry['generation_seconds'],
+                        'finish_reason': entry['finish_reason'],
+                        'usage': dict(entry['usage'])
+                    }
+
+            self.stats['misses'] += 1
+            return None
+
+    def store(self, embedding: np.ndarray, chunk_ids: Sequence[str], answer: str,
+              generation_seconds: float, params: Optional[Dict[str, Any]] = None,
+              finish_reason: Optional[str] = None, usage: Optional[Dict[str, Any]] = None) -> None:
+        """Cache an answer with the finish reason and token usage of its generation.
+
+        The least recently used entries are evicted over the size limit.
+        """
+        with self._lock:
+            self.entries[self._next_id] = {
+                'embedding': self._normalize(embedding),
+                'chunk_key': self._chunk_key(chunk_ids, params),
+                'answer': answer,
+                'generation_seconds': generation_seconds,
+                'finish_reason': finish_reason,
+                'usage': dict(usage or {}),
+                'created_at': time.time(),
+                'hits': 0
+            }
+            self._next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['lookups']
+            return {
+                **self.stats,
+                'entries': len(self.entries),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+                'threshold': self.threshold,
+                'ttl_seconds': self.ttl_seconds,
+                'max_entries': self.max_entries
+            }
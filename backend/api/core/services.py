@@ -0,0 +1,127 @@
+import logging
+from threading import RLock, Thread
+from typing import Any, Callable, Dict, Optional
+
+from utils.config import Config
+from .memory_manager import MemoryManager
+from .system_manager import SystemManager
+from .llm_manager import LLMManager
+from .workflow_manager import WorkflowManager
+from .agent_manager import AgentManager
+from .analytics_manager import AnalyticsManager
+from .collection_manager import CollectionManager
+from .answer_pipeline import AnswerPipeline
+from .admission import AdmissionController
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """Owns the single instance of each manager shared by the app and its blueprints.
+
+    Services are built on first access, so importing the app loads no model; any
+    of them can be passed in already built (e.g. fakes in tests) as keyword arguments.
+    """
+
+    SERVICES = (
+        'memory_manager', 'system_manager', 'llm_manager', 'workflow_manager', 'agent_manager',
+        'analytics_manager', 'collection_manager', 'answer_pipeline', 'admission_controller'
+    )
+
+    def __init__(self, config: Optional[Config] = None, **overrides: Any):
+        unknown = set(overrides) - set(self.SERVICES)
+        if unknown:
+            raise ValueError(f"Unknown services: {', '.join(sorted(unknown))}")
+        self.config = config or Config()
+        self._instances: Dict[str, Any] = dict(overrides)
+        # Reentrante: construir um serviço pode construir suas dependências
+        self._lock = RLock()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                logger.info(f"Creating service {name}")
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    def start(self) -> None:
+        """Start loading the LLM and the default collection without blocking the caller"""
+        # O LLMManager carrega o modelo na própria thread (LLM_BACKGROUND_LOAD)
+        self.llm_manager
+        Thread(target=self.collection_manager.warm_up, name='collections-warm-up', daemon=True).start()
+
+    def readiness(self) -> Dict[str, Any]:
+        """Whether the model and the default collection are ready to serve traffic"""
+        model = {'state': 'pending', 'ready': False}
+        if self.is_created('llm_manager'):
+            llm = self.llm_manager
+            model = {
+                'state': llm.state,
+                'ready': llm.is_ready(),
+                'error': llm.state_error,
+                'load_seconds': llm.load_seconds
+            }
+        index = {'ready': False}
+        if self.is_created('collection_manager'):
+            collections = self.collection_manager
+            index = {
+                'ready': collections.ready,
+                'collection': collections.default_collection,
+                'error': collections.ready_error
+            }
+        return {'ready': bool(model['ready'] and index['ready']), 'model': model, 'index': index}
+
+    @property
+    def memory_manager(self) -> MemoryManager:
+        return self._get('memory_manager', lambda: MemoryManager(
+            cache_dir=self.config.MODEL_CACHE_DIR,
+            offload_dir=self.config.MODEL_WEIGHTS_OFFLOAD_DIR
+        ))
+
+    @property
+    def system_manager(self) -> SystemManager:
+        return self._get('system_manager', SystemManager)
+
+    @property
+    def llm_manager(self) -> LLMManager:
+        return self._get('llm_manager', lambda: LLMManager(
+            memory_manager=self.memory_manager, system_manager=self.system_manager
+        ))
+
+    @property
+    def workflow_manager(self) -> WorkflowManager:
+        return self._get('workflow_manager', lambda: WorkflowManager(self.llm_manager))
+
+    @property
+    def agent_manager(self) -> AgentManager:
+        return self._get('agent_manager', lambda: AgentManager(self.llm_manager))
+
+    @property
+    def analytics_manager(self) -> AnalyticsManager:
+        return self._get('analytics_manager', AnalyticsManager)
+
+    @property
+    def collection_manager(self) -> CollectionManager:
+        return self._get('collection_manager', lambda: CollectionManager(token_counter=self.llm_manager))
+
+    @property
+    def answer_pipeline(self) -> AnswerPipeline:
+        return self._get('answer_pipeline', lambda: AnswerPipeline(self.collection_manager, self.llm_manager))
+
+    @property
+    def admission_controller(self) -> AdmissionController:
+        return self._get('admission_controller', lambda: AdmissionController(
+            capacity=self.config.ADMISSION_CAPACITY,
+            queue_limits={
+                'interactive': self.config.ADMISSION_QUEUE_INTERACTIVE,
+                'normal': self.config.ADMISSION_QUEUE_NORMAL,
+                'background': self.config.ADMISSION_QUEUE_BACKGROUND
+            },
+            max_wait=self.config.ADMISSION_MAX_WAIT_SECONDS,
+            min_free_memory=self.config.ADMISSION_MIN_FREE_MEMORY_MB * 1024 * 1024
+        ))
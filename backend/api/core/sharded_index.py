@@ -0,0 +1,231 @@
+import atexit
+import itertools
+import logging
+import multiprocessing
+import uuid
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import NumpyFlatIndex
+
+logger = logging.getLogger(__name__)
+
+def _shard_worker(conn, shard_id: int) -> None:
+    """Worker loop owning shard `shard_id` of every sharded index"""
+    indexes = {}
+
+    def reply(status: str, result: Any) -> None:
+        conn.send((request_id, status, result))
+
+    while True:
+        try:
+            request_id, command, key, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        try:
+            if command == 'stop':
+                reply('ok', None)
+                break
+            elif command == 'add':
+                vectors, ids = payload
+                if key not in indexes:
+                    # Cada worker atende um pedido por vez; não há buscas concorrentes para agrupar aqui
+                    index = NumpyFlatIndex(vectors.shape[1], batch_queries=False)
+                    indexes[key] = (index, np.empty(0, dtype=np.int64))
+                index, global_ids = indexes[key]
+                if len(ids):
+                    index.add(vectors)
+                    indexes[key] = (index, np.concatenate([global_ids, ids]))
+                reply('ok', index.ntotal)
+            elif command == 'search':
+                queries, k = payload
+                if key not in indexes or indexes[key][0].ntotal == 0:
+                    reply('ok', (
+                        np.full((len(queries), k), np.inf, dtype=np.float32),
+                        np.full((len(queries), k), -1, dtype=np.int64)
+                    ))
+                    continue
+                index, global_ids = indexes[key]
+                D, I = index.search(queries, k)
+                # Converter ids locais do shard em posições globais
+                I = np.where(I >= 0, global_ids[np.clip(I, 0, None)], -1)
+                D = np.where(I >= 0, D, np.inf).astype(np.float32)
+                reply('ok', (D, I))
+            elif command == 'dump':
+                if key not in indexes:
+                    reply('ok', (None, np.empty(0, dtype=np.int64)))
+                    continue
+                index, global_ids = indexes[key]
+                reply('ok', (index.reconstruct_n(0, index.ntotal), global_ids))
+            elif command == 'drop':
+                indexes.pop(key, None)
+                reply('ok', None)
+            else:
+                reply('error', f"Unknown command: {command}")
+        except Exception as e:
+            reply('error', f"Shard {shard_id}: {e}")
+
+class ShardPool:
+    """N local worker processes; shard i of every sharded index lives in worker i.
+
+    Requests carry an id and each pipe has its own reader thread, so concurrent
+    searches are queued on every shard at once instead of waiting for each other's
+    round-trips.
+    """
+
+    def __init__(self, num_shards: int):
+        self.num_shards = num_shards
+        self.connections = []
+        self.processes = []
+        self._send_locks = [Lock() for _ in range(num_shards)]
+        self._pending: Dict[Tuple[int, int], Future] = {}
+        self._pending_lock = Lock()
+        self._ids = itertools.count()
+        self._running = [True] * num_shards
+
+        # forkserver: os workers nascem de um processo sem threads (o servidor já tem o loader do LLM
+        # e o torch rodando), e o pacote core é importado uma única vez no forkserver
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        for shard_id in range(num_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_worker,
+                args=(child_conn, shard_id),
+                name=f"rag-shard-{shard_id}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+            Thread(target=self._read_replies, args=(shard_id,), name=f"rag-shard-reader-{shard_id}",
+                   daemon=True).start()
+        logger.info(f"Started {num_shards} vector search shard processes")
+        atexit.register(self.close)
+
+    def _read_replies(self, shard_id: int) -> None:
+        """Deliver each reply of a shard to the request waiting for it"""
+        conn = self.connections[shard_id]
+        while True:
+            try:
+                request_id, status, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._pending_lock:
+                future = self._pending.pop((shard_id, request_id), None)
+            if future is not None:
+                future.set_result((status, result))
+
+        # Worker encerrado: quem ainda espera resposta dele recebe erro
+        with self._pending_lock:
+            self._running[shard_id] = False
+            orphans = [key for key in self._pending if key[0] == shard_id]
+            futures = [self._pending.pop(key) for key in orphans]
+        for future in futures:
+            future.set_result(('error', f"Shard {shard_id} is not running"))
+
+    def request(self, command: str, key: str, payloads: List[Any]) -> List[Any]:
+        """Scatter one payload to each shard and gather their replies"""
+        with self._pending_lock:
+            request_id = next(self._ids)
+        futures = []
+        for shard_id, (conn, payload) in enumerate(zip(self.connections, payloads)):
+            future = Future()
+            with self._pending_lock:
+                running = self._running[shard_id]
+                if running:
+                    self._pending[(shard_id, request_id)] = future
+            if not running:
+                future.set_result(('error', f"Shard {shard_id} is not running"))
+                futures.append(future)
+                continue
+            try:
+                with self._send_locks[shard_id]:
+                    conn.send((request_id, command, key, payload))
+            except (OSError, ValueError) as e:
+                with self._pending_lock:
+                    self._pending.pop((shard_id, request_id), None)
+                future.set_result(('error', f"Shard {shard_id}: {e}"))
+            futures.append(future)
+        replies = [future.result() for future in futures]
+
+        errors = [result for status, result in replies if status == 'error']
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return [result for _, result in replies]
+
+    def close(self) -> None:
+        if not self.processes:
+            return
+        try:
+            self.request('stop', '', [None] * self.num_shards)
+        except Exception as e:
+            logger.warning(f"Error stopping shard processes: {e}")
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes = []
+
+_pool: Optional[ShardPool] = None
+_pool_lock = Lock()
+
+def get_shard_pool(num_shards: int) -> ShardPool:
+    """Start the process-wide shard pool on first call and reuse it afterwards"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ShardPool(num_shards)
+        return _pool
+
+class ShardedIndex:
+    """Exact L2 index partitioned across the shard pool, with a FAISS-like interface.
+
+    Vectors are assigned round-robin by global position; a search is scattered to
+    all shards in parallel and the per-shard top-k lists are merged.
+    """
+
+    def __init__(self, pool: ShardPool, dimension: int):
+        self.pool = pool
+        self.d = dimension
+        self.ntotal = 0
+        self.key = uuid.uuid4().hex
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.arange(self.ntotal, self.ntotal + len(vectors), dtype=np.int64)
+        shard_of = ids % self.pool.num_shards
+        payloads = [
+            (vectors[shard_of == shard], ids[shard_of == shard])
+            for shard in range(self.pool.num_shards)
+        ]
+        self.pool.request('add', self.key, payloads)
+        self.ntotal += len(vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        replies = self.pool.request('search', self.key, [(queries, k)] * self.pool.num_shards)
+        distances = np.concatenate([D for D, _ in replies], axis=1)
+        ids = np.concatenate([I for _, I in replies], axis=1)
+
+        # Merge dos top-k de cada shard
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(ids, order, axis=1)
+        )
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        vectors = np.empty((self.ntotal, self.d), dtype=np.float32)
+        for shard_vectors, ids in self.pool.request('dump', self.key, [None] * self.pool.num_shards):
+            if len(ids):
+                vectors[ids] = shard_vectors
+        return vectors[start:start + count]
+
+    def release(self) -> None:
+        """Free this index's shards in the worker processes"""
+        self.pool.request('drop', self.key, [None] * self.pool.num_shards)
+        self.ntotal = 0
@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from .prefix_cache import PastKeyValues
+from .generation_scheduler import GenerationRequest, token_probs, _legacy_cache
+
+logger = logging.getLogger(__name__)
+
+def _trim_cache(past: PastKeyValues, length: int) -> PastKeyValues:
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in past)
+
+class SpeculativeDecoder:
+    """Speculative decoding: a small draft model proposes tokens and the main model verifies them together.
+
+    Each step the draft model generates `draft_tokens` tokens one by one, then the
+    main model scores all of them in a single forward pass. Greedy requests keep
+    the drafted tokens that match the main model's argmax; sampled requests use
+    rejection sampling, so the output follows the main model's distribution
+    either way. The draft length is re-chosen after every step to maximize the
+    expected speedup given the running acceptance rate and the measured cost of
+    a draft forward relative to a main one; when no length is expected to pay
+    off, drafting pauses and is only probed every `probe_interval` steps.
+
+    Works on one sequence at a time (the scheduler uses it when a single sequence
+    is decoding); the draft model's cache follows that sequence between steps.
+    """
+
+    def __init__(self, model, draft_model, max_draft_tokens: int = 8, draft_tokens: int = 4,
+                 probe_interval: int = 16):
+        self.model = model
+        self.draft_model = draft_model
+        self.max_draft_tokens = max(1, max_draft_tokens)
+        self.draft_tokens = min(draft_tokens, self.max_draft_tokens)
+        self.probe_interval = probe_interval
+        # Médias móveis: fração dos tokens rascunhados aceitos e custo do rascunho / custo do modelo principal
+        self.acceptance = 0.7
+        self.cost_ratio = 0.1
+        self._owner: Optional[GenerationRequest] = None
+        self._draft_past: Optional[PastKeyValues] = None
+        self._draft_len = 0
+        self._stats_lock = threading.Lock()
+        self.steps = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.tokens = 0
+        self.seconds = 0.0
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def _expected_speedup(self, draft_tokens: int) -> float:
+        """Tokens per step over the cost of a step, relative to plain decoding"""
+        rate = min(self.acceptance, 0.99)
+        return (1 - rate ** (draft_tokens + 1)) / ((1 - rate) * (draft_tokens * self.cost_ratio + 1))
+
+    def _draft(self, sequence: List[int], count: int, temperature: float, top_p: float,
+               top_k: int = 0) -> Tuple[List[int], List[Optional[torch.Tensor]]]:
+        """Propose `count` tokens after the sequence, with the draft distribution of each"""
+        drafts, draft_probs = [], []
+        pending = sequence[self._draft_len:]
+        for _ in range(count):
+            outputs = self.draft_model(
+                input_ids=torch.tensor([pending], device=self.device),
+                position_ids=torch.arange(self._draft_len, self._draft_len + len(pending), device=self.device).unsqueeze(0),
+                past_key_values=self._draft_past,
+                use_cache=True
+            )
+            self._draft_past = _legacy_cache(outputs.past_key_values)
+            self._draft_len += len(pending)
+            logits = outputs.logits[0, -1]
+            probs = token_probs(logits, temperature, top_p, top_k)
+            token = int(logits.argmax()) if probs is None else int(torch.multinomial(probs, 1))
+            drafts.append(token)
+            draft_probs.append(probs)
+            pending = [token]
+        return drafts, draft_probs
+
+    @torch.no_grad()
+    def step(self, request: GenerationRequest, past: PastKeyValues) -> Tuple[List[int], PastKeyValues]:
+        """Decode one or more tokens for the request.
+
+        `past` is the main model's cache for every token of the sequence but the
+        last one; the returned cache covers every token but the last returned one.
+        """
+        start = time.perf_counter()
+        if self._owner is not request:
+            self._owner, self._draft_past, self._draft_len = request, None, 0
+        sequence = request.input_ids + request.generated
+        length = len(sequence)
+        draft_tokens = self.draft_tokens or (1 if self.steps % self.probe_interval == 0 else 0)
+        count = min(draft_tokens, request.max_new_tokens - len(request.generated) - 1)
+        if self._draft_len >= length:
+            self._draft_past, self._draft_len = _trim_cache(self._draft_past, length - 1), length - 1
+        drafts, draft_probs = self._draft(sequence, count, request.temperature, request.top_p, request.top_k) if count > 0 else ([], [])
+        drafted_at = time.perf_counter()
+
+        outputs = self.model(
+            input_ids=torch.tensor([sequence[-1:] + drafts], device=self.device),
+            attention_mask=torch.ones((1, length + len(drafts)), dtype=torch.long, device=self.device),
+            position_ids=torch.arange(length - 1, length + len(drafts), device=self.device).unsqueeze(0),
+            past_key_values=past,
+            use_cache=True
+        )
+        logits = outputs.logits[0]
+        tokens = []
+        for i, draft in enumerate(drafts):
+            probs = token_probs(logits[i], request.temperature, request.top_p, request.top_k)
+            if probs is None:
+                target = int(logits[i].argmax())
+                if target != draft:
+                    tokens.append(target)
+                    break
+            elif torch.rand(()) >= probs[draft] / draft_probs[i][draft]:
+                # Rejeitado: amostra da diferença entre as distribuições, que corrige o viés do rascunho
+                residual = (probs - draft_probs[i]).clamp(min=0)
+                tokens.append(int(torch.multinomial(residual if residual.sum() > 0 else probs, 1)))
+                break
+            tokens.append(draft)
+        else:
+            # Todos aceitos: o último passo do modelo principal rende um token extra
+            probs = token_probs(logits[-1], request.temperature, request.top_p, request.top_k)
+            tokens.append(int(logits[-1].argmax()) if probs is None else int(torch.multinomial(probs, 1)))
+        accepted = len(tokens) - 1
+
+        # Mantém no cache só a sequência aceita (os rascunhos rejeitados saem)
+        past = _trim_cache(_legacy_cache(outputs.past_key_values), length + accepted)
+        if self._draft_len > length + accepted:
+            self._draft_past, self._draft_len = _trim_cache(self._draft_past, length + accepted), length + accepted
+        self._adapt(len(drafts), accepted, drafted_at - start, time.perf_counter() - drafted_at)
+        with self._stats_lock:
+            self.steps += 1
+            self.drafted += len(drafts)
+            self.accepted += accepted
+            self.tokens += len(tokens)
+            self.seconds += time.perf_counter() - start
+        return tokens, past
+
+    def _adapt(self, drafted: int, accepted: int, draft_seconds: float, verify_seconds: float) -> None:
+        if not drafted:
+            return
+        self.acceptance = 0.9 * self.acceptance + 0.1 * accepted / drafted
+        if verify_seconds > 0:
+            self.cost_ratio = 0.9 * self.cost_ratio + 0.1 * (draft_seconds / drafted) / verify_seconds
+        best = max(range(1, self.max_draft_tokens + 1), key=self._expected_speedup)
+        # Rascunho que não compensa: decodifica só com o modelo principal até a próxima sondagem
+        self.draft_tokens = best if self._expected_speedup(best) > 1 else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'steps': self.steps,
+                'drafted_tokens': self.drafted,
+                'accepted_tokens': self.accepted,
+                'acceptance_rate': self.accepted / self.drafted if self.drafted else 0.0,
+                'tokens_per_step': self.tokens / self.steps if self.steps else 0.0,
+                'tokens_per_second': self.tokens / self.seconds if self.seconds else 0.0,
+                'draft_tokens': self.draft_tokens,
+                'expected_speedup': self._expected_speedup(self.draft_tokens),
+                'cost_ratio': self.cost_ratio
+            }
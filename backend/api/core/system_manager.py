@@ -24,7 +24,7 @@ class SystemManager:
         }
         # Status do modelo
         self.model_status = {
-            'status': 'unknown',  # unknown, downloading, loading_tokenizer, ready, error
+            'status': 'unknown',  # unknown, downloading, loading_shards, loading_tokenizer, warming, ready, error
             'download_progress': 0,
             'error': None
         }
@@ -0,0 +1,272 @@
+import os
+import mmap
+import zlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Codec = Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]
+
+def load_codec(name: str = 'auto') -> Tuple[str, Codec]:
+    """Return (name, (compress, decompress)) for zstd, lz4 or zlib.
+
+    'auto' picks the first installed of zstd and lz4, falling back to zlib
+    from the standard library.
+    """
+    candidates = ['zstd', 'lz4', 'zlib'] if name == 'auto' else [name]
+    for candidate in candidates:
+        if candidate == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                continue
+            # Os compressores do zstandard não são thread-safe: um par por chamada é barato
+            return 'zstd', (
+                lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                lambda data: zstandard.ZstdDecompressor().decompress(data)
+            )
+        if candidate == 'lz4':
+            try:
+                import lz4.frame
+            except ImportError:
+                continue
+            return 'lz4', (lz4.frame.compress, lz4.frame.decompress)
+        if candidate == 'zlib':
+            return 'zlib', (lambda data: zlib.compress(data, 6), zlib.decompress)
+    raise ValueError(f"Compression codec '{name}' is not available")
+
+class ChunkTextStore:
+    """Chunk texts in compressed blocks of an append-only, memory-mapped file.
+
+    Row i is the text of the collection's vector i. Texts are gathered into blocks
+    of about `block_bytes` before compression; the newest, not yet full block stays
+    in memory. Reads decompress only the blocks they touch and keep the chunks in
+    an LRU cache bounded by `cache_bytes`.
+    """
+
+    def __init__(self, path: Optional[str] = None, codec: str = 'auto',
+                 block_bytes: int = 64 * 1024, cache_bytes: int = 16 * 1024 * 1024):
+        self.path = path
+        self.block_bytes = block_bytes
+        self.cache_bytes = cache_bytes
+        # Início de cada bloco no arquivo e seu primeiro chunk (com sentinela no fim)
+        self._block_offsets = array('q', [0])
+        self._block_first = array('q', [0])
+        # Início e fim de cada chunk dentro do bloco descomprimido
+        self._starts = array('q')
+        self._ends = array('q')
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._blob = bytearray()
+        self._map: Optional[mmap.mmap] = None
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'blocks_read': 0}
+
+        codec_name = codec
+        if path and os.path.exists(self._index_path):
+            with np.load(self._index_path) as index:
+                codec_name = str(index['codec'])
+                self._block_offsets = array('q', index['block_offsets'].tolist())
+                self._block_first = array('q', index['block_first'].tolist())
+                self._starts = array('q', index['starts'].tolist())
+                self._ends = array('q', index['ends'].tolist())
+        self.codec, (self._compress, self._decompress) = load_codec(codec_name)
+        if path:
+            # Blocos gravados depois do último índice salvo são descartados
+            with open(path, 'ab') as f:
+                f.truncate(self._block_offsets[-1])
+            self._remap()
+            logger.info(f"Opened chunk text store {path} ({len(self)} chunks, {self.codec})")
+
+    @property
+    def _index_path(self) -> str:
+        return self.path + '.idx.npz'
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._block_offsets[-1]:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def _committed(self) -> int:
+        return len(self._starts)
+
+    def __len__(self) -> int:
+        return self._committed + len(self._pending)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in process memory: hot cache, open block and offsets"""
+        offsets = 8 * (len(self._starts) + len(self._ends) + len(self._block_offsets) + len(self._block_first))
+        return self._cached_bytes + self._pending_bytes + len(self._blob) + offsets
+
+    def append(self, texts: Sequence[str]) -> None:
+        for text in texts:
+            self._pending.append(text)
+            self._pending_bytes += len(text)
+        if self._pending_bytes >= self.block_bytes:
+            self._flush_block()
+
+    def _flush_block(self) -> None:
+        if not self._pending:
+            return
+        encoded = [text.encode('utf-8') for text in self._pending]
+        position = 0
+        for data in encoded:
+            self._starts.append(position)
+            position += len(data)
+            self._ends.append(position)
+        block = self._compress(b''.join(encoded))
+        if self.path:
+            with open(self.path, 'ab') as f:
+                f.write(block)
+        else:
+            self._blob.extend(block)
+        self._block_offsets.append(self._block_offsets[-1] + len(block))
+        self._block_first.append(self._committed)
+        self._pending = []
+        self._pending_bytes = 0
+        if self.path:
+            self._remap()
+
+    def flush(self) -> None:
+        """Compress the open block and persist the block index atomically"""
+        self._flush_block()
+        if self.path:
+            self._write_index()
+
+    def _write_index(self) -> None:
+        with open(self._index_path + '.tmp', 'wb') as f:
+            np.savez(
+                f,
+                codec=self.codec,
+                block_offsets=np.frombuffer(self._block_offsets, dtype=np.int64),
+                block_first=np.frombuffer(self._block_first, dtype=np.int64),
+                starts=np.frombuffer(self._starts, dtype=np.int64),
+                ends=np.frombuffer(self._ends, dtype=np.int64)
+            )
+        os.replace(self._index_path + '.tmp', self._index_path)
+
+    def _read_block(self, block: int) -> bytes:
+        start, end = self._block_offsets[block], self._block_offsets[block + 1]
+        data = self._map[start:end] if self.path else bytes(self._blob[start:end])
+        return self._decompress(data)
+
+    def _block_of(self, ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(np.frombuffer(self._block_first, dtype=np.int64), ids, side='right') - 1
+
+    def get(self, ids: Sequence[int]) -> List[str]:
+        """Texts of the given rows, decompressing each touched block once"""
+        texts: Dict[int, str] = {}
+        missing = []
+        with self._cache_lock:
+            for i in ids:
+                i = int(i)
+                if i in self._cache:
+                    self._cache.move_to_end(i)
+                    texts[i] = self._cache[i]
+                    self.stats['hits'] += 1
+                elif i >= self._committed:
+                    texts[i] = self._pending[i - self._committed]
+                else:
+                    missing.append(i)
+                    self.stats['misses'] += 1
+
+        if missing:
+            blocks = self._block_of(np.array(missing))
+            loaded = {}
+            for block in np.unique(blocks):
+                loaded[int(block)] = self._read_block(int(block))
+            with self._cache_lock:
+                self.stats['blocks_read'] += len(loaded)
+                for i, block in zip(missing, blocks):
+                    text = loaded[int(block)][self._starts[i]:self._ends[i]].decode('utf-8')
+                    texts[i] = text
+                    self._remember(i, text)
+        return [texts[int(i)] for i in ids]
+
+    def _remember(self, i: int, text: str) -> None:
+        if i in self._cache:
+            return
+        self._cache[i] = text
+        self._cached_bytes += len(text)
+        while self._cached_bytes > self.cache_bytes and self._cache:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def read_range(self, start: int, stop: int) -> List[str]:
+        """Texts of rows [start, stop) in order, without filling the hot cache (bulk reads)"""
+        stop = min(stop, len(self))
+        texts = []
+        i = start
+        while i < min(stop, self._committed):
+            block = int(self._block_of(np.array([i]))[0])
+            data = self._read_block(block)
+            last = min(stop, self._block_first[block + 1])
+            texts.extend(data[self._starts[j]:self._ends[j]].decode('utf-8') for j in range(i, last))
+            i = last
+        if stop > self._committed:
+            texts.extend(self._pending[max(start, self._committed) - self._committed:stop - self._committed])
+        return texts
+
+    def truncate(self, count: int) -> None:
+        """Drop rows past `count`; a partly kept block is reopened as the in-memory block"""
+        if count >= len(self):
+            return
+        if count >= self._committed:
+            del self._pending[count - self._committed:]
+        else:
+            block = int(self._block_of(np.array([count]))[0])
+            first = self._block_first[block]
+            survivors = self.read_range(first, count)
+            cut = self._block_offsets[block]
+            del self._block_offsets[block + 1:]
+            del self._block_first[block + 1:]
+            del self._starts[first:]
+            del self._ends[first:]
+            if self.path:
+                # O índice em disco é regravado antes de cortar o arquivo que ele descreve
+                self._write_index()
+                with open(self.path, 'ab') as f:
+                    f.truncate(cut)
+                self._remap()
+            else:
+                del self._blob[cut:]
+            self._pending = survivors
+        self._pending_bytes = sum(len(text) for text in self._pending)
+        with self._cache_lock:
+            self._cache.clear()
+            self._cached_bytes = 0
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'codec': self.codec,
+                'chunks': len(self),
+                'blocks': len(self._block_offsets) - 1,
+                'compressed_bytes': self._block_offsets[-1],
+                'raw_bytes': sum(
+                    self._ends[self._block_first[b + 1] - 1] for b in range(len(self._block_first) - 1)
+                ),
+                'cache_entries': len(self._cache),
+                'cache_bytes': self._cached_bytes,
+                'cache_hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+            }
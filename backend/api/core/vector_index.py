@@ -0,0 +1,492 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_faiss = None
+_faiss_checked = False
+_faiss_lock = threading.Lock()
+
+def load_faiss():
+    """Import faiss on first use so startup does not pay for it; None if not installed"""
+    global _faiss, _faiss_checked
+    with _faiss_lock:
+        if not _faiss_checked:
+            try:
+                import faiss
+                _faiss = faiss
+            except ImportError:
+                logger.warning("faiss is not installed, using NumPy exact search")
+            _faiss_checked = True
+        return _faiss
+
+def rescore(store: 'VectorStore', queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact float32 distances for candidate ids (-1 = none), keeping the best k per query"""
+    D = np.full((len(queries), k), np.inf, dtype=np.float32)
+    I = np.full((len(queries), k), -1, dtype=np.int64)
+    if not ids.size:
+        return D, I
+    # Lê do arquivo mapeado só as linhas candidatas
+    unique = np.unique(ids[ids >= 0])
+    if not unique.size:
+        return D, I
+    exact = store.get(unique)[np.searchsorted(unique, np.clip(ids, 0, None))]
+    distances = ((exact - queries[:, None, :]) ** 2).sum(axis=2)
+    distances[ids < 0] = np.inf
+    kk = min(k, ids.shape[1])
+    order = np.argsort(distances, axis=1, kind='stable')[:, :kk]
+    D[:, :kk] = np.take_along_axis(distances, order, axis=1)
+    I[:, :kk] = np.where(np.isinf(D[:, :kk]), -1, np.take_along_axis(ids, order, axis=1))
+    return D, I
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5) -> np.ndarray:
+    """Maximal Marginal Relevance: positions of k candidate rows, in selection order.
+
+    Relevance and redundancy are cosine similarities computed as matrix products;
+    each step scores every remaining candidate at once. lambda_mult=1 keeps the
+    relevance order, lower values favour candidates unlike those already picked.
+    """
+    k = min(k, len(candidates))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    unit = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query.reshape(-1)
+    relevance = unit @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    similarity = unit @ unit.T
+
+    selected = np.empty(k, dtype=np.int64)
+    selected[0] = np.argmax(relevance)
+    # Maior similaridade de cada candidato com os já escolhidos
+    redundancy = similarity[selected[0]].copy()
+    taken = np.zeros(len(candidates), dtype=bool)
+    taken[selected[0]] = True
+    for i in range(1, k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[taken] = -np.inf
+        selected[i] = np.argmax(scores)
+        taken[selected[i]] = True
+        np.maximum(redundancy, similarity[selected[i]], out=redundancy)
+    return selected
+
+class VectorStore:
+    """Append-only float32 vectors in a raw file, memory-mapped for reads.
+
+    This is the single full-precision copy of a collection's vectors; without a
+    path the vectors are kept in memory instead.
+    """
+
+    def __init__(self, dimension: int, path: Optional[str] = None):
+        self.d = dimension
+        self.path = path
+        self._data = np.empty((0, dimension), dtype=np.float32)
+        if path and os.path.exists(path):
+            self._remap()
+
+    def _remap(self) -> None:
+        count = os.path.getsize(self.path) // (4 * self.d)
+        if count:
+            self._data = np.memmap(self.path, dtype=np.float32, mode='r', shape=(count, self.d))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in process memory (mapped pages belong to the page cache)"""
+        return 0 if self.path else self._data.nbytes
+
+    def append(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        if self.path is None:
+            self._data = np.concatenate([self._data, vectors])
+            return
+        with open(self.path, 'ab') as f:
+            f.write(vectors.tobytes())
+        self._remap()
+
+    def truncate(self, count: int) -> None:
+        """Drop rows past `count`, e.g. written before a crash but never committed"""
+        if count >= len(self):
+            return
+        if self.path is None:
+            self._data = self._data[:count]
+            return
+        os.truncate(self.path, count * 4 * self.d)
+        self._data = np.empty((0, self.d), dtype=np.float32)
+        self._remap()
+
+    def view(self, start: int, stop: int) -> np.ndarray:
+        return self._data[start:stop]
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self._data[ids])
+
+class NumpyFlatIndex:
+    """Exact L2 search with blocked float32 matrix products, with a FAISS-like interface.
+
+    Concurrent searches are coalesced: the first caller becomes the leader and runs
+    every query queued meanwhile as a single matrix product.
+    """
+
+    code_dtype = np.float32
+
+    def __init__(self, dimension: int, block_size: int = 16384, batch_queries: bool = True):
+        self.d = dimension
+        self.ntotal = 0
+        self.block_size = block_size
+        self.batch_queries = batch_queries
+        self._vectors = np.empty((0, dimension), dtype=self.code_dtype)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._leader_active = False
+        self.stats = {'searches': 0, 'batches': 0, 'max_batch': 0}
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        needed = self.ntotal + len(vectors)
+        if needed > len(self._vectors):
+            # Crescimento geométrico; buscas em andamento mantêm a visão antiga
+            capacity = max(needed, 2 * len(self._vectors), 1024)
+            grown = np.empty((capacity, self.d), dtype=self.code_dtype)
+            grown[:self.ntotal] = self._vectors[:self.ntotal]
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[:self.ntotal] = self._norms[:self.ntotal]
+            self._vectors, self._norms = grown, norms
+        codes = self._encode(vectors)
+        decoded = self._decode(codes)
+        self._vectors[self.ntotal:needed] = codes
+        self._norms[self.ntotal:needed] = np.einsum('ij,ij->i', decoded, decoded)
+        self.ntotal = needed
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes
+
+    def _inner_products(self, codes: np.ndarray, queries_t: np.ndarray) -> np.ndarray:
+        """Inner products between a block of stored codes and the (transposed) queries"""
+        return codes @ queries_t
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.d * np.dtype(self.code_dtype).itemsize + 4
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self._norms.nbytes
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        return self._decode(self._vectors[start:start + count]).copy()
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.d)
+        if not self.batch_queries:
+            return self._search(queries, k)
+
+        request = {'queries': queries, 'k': k, 'done': threading.Event()}
+        with self._pending_lock:
+            self._pending.append(request)
+            leader = not self._leader_active
+            self._leader_active = True
+
+        if leader:
+            while True:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                    if not batch:
+                        self._leader_active = False
+                        break
+                self._run_batch(batch)
+        else:
+            request['done'].wait()
+
+        if 'error' in request:
+            raise request['error']
+        return request['D'], request['I']
+
+    def _run_batch(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            k = max(request['k'] for request in batch)
+            D, I = self._search(np.vstack([request['queries'] for request in batch]), k)
+            offset = 0
+            for request in batch:
+                rows = slice(offset, offset + len(request['queries']))
+                request['D'], request['I'] = D[rows, :request['k']], I[rows, :request['k']]
+                offset += len(request['queries'])
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        except Exception as e:
+            for request in batch:
+                request['error'] = e
+        finally:
+            for request in batch:
+                request['done'].set()
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        self.stats['searches'] += len(queries)
+        return self._scan(queries, k)
+
+    def _scan(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Visão consistente mesmo com um add() concorrente
+        ntotal = self.ntotal
+        vectors, norms = self._vectors, self._norms
+        nq = len(queries)
+
+        D = np.full((nq, k), np.inf, dtype=np.float32)
+        I = np.full((nq, k), -1, dtype=np.int64)
+        if ntotal == 0:
+            return D, I
+
+        kk = min(k, ntotal)
+        queries_t = np.ascontiguousarray(queries.T)
+        best_d = best_i = None
+        for start in range(0, ntotal, self.block_size):
+            end = min(start + self.block_size, ntotal)
+            # ||x||^2 - 2 x.q ; o termo ||q||^2 não altera a ordem e é somado no final
+            scores = self._inner_products(vectors[start:end], queries_t)
+            scores *= -2.0
+            scores += norms[start:end, None]
+            if end - start > kk:
+                top = np.argpartition(scores, kk - 1, axis=0)[:kk]
+                scores = np.take_along_axis(scores, top, axis=0)
+            else:
+                top = np.repeat(np.arange(end - start)[:, None], nq, axis=1)
+            top += start
+
+            if best_d is None:
+                best_d, best_i = scores, top
+            else:
+                # Manter só o top-k acumulado entre blocos
+                merged_d = np.concatenate([best_d, scores])
+                merged_i = np.concatenate([best_i, top])
+                keep = np.argpartition(merged_d, kk - 1, axis=0)[:kk]
+                best_d = np.take_along_axis(merged_d, keep, axis=0)
+                best_i = np.take_along_axis(merged_i, keep, axis=0)
+
+        order = np.argsort(best_d, axis=0, kind='stable')
+        best_d = np.take_along_axis(best_d, order, axis=0) + np.einsum('ij,ij->i', queries, queries)
+        D[:, :kk] = np.maximum(best_d, 0).T
+        I[:, :kk] = np.take_along_axis(best_i, order, axis=0).T
+        return D, I
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'type': 'numpy',
+            'ntotal': self.ntotal,
+            'bytes_per_vector': self.bytes_per_vector,
+            **self.stats
+        }
+
+class QuantizedFlatIndex(NumpyFlatIndex):
+    """Scalar-quantized index (float16 or int8 codes) with full-precision re-scoring.
+
+    The approximate scan keeps `rescore_factor * k` candidates, which are re-scored
+    exactly against the float32 rows of the VectorStore. int8 uses a per-dimension
+    range that only widens; existing codes are re-encoded from the store when it does
+    (through `transform` when the index holds projected vectors).
+    """
+
+    KINDS = {'float16': np.float16, 'int8': np.uint8}
+    DECODE_ROWS = 512
+
+    def __init__(self, dimension: int, store: VectorStore, kind: str = 'int8',
+                 rescore_factor: int = 4, transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 **kwargs):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unsupported vector storage: {kind}")
+        self.kind = kind
+        self.code_dtype = self.KINDS[kind]
+        super().__init__(dimension, **kwargs)
+        self.store = store
+        self.rescore_factor = rescore_factor
+        self.transform = transform
+        self._low = np.zeros(dimension, dtype=np.float32)
+        self._scale = np.ones(dimension, dtype=np.float32)
+        self._trained = False
+        self.stats['retrains'] = 0
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.d)
+        if self.kind == 'int8' and len(vectors):
+            self._fit_range(vectors)
+        super().add(vectors)
+
+    def _fit_range(self, vectors: np.ndarray) -> None:
+        high = self._low + 255 * self._scale
+        batch_low, batch_high = vectors.min(axis=0), vectors.max(axis=0)
+        if self._trained and (batch_low >= self._low).all() and (batch_high <= high).all():
+            return
+        if self._trained:
+            batch_low = np.minimum(batch_low, self._low)
+            batch_high = np.maximum(batch_high, high)
+        # Margem para que documentos seguintes raramente exijam recodificação
+        margin = 0.1 * (batch_high - batch_low)
+        self._low = (batch_low - margin).astype(np.float32)
+        self._scale = np.maximum((batch_high - batch_low + 2 * margin) / 255, 1e-12).astype(np.float32)
+
+        if self._trained and self.ntotal:
+            codes = np.empty_like(self._vectors)
+            norms = np.empty_like(self._norms)
+            for start in range(0, self.ntotal, self.block_size):
+                end = min(start + self.block_size, self.ntotal)
+                source = self.store.view(start, end)
+                if self.transform is not None:
+                    source = self.transform(source)
+                codes[start:end] = self._encode(source)
+                decoded = self._decode(codes[start:end])
+                norms[start:end] = np.einsum('ij,ij->i', decoded, decoded)
+            self._vectors, self._norms = codes, norms
+            self.stats['retrains'] += 1
+        self._trained = True
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.kind == 'float16':
+            return vectors.astype(np.float16)
+        return np.clip(np.rint((vectors - self._low) / self._scale), 0, 255).astype(np.uint8)
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.kind == 'float16':
+            return codes.astype(np.float32)
+        return codes.astype(np.float32) * self._scale + self._low
+
+    def _inner_products(self, codes: np.ndarray, queries_t: np.ndarray) -> np.ndarray:
+        bias = None
+        if self.kind == 'int8':
+            # (code * scale + low) . q = code . (scale * q) + low . q
+            bias = self._low @ queries_t
+            queries_t = self._scale[:, None] * queries_t
+        scores = np.empty((len(codes), queries_t.shape[1]), dtype=np.float32)
+        # Decodificar em pedaços pequenos que cabem no cache antes do produto
+        for start in range(0, len(codes), self.DECODE_ROWS):
+            end = min(start + self.DECODE_ROWS, len(codes))
+            scores[start:end] = codes[start:end].astype(np.float32) @ queries_t
+        if bias is not None:
+            scores += bias
+        return scores
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        self.stats['searches'] += len(queries)
+        if self.rescore_factor <= 1:
+            return self._scan(queries, k)
+
+        _, ids = self._scan(queries, k * self.rescore_factor)
+        return rescore(self.store, queries, ids, k)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), 'type': self.kind, 'rescore_factor': self.rescore_factor}
+
+class DimensionReducer:
+    """Projects vectors to fewer dimensions, applied alike to stored and query vectors.
+
+    'pca' is fitted on the collection's vectors; 'truncate' keeps the leading
+    dimensions, for Matryoshka-style models trained to support it.
+    """
+
+    METHODS = ('pca', 'truncate')
+
+    def __init__(self, method: str, input_dim: int, output_dim: int):
+        if method not in self.METHODS:
+            raise ValueError(f"Unsupported dimension reduction: {method}")
+        if not 0 < output_dim < input_dim:
+            raise ValueError(f"Reduced dimension must be between 1 and {input_dim - 1}, got {output_dim}")
+        self.method = method
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.explained_variance = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.method == 'truncate' or self.components is not None
+
+    def fit(self, vectors: np.ndarray, block_size: int = 65536) -> 'DimensionReducer':
+        """Fit PCA from the covariance matrix, accumulated block by block (works on memmaps)"""
+        if self.method == 'truncate':
+            return self
+        count = len(vectors)
+        total = np.zeros(self.input_dim)
+        gram = np.zeros((self.input_dim, self.input_dim))
+        for start in range(0, count, block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float64)
+            total += block.sum(axis=0)
+            gram += block.T @ block
+        mean = total / count
+        covariance = gram / count - np.outer(mean, mean)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        top = np.argsort(eigenvalues)[::-1][:self.output_dim]
+        self.mean = mean.astype(np.float32)
+        self.components = np.ascontiguousarray(eigenvectors[:, top], dtype=np.float32)
+        self.explained_variance = float(eigenvalues[top].sum() / max(eigenvalues.sum(), 1e-12))
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.input_dim)
+        if self.method == 'truncate':
+            return np.ascontiguousarray(vectors[:, :self.output_dim])
+        return (vectors - self.mean) @ self.components
+
+    def save(self, path: str) -> None:
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(
+                f,
+                method=self.method,
+                dims=np.array([self.input_dim, self.output_dim]),
+                mean=self.mean if self.mean is not None else np.empty(0),
+                components=self.components if self.components is not None else np.empty(0)
+            )
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DimensionReducer':
+        with np.load(path) as data:
+            input_dim, output_dim = (int(d) for d in data['dims'])
+            reducer = cls(str(data['method']), input_dim, output_dim)
+            if reducer.method == 'pca':
+                reducer.mean = data['mean'].astype(np.float32)
+                reducer.components = data['components'].astype(np.float32)
+        return reducer
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {'method': self.method, 'input_dim': self.input_dim, 'output_dim': self.output_dim}
+        if self.explained_variance is not None:
+            stats['explained_variance'] = self.explained_variance
+        return stats
+
+class ReducedIndex:
+    """Wraps an index built on reduced vectors; takes full-size vectors and queries.
+
+    Candidates found in the reduced space are re-scored with the full float32
+    vectors of the VectorStore, which recovers most of the recall lost to the
+    projection.
+    """
+
+    def __init__(self, index, reducer: DimensionReducer, store: VectorStore, rescore_factor: int = 4):
+        self.index = index
+        self.reducer = reducer
+        self.store = store
+        self.rescore_factor = rescore_factor
+        self.d = reducer.input_dim
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def add(self, vectors: np.ndarray) -> None:
+        self.index.add(self.reducer.transform(vectors))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.d)
+        if self.rescore_factor <= 1:
+            return self.index.search(self.reducer.transform(queries), k)
+        _, ids = self.index.search(self.reducer.transform(queries), k * self.rescore_factor)
+        return rescore(self.store, queries, ids, k)
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        return np.asarray(self.store.view(start, start + count)).copy()
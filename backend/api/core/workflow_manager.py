@@ -1,3 +1,5 @@
+from .generation_params import GenerationParams
+
 class WorkflowManager:
     def __init__(self, llm_manager):
         self.llm_manager = llm_manager
@@ -7,7 +9,8 @@ class WorkflowManager:
         return list(self.workflows.values())
 
     def get_workflow(self, workflow_id):
-        return self.workflows.get(workflow_id)
+        # Ids chegam como texto na URL
+        return self.workflows.get(int(workflow_id) if str(workflow_id).isdigit() else workflow_id)
 
     def create_workflow(self, name, description, steps):
         workflow = {
@@ -20,11 +23,75 @@ class WorkflowManager:
         return workflow
 
     def delete_workflow(self, workflow_id):
-        if workflow_id in self.workflows:
-            del self.workflows[workflow_id]
+        workflow = self.get_workflow(workflow_id)
+        if workflow:
+            del self.workflows[workflow['id']]
             return True
         return False
 
+    def _selected_steps(self, workflow, step=None):
+        steps = list(enumerate(workflow['steps']))
+        if step is not None:
+            if not 0 <= int(step) < len(steps):
+                raise ValueError(f"Workflow has no step {step}")
+            steps = [steps[int(step)]]
+        return steps
+
+    def _step_params(self, step_config, overrides):
+        return GenerationParams.from_dict(
+            overrides, (overrides or {}).get('config'), step_config,
+            {'max_new_tokens': self.llm_manager.config.LLM_MAX_NEW_TOKENS}
+        )
+
+    def generation_tokens(self, workflow_id, step=None, overrides=None):
+        """Largest token budget among the generate steps a run would execute (steps run one at a time)"""
+        workflow = self.get_workflow(workflow_id)
+        if not workflow:
+            return 0
+        budgets = [
+            self._step_params(workflow_step.get('config', {}), overrides).max_new_tokens
+            for _, workflow_step in self._selected_steps(workflow, step)
+            if workflow_step.get('type') == 'generate'
+        ]
+        return max(budgets, default=0)
+
+    def execute_workflow(self, workflow_id, input_data, context=None, step=None, overrides=None):
+        """Run the workflow's generate steps (or only `step`) in order.
+
+        Each step's prompt is its config's `prompt` template, filled from input_data
+        and `{previous}` (the previous step's output). Generation settings come from
+        `overrides` (the request body and its config), then the step config, then the
+        server default.
+        """
+        workflow = self.get_workflow(workflow_id)
+        if not workflow:
+            return None
+        results = []
+        previous = ''
+        for index, workflow_step in self._selected_steps(workflow, step):
+            step_config = workflow_step.get('config', {})
+            template = step_config.get('prompt') or input_data.get('prompt')
+            if workflow_step.get('type') != 'generate' or not template:
+                # Só os passos de geração rodam no servidor
+                results.append({'step': index, 'name': workflow_step.get('name'), 'status': 'skipped'})
+                continue
+            try:
+                prompt = template.format(**dict(input_data, previous=previous))
+            except KeyError as e:
+                raise ValueError(f"Step {index} prompt uses {e}, missing from the input")
+            params = self._step_params(step_config, overrides)
+            result = self.llm_manager.complete(self.llm_manager._prepare_input(prompt, context), params)
+            previous = result['text'].strip()
+            results.append({
+                'step': index,
+                'name': workflow_step.get('name'),
+                'status': 'completed',
+                'output': previous,
+                'finish_reason': result['finish_reason'],
+                'usage': result['usage']
+            })
+        return {'workflow_id': workflow['id'], 'status': 'completed', 'steps': results}
+
     def save_workflows(self):
         # TODO: Implement persistence
         pass
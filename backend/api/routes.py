@@ -1,13 +1,11 @@
-from flask import Blueprint, request, jsonify
-from core.llm_manager import LLMManager
-from core.memory_manager import MemoryManager
-from core.system_manager import SystemManager
-from core.workflow_manager import WorkflowManager
-from core.agent_manager import AgentManager
-from core.analytics_manager import AnalyticsManager
-from core.rag_pipeline import RAGPipeline
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from werkzeug.local import LocalProxy
+from core.llm_manager import ModelNotReadyError
+from core.admission import AdmissionRejected
+from core.generation_params import GenerationParams
 from utils.config import Config
 import logging
+import json
 import os
 
 # Configure logging
@@ -17,18 +15,88 @@ logger = logging.getLogger(__name__)
 # Initialize Blueprint
 api = Blueprint('api', __name__, url_prefix='/api')
 
-# Initialize managers
 config = Config()
-memory_manager = MemoryManager(
-    cache_dir=config.MODEL_CACHE_DIR,
-    offload_dir=config.MODEL_WEIGHTS_OFFLOAD_DIR
-)
-system_manager = SystemManager()
-llm_manager = LLMManager(memory_manager)
-workflow_manager = WorkflowManager(llm_manager)
-agent_manager = AgentManager(llm_manager)
-analytics_manager = AnalyticsManager()
-rag_pipeline = RAGPipeline()
+# Managers compartilhados com o app: uma única instância de cada, criada pelo ServiceContainer (ver create_app)
+services = LocalProxy(lambda: current_app.extensions['services'])
+
+def _sse(event):
+    """Format an event as a Server-Sent Events message"""
+    return f"data: {json.dumps(event)}\n\n"
+
+def _sse_stream(events):
+    """Serialize events as SSE, reporting failures as a final error event"""
+    try:
+        for event in events:
+            yield _sse(event)
+    except Exception as e:
+        logger.error(f"Error while streaming: {str(e)}")
+        yield _sse({'type': 'error', 'status': 'error', 'error': str(e)})
+    finally:
+        # Cliente desconectado: o servidor fecha este gerador e o fechamento chega até a geração
+        close = getattr(events, 'close', None)
+        if close is not None:
+            close()
+
+def _sse_response(events, permit=None):
+    """Stream events as SSE; an admission permit is held until the stream ends or the response is closed"""
+    response = Response(
+        stream_with_context(_sse_stream(permit.wrap(events) if permit else events)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if permit is not None:
+        # Um gerador fechado antes da primeira iteração não executa o finally de wrap()
+        response.call_on_close(permit.release)
+    return response
+
+def _model_not_ready():
+    return jsonify({
+        "error": "Model not ready",
+        "details": f"Please wait until the model is ready (state: {services.llm_manager.state})."
+    }), 503
+
+def _admit(operation, priority, tokens=0, nbytes=0):
+    """Reserve capacity for an expensive operation (raises AdmissionRejected when saturated)"""
+    admission = services.admission_controller
+    return admission.acquire(operation, admission.estimate_cost(operation, tokens=tokens, nbytes=nbytes), priority)
+
+def _response_cache_mode(data):
+    """use_cache for the LLM response cache, from the Cache-Control header and the "cache" field"""
+    # no-cache/no-store: gera de novo; "cache": true: aceita cache mesmo com amostragem; sem nada: só greedy
+    cache_control = request.headers.get('Cache-Control', '').lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return False
+    if 'cache' in data:
+        return bool(data['cache'])
+    return None
+
+def _generation_params(data):
+    """GenerationParams from a request body, also reading the generation settings sent in its "config" object"""
+    return GenerationParams.from_dict(data, data.get('config'), {'max_new_tokens': config.LLM_MAX_NEW_TOKENS})
+
+# Erros do pipeline de resposta (campo "code" do evento de erro) e o status HTTP de cada um
+ANSWER_ERROR_STATUS = {'no_documents': 404}
+
+def _answer_failed(result):
+    return jsonify({
+        "error": "Failed to answer query",
+        "details": result.get('error'),
+        "code": result.get('code')
+    }), ANSWER_ERROR_STATUS.get(result.get('code'), 500)
+
+def _prepend(first, events):
+    try:
+        yield first
+        yield from events
+    finally:
+        close = getattr(events, 'close', None)
+        if close is not None:
+            close()
+
+def _rejected(e):
+    response = jsonify({"error": "Server busy", "details": str(e), "retry_after": e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status_code
 
 # Health check endpoint
 @api.route('/health', methods=['GET'])
@@ -40,10 +108,10 @@ def health_check():
 def dashboard_stats():
     try:
         stats = {
-            'system': system_manager.get_system_status(),
-            'model': llm_manager.get_model_status(),
-            'workflows': len(workflow_manager.list_workflows()),
-            'agents': len(agent_manager.list_agents())
+            'system': services.system_manager.get_system_status(),
+            'model': services.llm_manager.get_model_status(),
+            'workflows': len(services.workflow_manager.list_workflows()),
+            'agents': len(services.agent_manager.list_agents())
         }
         return jsonify(stats), 200
     except Exception as e:
@@ -56,9 +124,32 @@ def chat():
         data = request.json
         message = data.get('message')
         context = data.get('context', {})
+        params = _generation_params(data)
         
-        response = llm_manager.generate_response(message, context)
+        if data.get('stream'):
+            # Tokens enviados via SSE à medida que são gerados
+            if not services.llm_manager.is_ready():
+                return _model_not_ready()
+            events = services.llm_manager.stream_chat(
+                message,
+                context,
+                params=params,
+                use_cache=_response_cache_mode(data)
+            )
+            # A capacidade fica reservada até o fim (ou fechamento) do stream
+            return _sse_response(events, _admit('generation', 'interactive', tokens=params.max_new_tokens))
+        
+        with _admit('generation', 'interactive', tokens=params.max_new_tokens):
+            response = services.llm_manager.generate_response(
+                message, context, params=params, use_cache=_response_cache_mode(data)
+            )
         return jsonify({"response": response}), 200
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ModelNotReadyError as e:
+        return jsonify({"error": "Model not ready", "details": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": "Invalid generation parameters", "details": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -66,7 +157,7 @@ def chat():
 @api.route('/models/status', methods=['GET'])
 def model_status():
     try:
-        status = llm_manager.get_model_status()
+        status = services.llm_manager.get_model_status()
         return jsonify(status), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -76,15 +167,15 @@ def model_status():
 def get_system_status():
     try:
         # Obter status do sistema
-        system_status = system_manager.get_system_status()
+        system_status = services.system_manager.get_system_status()
         
         # Obter status do modelo
-        model_status = llm_manager.get_model_status()
+        model_status = services.llm_manager.get_model_status()
         
         # Obter informações de memória e cache
-        if memory_manager:
-            memory_info = memory_manager.get_memory_usage()
-            has_resources, available_gb = memory_manager.check_available_memory()
+        if services.memory_manager:
+            memory_info = services.memory_manager.get_memory_usage()
+            has_resources, available_gb = services.memory_manager.check_available_memory()
         else:
             memory_info = {}
             has_resources, available_gb = False, 0
@@ -116,11 +207,11 @@ def get_system_status():
 def system_config():
     try:
         if request.method == 'GET':
-            config = system_manager.get_config()
+            config = services.system_manager.get_config()
             return jsonify(config), 200
         else:
             new_config = request.json
-            updated_config = system_manager.update_config(new_config)
+            updated_config = services.system_manager.update_config(new_config)
             return jsonify(updated_config), 200
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
@@ -130,21 +221,29 @@ def system_config():
 @api.route('/system/cache/cleanup', methods=['POST'])
 def clean_cache():
     try:
-        result = system_manager.clean_cache()
+        result = services.system_manager.clean_cache()
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@api.route('/system/admission', methods=['GET'])
+def admission_stats():
+    """Queue depth, wait times and rejections of the admission controller"""
+    try:
+        return jsonify(services.admission_controller.get_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Workflow routes
 @api.route('/workflows', methods=['GET', 'POST'])
 def workflows():
     try:
         if request.method == 'GET':
-            workflows = workflow_manager.list_workflows()
+            workflows = services.workflow_manager.list_workflows()
             return jsonify(workflows), 200
         else:
             data = request.json
-            workflow = workflow_manager.create_workflow(
+            workflow = services.workflow_manager.create_workflow(
                 name=data.get('name'),
                 description=data.get('description'),
                 steps=data.get('steps', [])
@@ -157,22 +256,22 @@ def workflows():
 def workflow(workflow_id):
     try:
         if request.method == 'GET':
-            workflow = workflow_manager.get_workflow(workflow_id)
+            workflow = services.workflow_manager.get_workflow(workflow_id)
             if not workflow:
                 return jsonify({"error": "Workflow not found"}), 404
             return jsonify(workflow.to_dict()), 200
         elif request.method == 'PUT':
             data = request.json
-            workflow = workflow_manager.get_workflow(workflow_id)
+            workflow = services.workflow_manager.get_workflow(workflow_id)
             if not workflow:
                 return jsonify({"error": "Workflow not found"}), 404
             workflow.name = data.get('name', workflow.name)
             workflow.description = data.get('description', workflow.description)
             workflow.steps = data.get('steps', workflow.steps)
-            workflow_manager.save_workflows()
+            services.workflow_manager.save_workflows()
             return jsonify(workflow.to_dict()), 200
         else:
-            if not workflow_manager.delete_workflow(workflow_id):
+            if not services.workflow_manager.delete_workflow(workflow_id):
                 return jsonify({"error": "Workflow not found"}), 404
             return '', 204
     except Exception as e:
@@ -181,17 +280,27 @@ def workflow(workflow_id):
 @api.route('/workflows/<workflow_id>/execute', methods=['POST'])
 def execute_workflow(workflow_id):
     try:
-        workflow = workflow_manager.get_workflow(workflow_id)
+        workflow = services.workflow_manager.get_workflow(workflow_id)
         if not workflow:
             return jsonify({"error": "Workflow not found"}), 404
             
         data = request.json
-        result = workflow_manager.execute_workflow(
-            workflow_id=workflow_id,
-            input_data=data.get('input', {}),
-            context=data.get('context', {})
-        )
+        tokens = services.workflow_manager.generation_tokens(workflow_id, data.get('step'), data)
+        with _admit('generation', 'normal', tokens=tokens):
+            result = services.workflow_manager.execute_workflow(
+                workflow_id=workflow_id,
+                input_data=data.get('input', {}),
+                context=data.get('context', {}),
+                step=data.get('step'),
+                overrides=data
+            )
         return jsonify(result), 200
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ModelNotReadyError as e:
+        return jsonify({"error": "Model not ready", "details": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": "Invalid workflow input", "details": str(e)}), 400
     except Exception as e:
         logger.error(f"Error executing workflow {workflow_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -201,11 +310,11 @@ def execute_workflow(workflow_id):
 def prompts():
     try:
         if request.method == 'GET':
-            prompts = llm_manager.list_prompts()
+            prompts = services.llm_manager.list_prompts()
             return jsonify(prompts), 200
         else:
             data = request.json
-            prompt = llm_manager.save_prompt(data)
+            prompt = services.llm_manager.save_prompt(data)
             return jsonify(prompt), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -214,23 +323,64 @@ def prompts():
 def generate_prompt():
     try:
         data = request.json
-        result = llm_manager.generate_response(
-            message=data.get('prompt'),
-            context=data.get('context', {}),
-            max_length=data.get('max_length', 1000),
-            temperature=data.get('temperature', 0.7)
-        )
+        params = _generation_params(data)
+        with _admit('generation', 'interactive', tokens=params.max_new_tokens):
+            result = services.llm_manager.generate_response(
+                message=data.get('prompt'),
+                context=data.get('context', {}),
+                params=params,
+                use_cache=_response_cache_mode(data)
+            )
         return jsonify({"response": result}), 200
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ModelNotReadyError as e:
+        return jsonify({"error": "Model not ready", "details": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": "Invalid generation parameters", "details": str(e)}), 400
     except Exception as e:
         logger.error(f"Error generating prompt: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api.route('/prompt/stream', methods=['POST'])
+def stream_prompt():
+    """Generate from a prompt, sending tokens as Server-Sent Events as they are decoded"""
+    try:
+        data = request.json
+        if not data or not data.get('prompt'):
+            return jsonify({
+                "error": "Missing required field",
+                "details": "Field 'prompt' is required"
+            }), 400
+        if not services.llm_manager.is_ready():
+            return _model_not_ready()
+        params = _generation_params(data)
+        events = services.llm_manager.stream_chat(
+            data['prompt'],
+            data.get('context', {}),
+            params=params,
+            use_cache=_response_cache_mode(data)
+        )
+        return _sse_response(events, _admit('generation', 'interactive', tokens=params.max_new_tokens))
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ValueError as e:
+        return jsonify({"error": "Invalid generation parameters", "details": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error streaming prompt: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api.route('/prompts/execute', methods=['POST'])
 def execute_prompt():
     try:
         data = request.json
-        result = llm_manager.execute_prompt(data)
+        with _admit('generation', 'normal', tokens=_generation_params(data or {}).max_new_tokens):
+            result = services.llm_manager.execute_prompt(data)
         return jsonify(result), 200
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ValueError as e:
+        return jsonify({"error": "Invalid generation parameters", "details": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -265,7 +415,6 @@ def validate_documents():
         
         # Inicializar resultados
         validation_results = []
-        total_size = 0
         logger.info(f"Starting validation of {len(files)} files")
         
         for file in files:
@@ -285,13 +434,13 @@ def validate_documents():
             file.seek(0, os.SEEK_END)
             size = file.tell()
             file.seek(0)
-            total_size += size
             
-            if size > 10 * 1024 * 1024:  # 10MB
+            # Arquivos grandes são ingeridos em streaming; o limite só protege o disco
+            if size > config.RAG_MAX_UPLOAD_MB * 1024 * 1024:
                 validation_results.append({
                     'filename': filename,
                     'valid': False,
-                    'error': 'File too large (max 10MB)'
+                    'error': f'File too large (max {config.RAG_MAX_UPLOAD_MB}MB)'
                 })
                 continue
             
@@ -302,13 +451,6 @@ def validate_documents():
                 'size': size
             })
         
-        # Validar tamanho total
-        if total_size > 50 * 1024 * 1024:  # 50MB
-            return jsonify({
-                'error': 'Total size exceeds 50MB limit',
-                'results': validation_results
-            }), 400
-        
         return jsonify({
             'message': 'All files validated successfully',
             'results': validation_results
@@ -345,55 +487,23 @@ def upload_document():
                 'details': 'Files must have valid filenames'
             }), 400
         
-        # Verificar recursos do sistema
-        system_status = system_manager.get_system_status()
-        disk_space = system_status.get('diskSpace', {})
-        memory_info = system_status.get('memory', {})
-        
-        # Verificar espaço em disco (mínimo 10GB)
-        if disk_space.get('available', 0) < 10 * 1024 * 1024 * 1024:
-            logger.error("Insufficient disk space")
-            memory_manager.clean_corrupted_cache()  # Tentar liberar espaço
-            
-            # Verificar novamente após limpeza
-            system_status = system_manager.get_system_status()
-            disk_space = system_status.get('diskSpace', {})
-            
-            if disk_space.get('available', 0) < 10 * 1024 * 1024 * 1024:
-                return jsonify({
-                    'error': 'Insufficient disk space',
-                    'details': 'Need at least 10GB of free space. Please clean up disk space and try again.',
-                    'available': disk_space.get('available', 0),
-                    'required': 10 * 1024 * 1024 * 1024
-                }), 507
-        
-        # Verificar memória disponível (mínimo 4GB)
-        if memory_info.get('available', 0) < 4 * 1024 * 1024 * 1024:
-            logger.warning("Low memory available")
-            memory_manager.clean_corrupted_cache()  # Tentar liberar memória
-            
-            # Verificar novamente após limpeza
-            system_status = system_manager.get_system_status()
-            memory_info = system_status.get('memory', {})
-            
-            if memory_info.get('available', 0) < 4 * 1024 * 1024 * 1024:
-                return jsonify({
-                    'error': 'Insufficient memory',
-                    'details': 'System is low on memory. Processing may be affected.',
-                    'available': memory_info.get('available', 0),
-                    'recommended': 4 * 1024 * 1024 * 1024
-                }), 507
-        
-        # Processar documentos
-        logger.info(f"Starting document processing for {len(files)} files")
-        results = rag_pipeline.process_documents(files)
+        # Processar documentos na coleção escolhida
+        collection = request.form.get('collection')
+        rag_pipeline = services.collection_manager.get(collection)
+        logger.info(f"Starting document processing for {len(files)} files in collection '{rag_pipeline.name}'")
+        with _admit('ingestion', 'background', nbytes=request.content_length or 0):
+            results = rag_pipeline.process_documents(files)
+        services.collection_manager.touch(rag_pipeline.name)
         logger.info("Documents processed successfully")
         
         return jsonify({
             'message': 'Documents processed successfully',
+            'collection': rag_pipeline.name,
             'results': results
         })
         
+    except AdmissionRejected as e:
+        return _rejected(e)
     except ValueError as e:
         logger.error(f"Validation error in document upload: {str(e)}")
         return jsonify({
@@ -407,6 +517,37 @@ def upload_document():
             'details': str(e)
         }), 500
 
+@api.route('/rag/progress', methods=['GET'])
+def upload_progress():
+    try:
+        rag_pipeline = services.collection_manager.get(request.args.get('collection'))
+        return jsonify({
+            'collection': rag_pipeline.name,
+            'files': rag_pipeline.get_progress()
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/rag/migrate', methods=['GET', 'POST'])
+def migrate_collection():
+    """Start re-embedding a collection with another model, or report the migration status"""
+    try:
+        if request.method == 'GET':
+            rag_pipeline = services.collection_manager.get(request.args.get('collection'))
+            return jsonify(rag_pipeline.migration_status()), 200
+        
+        data = request.json or {}
+        rag_pipeline = services.collection_manager.get(data.get('collection'))
+        return jsonify(rag_pipeline.migrate_model(data.get('model'))), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @api.route('/rag/query', methods=['POST'])
 def query_documents():
     try:
@@ -429,7 +570,7 @@ def query_documents():
             }), 400
             
         # Verificar status do modelo
-        model_status = llm_manager.get_model_status()
+        model_status = services.llm_manager.get_model_status()
         if model_status.get('status') != 'ready':
             return jsonify({
                 "error": "Model not ready",
@@ -437,34 +578,22 @@ def query_documents():
                 "model_status": model_status
             }), 503
             
-        # Verificar recursos do sistema
-        system_status = system_manager.get_system_status()
-        memory_info = system_status.get('memory', {})
-        
-        # Verificar memória disponível (mínimo 2GB para queries)
-        if memory_info.get('available', 0) < 2 * 1024 * 1024 * 1024:
-            logger.warning("Low memory for query processing")
-            memory_manager.clean_corrupted_cache()  # Tentar liberar memória
-            
-            # Verificar novamente após limpeza
-            system_status = system_manager.get_system_status()
-            memory_info = system_status.get('memory', {})
-            
-            if memory_info.get('available', 0) < 2 * 1024 * 1024 * 1024:
-                return jsonify({
-                    'error': 'Insufficient memory',
-                    'details': 'System is low on memory. Please try again later.',
-                    'available': memory_info.get('available', 0),
-                    'recommended': 2 * 1024 * 1024 * 1024
-                }), 507
-        
         # Executar query
         logger.info("Executing RAG query")
-        results = rag_pipeline.query(data['query'])
+        rag_pipeline = services.collection_manager.get(data.get('collection'))
+        with _admit('embedding', 'interactive'):
+            results = rag_pipeline.query(
+                data['query'],
+                top_k=int(data.get('top_k', 5)),
+                mmr=data.get('mmr'),
+                mmr_lambda=float(data['mmr_lambda']) if data.get('mmr_lambda') is not None else None
+            )
         logger.info("Query executed successfully")
         
         return jsonify(results)
         
+    except AdmissionRejected as e:
+        return _rejected(e)
     except ValueError as e:
         logger.error(f"Validation error in RAG query: {str(e)}")
         return jsonify({
@@ -478,16 +607,102 @@ def query_documents():
             "details": str(e)
         }), 500
 
+@api.route('/rag/answer', methods=['POST'])
+def answer_query():
+    """Retrieve, pack and generate an answer in a single call"""
+    try:
+        if not request.is_json:
+            return jsonify({
+                "error": "Invalid request format",
+                "details": "Content-Type must be application/json"
+            }), 400
+        
+        data = request.json
+        if not data or not data.get('query'):
+            return jsonify({
+                "error": "Missing required field",
+                "details": "Field 'query' is required"
+            }), 400
+        
+        if not services.llm_manager.is_ready():
+            return _model_not_ready()
+        
+        # Aqui top_k é o número de chunks recuperados; o top_k da amostragem vem só em "config"
+        params = GenerationParams.from_dict(
+            {k: v for k, v in data.items() if k != 'top_k'},
+            data.get('config'),
+            {'max_new_tokens': config.RAG_ANSWER_MAX_NEW_TOKENS}
+        )
+        options = {
+            'top_k': data.get('top_k'),
+            'max_context_tokens': data.get('max_context_tokens'),
+            'params': params,
+            'use_cache': data.get('use_cache', True) and _response_cache_mode(data) is not False,
+            'collection': data.get('collection'),
+            'mmr': data.get('mmr'),
+            'mmr_lambda': float(data['mmr_lambda']) if data.get('mmr_lambda') is not None else None,
+            'compress': data.get('compress')
+        }
+        
+        if data.get('stream'):
+            permit = _admit('generation', 'interactive', tokens=params.max_new_tokens)
+            events = services.answer_pipeline.stream_answer(data['query'], **options)
+            try:
+                # A recuperação roda antes de abrir o stream, para que erros ainda virem status HTTP
+                first = next(events)
+            except BaseException:
+                permit.release()
+                raise
+            if first['type'] == 'error':
+                permit.release()
+                return _answer_failed(first)
+            return _sse_response(_prepend(first, events), permit)
+        
+        with _admit('generation', 'interactive', tokens=params.max_new_tokens):
+            result = services.answer_pipeline.answer(data['query'], **options)
+        if result.get('status') == 'error':
+            return _answer_failed(result)
+        return jsonify(result)
+        
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ValueError as e:
+        logger.error(f"Validation error in RAG answer: {str(e)}")
+        return jsonify({
+            "error": "Invalid query data",
+            "details": str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error answering RAG query: {str(e)}")
+        return jsonify({
+            "error": "Failed to answer query",
+            "details": str(e)
+        }), 500
+
+@api.route('/rag/collections', methods=['GET'])
+def list_collections():
+    try:
+        return jsonify(services.collection_manager.list_collections()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/rag/stats', methods=['GET'])
+def rag_stats():
+    try:
+        return jsonify(services.answer_pipeline.get_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Agent routes
 @api.route('/agents', methods=['GET', 'POST'])
 def agents():
     try:
         if request.method == 'GET':
-            agents = agent_manager.list_agents()
+            agents = services.agent_manager.list_agents()
             return jsonify(agents), 200
         else:
             data = request.json
-            agent = agent_manager.create_agent(data)
+            agent = services.agent_manager.create_agent(data)
             return jsonify(agent), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -496,18 +711,18 @@ def agents():
 def agent(agent_id):
     try:
         if request.method == 'GET':
-            agent = agent_manager.get_agent(agent_id)
+            agent = services.agent_manager.get_agent(agent_id)
             if not agent:
                 return jsonify({"error": "Agent not found"}), 404
             return jsonify(agent), 200
         elif request.method == 'PUT':
             data = request.json
-            agent = agent_manager.update_agent(agent_id, data)
+            agent = services.agent_manager.update_agent(agent_id, data)
             if not agent:
                 return jsonify({"error": "Agent not found"}), 404
             return jsonify(agent), 200
         else:
-            if not agent_manager.delete_agent(agent_id):
+            if not services.agent_manager.delete_agent(agent_id):
                 return jsonify({"error": "Agent not found"}), 404
             return '', 204
     except Exception as e:
@@ -517,8 +732,17 @@ def agent(agent_id):
 def execute_agent(agent_id):
     try:
         data = request.json
-        result = agent_manager.execute_agent(agent_id, data)
+        with _admit('generation', 'normal', tokens=services.agent_manager.generation_tokens(agent_id, data)):
+            result = services.agent_manager.execute_agent(agent_id, data)
+        if result is None:
+            return jsonify({"error": "Agent not found"}), 404
         return jsonify(result), 200
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except ModelNotReadyError as e:
+        return jsonify({"error": "Model not ready", "details": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": "Invalid generation parameters", "details": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -528,7 +752,7 @@ def usage_analytics():
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        usage = analytics_manager.get_usage_analytics(start_date, end_date)
+        usage = services.analytics_manager.get_usage_analytics(start_date, end_date)
         return jsonify(usage), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -538,7 +762,7 @@ def performance_analytics():
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        performance = analytics_manager.get_performance_analytics(start_date, end_date)
+        performance = services.analytics_manager.get_performance_analytics(start_date, end_date)
         return jsonify(performance), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
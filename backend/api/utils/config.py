@@ -6,3 +6,101 @@ class Config:
         self.MODEL_WEIGHTS_OFFLOAD_DIR = os.getenv('MODEL_WEIGHTS_OFFLOAD_DIR', '/app/models_cache/offload')
         self.HUGGINGFACE_CACHE = os.getenv('HUGGINGFACE_CACHE', '/app/models_cache/huggingface')
         self.TRANSFORMERS_CACHE = os.getenv('TRANSFORMERS_CACHE', '/app/models_cache/transformers')
+        # Carregamento do LLM em segundo plano (o servidor responde /live e /ready enquanto carrega) e aquecimento
+        self.LLM_BACKGROUND_LOAD = os.getenv('LLM_BACKGROUND_LOAD', 'true').lower() == 'true'
+        self.LLM_WARMUP = os.getenv('LLM_WARMUP', 'true').lower() == 'true'
+        # Orçamento padrão de tokens gerados por requisição (max_new_tokens no corpo o substitui) e janela de contexto do modelo
+        self.LLM_MAX_NEW_TOKENS = int(os.getenv('LLM_MAX_NEW_TOKENS', '512'))
+        self.LLM_CONTEXT_TOKENS = int(os.getenv('LLM_CONTEXT_TOKENS', '4096'))
+        # Batching contínuo: requisições simultâneas compartilham os passos de decodificação do modelo
+        self.LLM_SCHEDULER_ENABLED = os.getenv('LLM_SCHEDULER_ENABLED', 'true').lower() == 'true'
+        self.LLM_MAX_BATCH_SIZE = int(os.getenv('LLM_MAX_BATCH_SIZE', '8'))
+        # Cache de prefixos (KV) reaproveitado entre prompts com o mesmo início; exige o scheduler
+        self.LLM_PREFIX_CACHE_ENABLED = os.getenv('LLM_PREFIX_CACHE_ENABLED', 'true').lower() == 'true'
+        self.LLM_PREFIX_CACHE_MB = int(os.getenv('LLM_PREFIX_CACHE_MB', '1024'))
+        self.LLM_PREFIX_CACHE_BLOCK_TOKENS = int(os.getenv('LLM_PREFIX_CACHE_BLOCK_TOKENS', '64'))
+        # Quantização int8 dos pesos para inferência em CPU (none, int8 ou auto = só sem GPU); checkpoint gerado uma vez
+        # e recarregado. Desativada por padrão: a primeira execução carrega o modelo inteiro em bf16 para quantizar
+        self.LLM_QUANTIZATION = os.getenv('LLM_QUANTIZATION', 'none').lower()
+        self.LLM_QUANTIZED_DIR = os.getenv('LLM_QUANTIZED_DIR', '/app/models_cache/quantized/deepseek-llm-7b-base-int8')
+        self.LLM_QUANTIZED_MAX_PPL_INCREASE = float(os.getenv('LLM_QUANTIZED_MAX_PPL_INCREASE', '0.1'))
+        # Decodificação especulativa: modelo de rascunho pequeno com o mesmo tokenizer (vazio = desativada; exige o scheduler)
+        self.LLM_DRAFT_MODEL = os.getenv('LLM_DRAFT_MODEL', '')
+        self.LLM_DRAFT_MAX_TOKENS = int(os.getenv('LLM_DRAFT_MAX_TOKENS', '8'))
+        # Cache persistente de respostas: só gerações determinísticas (temperature 0) ou quando o cliente pede
+        self.LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+        self.LLM_RESPONSE_CACHE_PATH = os.getenv('LLM_RESPONSE_CACHE_PATH', '/app/data/response_cache.db')
+        self.LLM_RESPONSE_CACHE_TTL = float(os.getenv('LLM_RESPONSE_CACHE_TTL', '604800'))
+        self.LLM_RESPONSE_CACHE_MB = int(os.getenv('LLM_RESPONSE_CACHE_MB', '256'))
+        # Controle de admissão: unidades de custo simultâneas, fila por prioridade, espera máxima e memória mínima livre
+        self.ADMISSION_CAPACITY = float(os.getenv('ADMISSION_CAPACITY', '16'))
+        self.ADMISSION_QUEUE_INTERACTIVE = int(os.getenv('ADMISSION_QUEUE_INTERACTIVE', '32'))
+        self.ADMISSION_QUEUE_NORMAL = int(os.getenv('ADMISSION_QUEUE_NORMAL', '16'))
+        self.ADMISSION_QUEUE_BACKGROUND = int(os.getenv('ADMISSION_QUEUE_BACKGROUND', '4'))
+        self.ADMISSION_MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '30'))
+        self.ADMISSION_MIN_FREE_MEMORY_MB = int(os.getenv('ADMISSION_MIN_FREE_MEMORY_MB', '1024'))
+
+        # RAG answer endpoint
+        self.RAG_ANSWER_TOP_K = int(os.getenv('RAG_ANSWER_TOP_K', '5'))
+        self.RAG_CONTEXT_MAX_TOKENS = int(os.getenv('RAG_CONTEXT_MAX_TOKENS', '1024'))
+        self.RAG_ANSWER_MAX_NEW_TOKENS = int(os.getenv('RAG_ANSWER_MAX_NEW_TOKENS', '256'))
+        # MMR: busca RAG_MMR_FETCH_FACTOR × top_k candidatos e escolhe top_k diversos (lambda 1 = só relevância)
+        self.RAG_MMR_ENABLED = os.getenv('RAG_MMR_ENABLED', 'false').lower() == 'true'
+        self.RAG_MMR_LAMBDA = float(os.getenv('RAG_MMR_LAMBDA', '0.5'))
+        self.RAG_MMR_FETCH_FACTOR = int(os.getenv('RAG_MMR_FETCH_FACTOR', '4'))
+        # Compressão extrativa do contexto: mantém as frases mais próximas da pergunta até o orçamento de tokens
+        self.RAG_COMPRESSION_ENABLED = os.getenv('RAG_COMPRESSION_ENABLED', 'false').lower() == 'true'
+        self.RAG_COMPRESSION_MAX_TOKENS = int(os.getenv('RAG_COMPRESSION_MAX_TOKENS', '384'))
+
+        # Semantic answer cache
+        self.SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+        self.SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+        self.SEMANTIC_CACHE_TTL = float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+        self.SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000'))
+
+        # RAG collections
+        self.RAG_COLLECTIONS_DIR = os.getenv('RAG_COLLECTIONS_DIR', '/app/data/collections')
+        self.RAG_DEFAULT_COLLECTION = os.getenv('RAG_DEFAULT_COLLECTION', 'default')
+        self.RAG_MEMORY_BUDGET_MB = int(os.getenv('RAG_MEMORY_BUDGET_MB', '512'))
+
+        # Modelo de embeddings das coleções novas; coleções existentes mudam de modelo via migração
+        self.RAG_EMBEDDING_MODEL = os.getenv('RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        # Migração: chunks recodificados por lote e pausa entre lotes (para não disputar a CPU com consultas)
+        self.RAG_MIGRATION_BATCH_SIZE = int(os.getenv('RAG_MIGRATION_BATCH_SIZE', '64'))
+        self.RAG_MIGRATION_PAUSE_MS = float(os.getenv('RAG_MIGRATION_PAUSE_MS', '50'))
+
+        # Vector search: processos locais que dividem o índice (1 = sem sharding)
+        self.RAG_SEARCH_SHARDS = int(os.getenv('RAG_SEARCH_SHARDS', '1'))
+        # Busca exata em NumPy até este número de vetores; acima dele usa FAISS (se instalado)
+        self.RAG_EXACT_SEARCH_MAX_VECTORS = int(os.getenv('RAG_EXACT_SEARCH_MAX_VECTORS', '10000'))
+        self.RAG_EXACT_SEARCH_BLOCK_SIZE = int(os.getenv('RAG_EXACT_SEARCH_BLOCK_SIZE', '16384'))
+        # Armazenamento dos vetores no índice: float32, float16 ou int8 (com re-score em float32)
+        self.RAG_VECTOR_STORAGE = os.getenv('RAG_VECTOR_STORAGE', 'float32').lower()
+        self.RAG_RESCORE_FACTOR = int(os.getenv('RAG_RESCORE_FACTOR', '4'))
+        # Redução de dimensão do índice: none, pca (treinado na coleção) ou truncate (modelos Matryoshka)
+        self.RAG_DIM_REDUCTION = os.getenv('RAG_DIM_REDUCTION', 'none').lower()
+        self.RAG_REDUCED_DIM = int(os.getenv('RAG_REDUCED_DIM', '128'))
+        self.RAG_PCA_MIN_VECTORS = int(os.getenv('RAG_PCA_MIN_VECTORS', '1000'))
+        # Chunking: tokens (tokenizer do encoder, limitado à sua janela) ou characters (divisor antigo)
+        self.RAG_CHUNKER = os.getenv('RAG_CHUNKER', 'tokens').lower()
+        self.RAG_CHUNK_TOKENS = int(os.getenv('RAG_CHUNK_TOKENS', '256'))
+        self.RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv('RAG_CHUNK_OVERLAP_TOKENS', '32'))
+
+        # Ingestão de arquivos grandes: uploads gravados em blocos, .txt lido por mmap em janelas
+        self.RAG_MAX_UPLOAD_MB = int(os.getenv('RAG_MAX_UPLOAD_MB', '1024'))
+        # Uploads até este tamanho são lidos direto da memória; maiores vão para um temporário em RAG_UPLOAD_TMP_DIR
+        self.RAG_IN_MEMORY_UPLOAD_KB = int(os.getenv('RAG_IN_MEMORY_UPLOAD_KB', '4096'))
+        self.RAG_UPLOAD_TMP_DIR = os.getenv('RAG_UPLOAD_TMP_DIR', '/app/data/uploads')
+        self.RAG_UPLOAD_CHUNK_KB = int(os.getenv('RAG_UPLOAD_CHUNK_KB', '1024'))
+        self.RAG_TEXT_WINDOW_MB = int(os.getenv('RAG_TEXT_WINDOW_MB', '4'))
+        # Chunks codificados por lote na indexação (limita a memória dos embeddings)
+        self.RAG_EMBED_BATCH_SIZE = int(os.getenv('RAG_EMBED_BATCH_SIZE', '256'))
+
+        # Textos dos chunks em blocos comprimidos (codec auto = zstd, lz4 ou zlib) com cache LRU dos mais lidos
+        self.RAG_CHUNK_TEXT_CODEC = os.getenv('RAG_CHUNK_TEXT_CODEC', 'auto')
+        self.RAG_CHUNK_TEXT_BLOCK_KB = int(os.getenv('RAG_CHUNK_TEXT_BLOCK_KB', '64'))
+        self.RAG_CHUNK_TEXT_CACHE_MB = int(os.getenv('RAG_CHUNK_TEXT_CACHE_MB', '16'))
+
+        # Micro-batching das consultas: espera até QUERY_BATCH_MAX_WAIT_MS ou QUERY_BATCH_MAX_SIZE textos (1 = desligado)
+        self.QUERY_BATCH_MAX_SIZE = int(os.getenv('QUERY_BATCH_MAX_SIZE', '32'))
+        self.QUERY_BATCH_MAX_WAIT_MS = float(os.getenv('QUERY_BATCH_MAX_WAIT_MS', '5'))
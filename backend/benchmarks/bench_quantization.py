@@ -0,0 +1,71 @@
+"""
+Int8 quantization benchmark: perplexity and CPU decode speed of bf16 vs dynamic int8.
+
+Usage (from the backend directory):
+    PYTHONPATH=api python benchmarks/bench_quantization.py [--model deepseek-ai/deepseek-llm-7b-base]
+        [--text-file notes.txt] [--new-tokens 32] [--save /app/models_cache/quantized/deepseek-llm-7b-base-int8]
+
+The bf16 model is measured first and then quantized in place (as LLMManager
+does), so peak memory is the bf16 model plus one float32 decoder layer.
+"""
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from core import quantization
+
+@torch.no_grad()
+def _decode_speed(model, tokenizer, new_tokens):
+    inputs = tokenizer("The answer to the question is", return_tensors='pt')
+    args = dict(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'], do_sample=False,
+                pad_token_id=tokenizer.pad_token_id or tokenizer.eos_token_id)
+    model.generate(**args, max_new_tokens=2)  # aquecimento
+    start = time.perf_counter()
+    output = model.generate(**args, max_new_tokens=new_tokens, min_new_tokens=new_tokens)
+    return (output.shape[1] - inputs['input_ids'].shape[1]) / (time.perf_counter() - start)
+
+def _nbytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.nbytes
+    # Camadas int8 guardam (peso quantizado, bias) em _packed_params
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+def _memory_mb(model):
+    return sum(_nbytes(v) for v in model.state_dict().values()) / 1024 ** 2
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='deepseek-ai/deepseek-llm-7b-base')
+    parser.add_argument('--text-file', help='text for the perplexity check (default: built-in sample)')
+    parser.add_argument('--new-tokens', type=int, default=32)
+    parser.add_argument('--max-increase', type=float, default=0.1)
+    parser.add_argument('--save', help='directory to save the int8 checkpoint to')
+    args = parser.parse_args()
+
+    text = open(args.text_file).read() if args.text_file else quantization.SAMPLE_TEXT
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.bfloat16, low_cpu_mem_usage=True).eval()
+    bf16_speed = _decode_speed(model, tokenizer, args.new_tokens)
+    bf16_memory = _memory_mb(model)
+
+    try:
+        report = quantization.quantize_checked(model, tokenizer, max_increase=args.max_increase, text=text)
+    except quantization.QuantizationError as e:
+        report = e.report
+    int8_speed = _decode_speed(model, tokenizer, args.new_tokens)
+
+    print(f"{'':8} {'perplexity':>11} {'tok/s':>8} {'weights MB':>11}")
+    print(f"{'bf16':8} {report['reference_perplexity']:11.3f} {bf16_speed:8.1f} {bf16_memory:11.0f}")
+    print(f"{'int8':8} {report['quantized_perplexity']:11.3f} {int8_speed:8.1f} {_memory_mb(model):11.0f}")
+    print(f"perplexity {100 * report['perplexity_increase']:+.2f}%, decode x{int8_speed / bf16_speed:.1f}, "
+          f"{'accepted' if report['accepted'] else 'rejected'}")
+    if args.save and report['accepted']:
+        quantization.save_quantized(model, args.save, report)
+        print(f"saved to {args.save}")
+
+if __name__ == '__main__':
+    main()
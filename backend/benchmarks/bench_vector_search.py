@@ -0,0 +1,160 @@
+"""
+Vector search benchmarks.
+
+    speed    NumPy exact search vs FAISS IndexFlatL2 latency
+    storage  bytes/vector and recall of float16/int8 storage, with and without re-scoring
+    dims     recall vs dimension for PCA and truncation, with and without re-scoring
+
+Usage (from the backend directory):
+    PYTHONPATH=api python benchmarks/bench_vector_search.py [speed|storage|dims] [--sizes 1000 10000 100000]
+
+storage and dims use synthetic clustered vectors unless --vectors points at a
+collection's vectors.f32 (e.g. /app/data/collections/default/vectors.f32).
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.vector_index import (
+    NumpyFlatIndex, QuantizedFlatIndex, VectorStore, DimensionReducer, ReducedIndex, load_faiss
+)
+
+def _time_per_query(search, queries, k, repeats):
+    search(queries[:1], k)  # aquecimento
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            search(query[None, :], k)
+    return (time.perf_counter() - start) / (repeats * len(queries))
+
+def _time_concurrent(index, queries, k, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda q: index.search(q[None, :], k), queries))
+        return (time.perf_counter() - start) / len(queries)
+
+def _recall(expected, found, k):
+    return np.mean([len(set(e[:k]) & set(f[:k])) / k for e, f in zip(expected, found)])
+
+def _embedding_like(rng, size, dim):
+    """Clustered vectors with uneven per-dimension scales, closer to sentence embeddings than pure noise"""
+    centers = rng.standard_normal((max(1, size // 50), dim), dtype=np.float32)
+    scales = rng.uniform(0.02, 0.2, dim).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)] * scales
+    return vectors + rng.standard_normal((size, dim), dtype=np.float32) * scales * 0.5
+
+def _corpus(args, rng, size):
+    """Corpus and held-out queries, from --vectors when given"""
+    if args.vectors:
+        data = np.fromfile(args.vectors, dtype=np.float32).reshape(-1, args.dim)
+        picked = rng.permutation(len(data))[:size + args.queries]
+        data = data[picked]
+        return data[:-args.queries], data[-args.queries:]
+    data = _embedding_like(rng, size + args.queries, args.dim)
+    return data[:size], data[size:]
+
+def storage_report(args, rng):
+    print(f"dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"{'vectors':>10} {'storage':>8} {'rescore':>8} {'bytes/vec':>10} {'ms/query':>9} {'recall':>8}")
+    for size in args.sizes:
+        vectors, queries = _corpus(args, rng, size)
+        exact = NumpyFlatIndex(args.dim)
+        exact.add(vectors)
+        _, expected = exact.search(queries, args.k)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = VectorStore(args.dim, os.path.join(tmp, 'vectors.f32'))
+            store.append(vectors)
+            configs = [('float32', None)] + [
+                (kind, factor) for kind in ('float16', 'int8') for factor in (1, args.rescore_factor)
+            ]
+            for kind, factor in configs:
+                if kind == 'float32':
+                    index = exact
+                else:
+                    index = QuantizedFlatIndex(args.dim, store, kind=kind, rescore_factor=factor)
+                    index.add(vectors)
+                ms = _time_per_query(index.search, queries, args.k, args.repeats) * 1000
+                _, found = index.search(queries, args.k)
+                rescore = '-' if factor is None else ('no' if factor <= 1 else f'x{factor}')
+                print(f"{size:>10} {kind:>8} {rescore:>8} {index.bytes_per_vector:>10} "
+                      f"{ms:>9.3f} {_recall(expected, found, args.k):>8.3f}")
+
+def dims_report(args, rng):
+    print(f"dim={args.dim} k={args.k} queries={args.queries} rescore=x{args.rescore_factor}")
+    print(f"{'vectors':>10} {'method':>9} {'dim':>5} {'bytes/vec':>10} {'variance':>9} "
+          f"{'recall':>8} {'rescored':>9}")
+    for size in args.sizes:
+        vectors, queries = _corpus(args, rng, size)
+        exact = NumpyFlatIndex(args.dim)
+        exact.add(vectors)
+        _, expected = exact.search(queries, args.k)
+        store = VectorStore(args.dim)
+        store.append(vectors)
+
+        for method in DimensionReducer.METHODS:
+            for dim in args.target_dims:
+                if dim >= args.dim:
+                    continue
+                reducer = DimensionReducer(method, args.dim, dim).fit(vectors)
+                index = ReducedIndex(NumpyFlatIndex(dim), reducer, store, rescore_factor=1)
+                index.add(vectors)
+                _, found = index.search(queries, args.k)
+                index.rescore_factor = args.rescore_factor
+                _, rescored = index.search(queries, args.k)
+                variance = '-' if reducer.explained_variance is None else f"{reducer.explained_variance:.3f}"
+                print(f"{size:>10} {method:>9} {dim:>5} {index.index.bytes_per_vector:>10} {variance:>9} "
+                      f"{_recall(expected, found, args.k):>8.3f} {_recall(expected, rescored, args.k):>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('report', nargs='?', choices=['speed', 'storage', 'dims'], default='speed')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000, 100000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rescore-factor', type=int, default=4)
+    parser.add_argument('--target-dims', type=int, nargs='+', default=[32, 64, 128, 192, 256])
+    parser.add_argument('--vectors', help="raw float32 vectors file of dimension --dim")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.report == 'storage':
+        storage_report(args, rng)
+        return
+    if args.report == 'dims':
+        dims_report(args, rng)
+        return
+
+    faiss = load_faiss()
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"dim={args.dim} k={args.k} queries={args.queries} (latency per query, ms)")
+    print(f"{'vectors':>10} {'numpy':>10} {'faiss':>10} {'numpy x{}'.format(args.threads):>12} {'recall':>8}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        numpy_index = NumpyFlatIndex(args.dim)
+        numpy_index.add(vectors)
+        numpy_ms = _time_per_query(numpy_index.search, queries, args.k, args.repeats) * 1000
+        concurrent_ms = _time_concurrent(numpy_index, queries, args.k, args.threads) * 1000
+
+        faiss_ms = float('nan')
+        recall = float('nan')
+        if faiss is not None:
+            faiss_index = faiss.IndexFlatL2(args.dim)
+            faiss_index.add(vectors)
+            faiss_ms = _time_per_query(faiss_index.search, queries, args.k, args.repeats) * 1000
+            _, expected = faiss_index.search(queries, args.k)
+            _, found = numpy_index.search(queries, args.k)
+            recall = _recall(expected, found, args.k)
+
+        print(f"{size:>10} {numpy_ms:>10.3f} {faiss_ms:>10.3f} {concurrent_ms:>12.3f} {recall:>8.3f}")
+
+if __name__ == '__main__':
+    main()
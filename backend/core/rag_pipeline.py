@@ -36,9 +36,9 @@ class RAGPipeline:
         if disk.free < 1024 * 1024 * 1024:  # 1GB
             return False, "Insufficient disk space. At least 1GB required."
             
-        # Check if file size is reasonable
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            return False, "File too large. Maximum size is 10MB."
+        # The upload is copied to the documents directory before processing
+        if disk.free < file_size + 1024 * 1024 * 1024:
+            return False, "Insufficient disk space for this file."
             
         return True, ""
         
@@ -51,7 +51,8 @@ class RAGPipeline:
         
         for file in files:
             # Check file size and system resources
-            file_size = len(file.read())
+            file.seek(0, os.SEEK_END)
+            file_size = file.tell()
             file.seek(0)  # Reset file pointer
             
             can_process, error = self.check_system_resources(file_size)
@@ -2,11 +2,15 @@
 Test configuration and fixtures for Q-RAG3 backend tests.
 """
 import os
+import sys
 import pytest
 import tempfile
 import shutil
 from pathlib import Path
 
+# Os módulos da API se importam a partir de backend/api (core.*, utils.*, app, routes), como no container
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
 @pytest.fixture(scope="session")
 def test_data_dir():
     """Create a temporary directory for test data."""
@@ -0,0 +1,93 @@
+"""
+Tests for the AdmissionController class.
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+import pytest
+from core.admission import AdmissionController, AdmissionRejected
+from core.services import ServiceContainer
+from app import create_app
+from routes import _sse_response
+
+def acquire_later(controller, priority, order):
+    def run():
+        with controller.acquire('generation', 1, priority):
+            order.append(priority)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+class TestAdmissionController:
+    def test_waiters_are_served_by_priority(self):
+        """Test that queued interactive requests run before earlier background ones."""
+        controller = AdmissionController(capacity=1)
+        permit = controller.acquire('ingestion', 1, 'background')
+        order = []
+        threads = [acquire_later(controller, 'background', order)]
+        time.sleep(0.05)
+        threads.append(acquire_later(controller, 'interactive', order))
+        while controller.get_stats()['priorities']['interactive']['queued'] < 1:
+            time.sleep(0.01)
+
+        permit.release()
+        for thread in threads:
+            thread.join(5)
+        assert order == ['interactive', 'background']
+        assert controller.get_stats()['in_flight'] == 0
+
+    def test_full_queue_and_timeout_are_rejected(self):
+        """Test that a full queue is refused with 429 and a long wait with 503, both with Retry-After."""
+        controller = AdmissionController(capacity=2, queue_limits={'background': 0}, max_wait=0.05)
+        permit = controller.acquire('generation', 2, 'interactive')
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire('ingestion', 1, 'background')
+        assert rejected.value.status_code == 429
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.acquire('generation', 1, 'interactive')
+        assert rejected.value.status_code == 503 and rejected.value.retry_after >= 1
+
+        permit.release()
+        assert controller.get_stats()['priorities']['interactive']['rejected'] == 1
+
+    def test_route_answers_busy(self):
+        """Test that a saturated controller turns a chat request into a 503 with Retry-After."""
+        controller = AdmissionController(capacity=1, max_wait=0.01)
+        llm = MagicMock()
+        client = create_app(ServiceContainer(llm_manager=llm, admission_controller=controller), start=False).test_client()
+
+        with controller.acquire('generation', 1, 'background'):
+            response = client.post('/api/chat', json={'message': 'hi'})
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        llm.generate_response.assert_not_called()
+
+    def test_stream_closed_before_start_releases_permit(self):
+        """Test that an SSE response closed before its first event gives its capacity back."""
+        controller = AdmissionController(capacity=4)
+        app = create_app(ServiceContainer(llm_manager=MagicMock(), admission_controller=controller), start=False)
+
+        with app.test_request_context():
+            permit = controller.acquire('generation', 2, 'interactive')
+            response = _sse_response(iter([{'type': 'done'}]), permit)
+            assert controller.get_stats()['in_flight'] == 2
+            response.close()
+        assert controller.get_stats()['in_flight'] == 0
+
+    def test_agent_cost_follows_its_token_budget(self):
+        """Test that an agent run is admitted with the cost of its max_new_tokens, not a fixed budget."""
+        controller = AdmissionController(capacity=16)
+        costs = []
+        acquire = controller.acquire
+        controller.acquire = lambda operation, cost, priority: costs.append(cost) or acquire(operation, cost, priority)
+        llm = MagicMock()
+        llm.config.LLM_MAX_NEW_TOKENS = 512
+        llm.complete.return_value = {'text': 'ok', 'finish_reason': 'eos', 'usage': {}}
+        services = ServiceContainer(llm_manager=llm, admission_controller=controller)
+        client = create_app(services, start=False).test_client()
+        agent = services.agent_manager.create_agent({'name': 'a', 'config': {'max_new_tokens': 1024}})
+
+        assert client.post(f"/api/agents/{agent['id']}/execute", json={'input': 'hi'}).status_code == 200
+        assert client.post(f"/api/agents/{agent['id']}/execute", json={'input': 'hi', 'maxTokens': 256}).status_code == 200
+        assert costs == [controller.estimate_cost('generation', tokens=1024), controller.estimate_cost('generation', tokens=256)]
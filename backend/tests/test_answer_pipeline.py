@@ -0,0 +1,143 @@
+"""
+Tests for the AnswerPipeline: context packing and the /api/rag/answer route.
+"""
+import json
+import numpy as np
+from unittest.mock import MagicMock
+import pytest
+from core.answer_pipeline import AnswerPipeline
+from core.semantic_cache import SemanticCache
+from core.services import ServiceContainer
+from app import create_app
+
+class CharCounter:
+    """LLM token counter stand-in with one token per character."""
+
+    tokenizer_name = 'chars'
+
+    def __init__(self):
+        self.counted = []
+
+    def count_tokens(self, texts):
+        self.counted.extend(texts)
+        return self.tokenizer_name, [len(text) for text in texts]
+
+@pytest.fixture
+def pipeline():
+    return AnswerPipeline(MagicMock(), CharCounter())
+
+class TestPackContext:
+    def test_budget_counts_llm_tokens(self, pipeline):
+        """Test that chunks without a stored token_count are counted with the LLM tokenizer."""
+        results = [
+            {'chunk': 'a' * 40, 'score': 0.9, 'token_count': None},
+            {'chunk': 'b' * 30, 'score': 0.8},
+            {'chunk': 'c' * 10, 'score': 0.7, 'token_count': None}
+        ]
+        packed, used = pipeline.pack_context(results, 50)
+        assert [r['chunk'][0] for r in packed] == ['a', 'c'] and used == 50
+
+    def test_stored_token_counts_are_not_recounted(self, pipeline):
+        """Test that the LLM token counts stored at ingestion are used as they are."""
+        results = [
+            {'chunk': 'a' * 40, 'score': 0.9, 'token_count': 4},
+            {'chunk': 'b' * 30, 'score': 0.8, 'token_count': 3},
+            {'chunk': 'c' * 10, 'score': 0.7}
+        ]
+        packed, used = pipeline.pack_context(results, 10)
+        assert [r['chunk'][0] for r in packed] == ['a', 'b'] and used == 7
+        assert pipeline.llm_manager.counted == ['c' * 10]
+
+    def test_best_ranked_first(self, pipeline):
+        """Test that chunks are taken in score order."""
+        results = [{'chunk': 'low', 'score': 0.1}, {'chunk': 'high', 'score': 0.9}]
+        packed, used = pipeline.pack_context(results, 4)
+        assert [r['chunk'] for r in packed] == ['high'] and used == 4
+        assert pipeline.pack_context([], 10) == ([], 0)
+
+def generate(prompt, params, stats=None, use_cache=None):
+    stats.update({'prefill': 0.1, 'decode': 0.2, 'prompt_tokens': 40, 'completion_tokens': 1, 'finish_reason': 'eos'})
+    yield 'Paris'
+
+class TestSemanticCacheHit:
+    def test_done_event_has_the_same_shape(self):
+        """Test that a cached answer reports the finish reason and usage keys of a generated one."""
+        collection = MagicMock()
+        collection.retrieve.return_value = {
+            'results': [{'chunk': 'Paris is the capital.', 'score': 0.9, 'collection': 'docs', 'chunk_id': '1:0'}],
+            'query_embedding': np.ones(8, dtype=np.float32), 'embedding_model': 'encoder', 'timings': {}
+        }
+        llm_manager = CharCounter()
+        llm_manager.stream_response = MagicMock(side_effect=generate)
+        pipeline = AnswerPipeline(MagicMock(get=MagicMock(return_value=collection)), llm_manager)
+        pipeline.cache = SemanticCache()
+
+        generated, cached = (list(pipeline.stream_answer('capital?', compress=False))[-1] for _ in range(2))
+        assert llm_manager.stream_response.call_count == 1
+        assert (generated['cached'], cached['cached']) == (False, True)
+        assert set(cached) - {'cache_similarity'} == set(generated)
+        assert cached['finish_reason'] == generated['finish_reason'] == 'eos'
+        assert cached['usage'] == generated['usage'] == {'context_tokens': 21, 'prompt_tokens': 40, 'completion_tokens': 1}
+
+CONTEXT = {'type': 'context', 'results': [{'chunk': 'Paris is the capital.', 'score': 0.9}], 'context_tokens': 5}
+DONE = {'type': 'done', 'status': 'completed', 'finish_reason': 'eos', 'cached': False, 'timings': {}, 'usage': {}}
+NO_DOCUMENTS = {'type': 'error', 'status': 'error', 'code': 'no_documents', 'error': 'No documents indexed'}
+
+@pytest.fixture
+def answers():
+    return MagicMock()
+
+@pytest.fixture
+def client(answers):
+    llm = MagicMock()
+    llm.is_ready.return_value = True
+    return create_app(ServiceContainer(llm_manager=llm, answer_pipeline=answers), start=False).test_client()
+
+def sse_events(response):
+    return [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).splitlines() if line]
+
+class TestAnswerRoute:
+    def test_json_answer_with_generation_params(self, client, answers):
+        """Test that the body's generation settings reach the pipeline and top_k stays the retrieval count."""
+        answers.answer.return_value = {'query': 'capital?', 'answer': 'Paris', 'status': 'completed', 'results': []}
+        response = client.post('/api/rag/answer', json={
+            'query': 'capital?', 'top_k': 3, 'max_new_tokens': 32, 'temperature': 0, 'stop': '\n',
+            'timeout': 30, 'config': {'top_k': 40, 'repetition_penalty': 1.1}
+        })
+
+        assert response.status_code == 200
+        assert response.get_json()['answer'] == 'Paris'
+        kwargs = answers.answer.call_args.kwargs
+        params = kwargs['params']
+        assert kwargs['top_k'] == 3
+        assert (params.max_new_tokens, params.temperature, params.stop) == (32, 0.0, ['\n'])
+        assert (params.top_k, params.repetition_penalty) == (40, 1.1)
+        assert 0 < params.remaining() <= 30
+
+    def test_json_error_is_not_200(self, client, answers):
+        """Test that a pipeline error (empty collection) is returned as 404."""
+        answers.answer.return_value = {'query': 'capital?', 'results': [], 'answer': '', **NO_DOCUMENTS}
+        response = client.post('/api/rag/answer', json={'query': 'capital?'})
+        assert response.status_code == 404
+        assert response.get_json()['code'] == 'no_documents'
+
+    def test_stream(self, client, answers):
+        """Test that stream: true sends the pipeline events as SSE."""
+        answers.stream_answer.return_value = iter([CONTEXT, {'type': 'token', 'text': 'Paris'}, DONE])
+        response = client.post('/api/rag/answer', json={'query': 'capital?', 'stream': True})
+
+        assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+        assert [event['type'] for event in sse_events(response)] == ['context', 'token', 'done']
+        assert sse_events(response)[1]['text'] == 'Paris'
+
+    def test_stream_error_before_first_event(self, client, answers):
+        """Test that an error found during retrieval is an HTTP error, not a 200 stream."""
+        answers.stream_answer.return_value = iter([NO_DOCUMENTS])
+        response = client.post('/api/rag/answer', json={'query': 'capital?', 'stream': True})
+        assert response.status_code == 404 and response.mimetype == 'application/json'
+
+    @pytest.mark.parametrize('body', [{'query': 'capital?', 'top_p': 2}, {'query': 'capital?', 'timeout': 0}, {}])
+    def test_invalid_requests(self, client, answers, body):
+        """Test that invalid generation settings and a missing query are rejected with 400."""
+        assert client.post('/api/rag/answer', json=body).status_code == 400
+        answers.answer.assert_not_called()
@@ -0,0 +1,57 @@
+"""
+Tests for the TokenChunker class.
+"""
+import pytest
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
+from core.chunker import TokenChunker, read_text_windows
+
+@pytest.fixture
+def tokenizer():
+    """Word-level fast tokenizer: one token per word or punctuation mark."""
+    backend = Tokenizer(models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]")
+
+class TestTokenChunker:
+    def test_windows_and_overlap(self, tokenizer):
+        """Test chunk sizes, token counts and overlap on text without sentence breaks."""
+        text = " ".join(f"w{i}" for i in range(100))
+        chunks = TokenChunker(tokenizer, chunk_tokens=30, overlap_tokens=10).split(text)
+
+        assert [tokens for _, tokens in chunks] == [30, 30, 30, 30, 20]
+        assert chunks[0][0].split()[-10:] == chunks[1][0].split()[:10]
+        assert chunks[-1][0].endswith("w99")
+
+    def test_prefers_sentence_boundaries(self, tokenizer):
+        """Test that a chunk ends after a sentence in the last quarter of the window."""
+        text = " ".join(["a"] * 25) + ". " + " ".join(["b"] * 40)
+        chunk, tokens = TokenChunker(tokenizer, chunk_tokens=30, overlap_tokens=0).split(text)[0]
+        assert chunk.endswith(".")
+        assert tokens == 26
+
+    def test_long_text_segments_keep_offsets(self, tokenizer):
+        """Test that segmented tokenization of large texts keeps chunk text intact."""
+        lines = [f"line {i} " + "x " * 50 for i in range(400)]
+        text = "\n".join(lines)
+        chunks = TokenChunker(tokenizer, chunk_tokens=100, overlap_tokens=0).split(text)
+
+        assert sum(tokens for _, tokens in chunks) == len(text.split())
+        assert " ".join(chunk for chunk, _ in chunks).split() == text.split()
+
+    def test_stream_matches_whole_text(self, tokenizer, tmp_path):
+        """Test that splitting mmap windows of a file gives the same chunks as the whole text."""
+        text = "\n".join(f"linha {i} é " + "palavra " * (i % 37) + "." for i in range(600))
+        path = tmp_path / "dump.txt"
+        path.write_text(text, encoding="utf-8")
+        chunker = TokenChunker(tokenizer, chunk_tokens=50, overlap_tokens=8)
+
+        windows = list(read_text_windows(str(path), window_bytes=1000))
+        assert len(windows) > 10
+        assert "".join(windows) == text
+        assert list(chunker.split_stream(windows)) == chunker.split(text)
+
+    def test_invalid_settings(self, tokenizer):
+        """Test that overlap must be smaller than the chunk size."""
+        with pytest.raises(ValueError):
+            TokenChunker(tokenizer, chunk_tokens=10, overlap_tokens=10)
@@ -0,0 +1,65 @@
+"""
+Tests for the CollectionManager: collection names and the memory budget.
+"""
+import pytest
+from core.collection_manager import CollectionManager
+
+MB = 1024 * 1024
+
+class FakePipeline:
+    """Loaded collection of a fixed size that records when it is unloaded."""
+
+    def __init__(self, manager, name, size, writing=False):
+        self.manager, self.name, self.size, self.writing = manager, name, size, writing
+        self.loaded = True
+        self.unloaded_with_lock = None
+
+    def memory_usage(self):
+        return self.size if self.loaded else 0
+
+    def unload(self):
+        self.unloaded_with_lock = self.manager._lock.locked()
+        self.loaded = False
+
+@pytest.fixture
+def manager(tmp_path):
+    return CollectionManager(storage_dir=str(tmp_path), memory_budget_bytes=3 * MB)
+
+def add(manager, name, size, writing=False):
+    manager.collections[name] = FakePipeline(manager, name, size * MB, writing)
+    manager.touch(name)
+    return manager.collections[name]
+
+class TestCollectionManager:
+    @pytest.mark.parametrize('name', ['../etc', 'a/b', 'a b', 'x' * 65, 'ação'])
+    def test_invalid_names_are_rejected(self, manager, name):
+        """Test that names that could escape the storage directory are refused."""
+        with pytest.raises(ValueError):
+            manager.get(name)
+        with pytest.raises(ValueError):
+            manager.touch(name)
+
+    def test_valid_names(self, manager):
+        """Test that letters, digits, dashes and underscores are accepted and None means the default."""
+        assert manager._validate_name('docs_2024-v1') == 'docs_2024-v1'
+        assert manager._validate_name(None) == manager.default_collection
+
+    def test_least_recently_used_is_evicted_outside_the_lock(self, manager):
+        """Test that going over budget unloads the oldest collections, without holding the manager lock."""
+        a, b = add(manager, 'a', 1), add(manager, 'b', 1)
+        manager.touch('a')
+        c = add(manager, 'c', 2)
+        assert not b.loaded and a.loaded and c.loaded
+        assert b.unloaded_with_lock is False
+        stats = manager.get_stats()
+        assert stats['loaded'] == ['a', 'c'] and stats['evictions'] == 1
+
+    def test_collections_being_written_are_kept(self, manager):
+        """Test that a collection with an upload or migration in progress is not evicted."""
+        a = add(manager, 'a', 1, writing=True)
+        b = add(manager, 'b', 1)
+        add(manager, 'c', 2)
+        assert a.loaded and not b.loaded
+        a.writing = False
+        add(manager, 'd', 1)
+        assert not a.loaded
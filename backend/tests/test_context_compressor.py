@@ -0,0 +1,66 @@
+"""
+Tests for the ContextCompressor class.
+"""
+import numpy as np
+import pytest
+from core.context_compressor import ContextCompressor
+
+VOCABULARY = ["cache", "memory", "gpu", "weather", "football", "model"]
+
+def encode(texts):
+    """Bag-of-words embeddings over a tiny vocabulary."""
+    return np.array([[text.lower().count(word) for word in VOCABULARY] for text in texts], dtype=np.float32)
+
+def count_tokens(texts):
+    return [len(text.split()) for text in texts]
+
+@pytest.fixture
+def compressor():
+    return ContextCompressor(encode, count_tokens)
+
+@pytest.fixture
+def results():
+    return [
+        {'chunk': "The weather was sunny. The cache keeps model outputs in memory.", 'score': 0.9, 'chunk_id': "1:0"},
+        {'chunk': "Football scores are below.\nThe gpu memory limits the model size.", 'score': 0.8, 'chunk_id': "1:1"},
+        {'chunk': "Nothing about football or weather here, really.", 'score': 0.7, 'chunk_id': "2:0"}
+    ]
+
+class TestContextCompressor:
+    def test_keeps_relevant_sentences_within_budget(self, compressor, results):
+        """Test that only query-related sentences survive and the budget holds."""
+        query = encode(["model memory cache"])[0]
+        compressed, report = compressor.compress(query, results, max_tokens=16)
+
+        assert [r['chunk_id'] for r in compressed] == ["1:0", "1:1"]
+        assert compressed[0]['chunk'] == "The cache keeps model outputs in memory."
+        assert compressed[1]['chunk'] == "The gpu memory limits the model size."
+        assert report['compressed_tokens'] == 14
+        assert report['ratio'] == pytest.approx(14 / report['original_tokens'])
+        assert compressed[0]['token_count'] == 7
+
+    def test_sentence_order_is_preserved(self, compressor):
+        """Test that kept sentences stay in their original order within a chunk."""
+        chunk = "Model cache first sentence. Weather in between here. Memory model cache last one."
+        query = encode(["model memory cache"])[0]
+        compressed, _ = compressor.compress(query, [{'chunk': chunk}], max_tokens=10)
+        assert compressed[0]['chunk'] == "Model cache first sentence. Memory model cache last one."
+
+    def test_short_fragments_join_a_neighbour(self, compressor):
+        """Test that fragments too short to be sentences are kept with the sentence next to them."""
+        assert compressor.split_sentences("Cache size:\n512\nWeather was fine. Ok.") == [
+            "Cache size: 512", "Weather was fine. Ok."
+        ]
+        assert compressor.split_sentences("Total:\n42") == ["Total: 42"]
+        compressed, _ = compressor.compress(encode(["cache"])[0], [{'chunk': "The cache\n512 MB\nWeather here."}], 4)
+        assert compressed[0]['chunk'] == "The cache 512 MB"
+
+    def test_prefill_saved_and_stats(self, compressor, results):
+        """Test the prefill estimate from the measured per-token cost."""
+        _, report = compressor.compress(encode(["cache"])[0], results, max_tokens=7)
+        saved = compressor.record_prefill(report, prefill_seconds=1.0, prompt_tokens=100)
+
+        assert saved == pytest.approx((report['original_tokens'] - report['compressed_tokens']) / 100)
+        stats = compressor.get_stats()
+        assert stats['requests'] == 1
+        assert stats['prefill_seconds_saved'] == pytest.approx(saved)
@@ -0,0 +1,64 @@
+"""
+Tests for the EmbeddingBatcher class.
+"""
+import threading
+import time
+import numpy as np
+import pytest
+from core.embedding_batcher import EmbeddingBatcher
+
+def fake_encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        time.sleep(0.01)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+    return encode
+
+def run_concurrently(batcher, texts):
+    results = {}
+    def worker(text):
+        results[text] = batcher.encode(text)
+    threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class TestEmbeddingBatcher:
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent requests are encoded together and get their own rows."""
+        calls = []
+        batcher = EmbeddingBatcher(fake_encode(calls), max_batch_size=8, max_wait_ms=50)
+        texts = ["a" * i for i in range(1, 17)]
+
+        results = run_concurrently(batcher, texts)
+
+        for text in texts:
+            assert results[text][0] == len(text)
+        assert len(calls) < len(texts)
+        assert max(len(call) for call in calls) <= 8
+
+        stats = batcher.get_stats()
+        assert stats["requests"] == 16
+        assert stats["batches"] == len(calls)
+        assert sum(int(size) * count for size, count in stats["batch_size_histogram"].items()) == 16
+
+    def test_single_request_waits_at_most_max_wait(self):
+        """Test that a lone request is encoded after the wait window."""
+        batcher = EmbeddingBatcher(fake_encode([]), max_batch_size=8, max_wait_ms=5)
+        start = time.perf_counter()
+        assert batcher.encode("abc")[0] == 3
+        assert time.perf_counter() - start < 1.0
+        assert batcher.get_stats()["batch_size_histogram"] == {"1": 1}
+
+    def test_errors_reach_every_caller(self):
+        """Test that an encoder failure is raised in the waiting requests."""
+        def failing(texts):
+            raise RuntimeError("encoder down")
+        batcher = EmbeddingBatcher(failing, max_wait_ms=1)
+        with pytest.raises(RuntimeError, match="encoder down"):
+            batcher.encode("abc")
+        # O worker continua atendendo depois de uma falha
+        with pytest.raises(RuntimeError):
+            batcher.encode("def")
@@ -0,0 +1,64 @@
+"""
+Tests for GenerationParams and StopMatcher.
+"""
+import time
+import pytest
+from core.generation_params import GenerationParams, StopMatcher
+
+class TestGenerationParams:
+    def test_request_values_override_defaults(self):
+        """Test the precedence request > config > server default, with the frontend's aliases."""
+        params = GenerationParams.from_dict(
+            {'temperature': 0, 'stop': 'END'},
+            {'maxTokens': 64, 'topP': 0.5, 'temperature': 0.9},
+            {'max_new_tokens': 512}
+        )
+        assert (params.max_new_tokens, params.temperature, params.top_p, params.stop) == (64, 0.0, 0.5, ['END'])
+        assert GenerationParams.from_dict({'max_length': 100}).max_new_tokens == 100
+        params = GenerationParams.from_dict({'config': 'ignored'}, {'topK': 40, 'repetitionPenalty': 1.2})
+        assert (params.top_k, params.repetition_penalty) == (40, 1.2)
+        assert params.cache_key()['top_k'] == 40
+
+    def test_timeout_sets_deadline(self):
+        """Test that timeout (seconds) becomes a deadline that expires."""
+        params = GenerationParams.from_dict({'timeout': 0.01})
+        assert 0 < params.remaining() <= 0.01
+        time.sleep(0.02)
+        assert params.expired()
+        assert 'deadline' not in params.cache_key()
+
+    @pytest.mark.parametrize("data", [
+        {'max_new_tokens': 0}, {'temperature': -1}, {'top_p': 1.5}, {'stop': [1]}, {'timeout': 0},
+        {'stop': [str(i) for i in range(9)]}, {'top_k': -1}, {'repetition_penalty': 0}
+    ])
+    def test_invalid_values(self, data):
+        """Test that invalid parameters raise ValueError."""
+        with pytest.raises(ValueError):
+            GenerationParams.from_dict(data)
+
+    def test_budget_is_only_lowered(self):
+        """Test that with_budget caps the token budget without raising it."""
+        params = GenerationParams(max_new_tokens=100)
+        assert params.with_budget(40).max_new_tokens == 40
+        assert params.with_budget(400).max_new_tokens == 100
+        assert params.with_budget(-5).max_new_tokens == 1
+        penalized = GenerationParams(top_k=5, repetition_penalty=1.3).with_budget(10)
+        assert (penalized.top_k, penalized.repetition_penalty) == (5, 1.3)
+
+class TestStopMatcher:
+    def test_holds_back_possible_stop_and_cuts_at_it(self):
+        """Test that text that may start a stop sequence is held back, and the stop sequence is dropped."""
+        matcher = StopMatcher(['\nUser:'])
+        assert matcher.push('Hello') == 'Hello'
+        assert matcher.push('Hello\nUs') == ''
+        assert matcher.push('Hello\nUser: next') == ''
+        assert matcher.stopped and matcher.text == 'Hello'
+
+    def test_flush_releases_held_text(self):
+        """Test that held text that never became a stop sequence is sent at the end."""
+        matcher = StopMatcher(['END'])
+        assert matcher.push('the EN') == 'the '
+        assert matcher.push('the ENd') == 'ENd'
+        assert matcher.push('the ENd E') == ' '
+        assert matcher.flush() == 'E'
+        assert not matcher.stopped
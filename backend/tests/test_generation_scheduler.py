@@ -0,0 +1,114 @@
+"""
+Tests for the GenerationScheduler class.
+"""
+import time
+import pytest
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from core.generation_scheduler import GenerationScheduler, token_probs
+from core.prefix_cache import PrefixCache
+
+class CharTokenizer:
+    """One token per lowercase letter, enough for the scheduler's decode calls"""
+    pad_token_id, eos_token_id = 0, 1
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord('a') + i - 2) for i in ids if i > 1)
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=28, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, max_position_embeddings=128, pad_token_id=0, eos_token_id=1)
+    return LlamaForCausalLM(config).eval()
+
+def reference(model, ids, max_new_tokens, repetition_penalty=1.0):
+    output = model.generate(torch.tensor([ids]), max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=0,
+                            eos_token_id=1, repetition_penalty=repetition_penalty)
+    return [t for t in output[0, len(ids):].tolist() if t != 1]
+
+class TestGenerationScheduler:
+    def test_batched_greedy_matches_generate(self, model):
+        """Test that sequences of different lengths decoded together match one-by-one greedy decoding."""
+        scheduler = GenerationScheduler(model, CharTokenizer(), max_batch_size=3)
+        prompts = [[5, 9, 3], [7], [2, 4, 6, 8, 10, 12, 14], [20, 21], [3, 3, 3, 3]]
+        requests = [scheduler.submit(ids, max_new_tokens=10, temperature=0) for ids in prompts]
+
+        for request, ids in zip(requests, prompts):
+            assert "".join(request) == CharTokenizer().decode(request.generated)
+            assert request.generated == reference(model, ids, 10)[:len(request.generated)]
+            assert request.finish_reason in ('eos', 'length')
+        stats = scheduler.get_stats()
+        assert stats['requests'] == len(prompts)
+        assert 1 < stats['mean_batch_size'] <= 3
+
+    def test_repetition_penalty_matches_generate(self, model):
+        """Test that the repetition penalty is applied as transformers applies it."""
+        scheduler = GenerationScheduler(model, CharTokenizer(), max_batch_size=2)
+        prompts = [[5, 9, 3, 5], [7, 7, 8]]
+        requests = [scheduler.submit(ids, max_new_tokens=12, temperature=0, repetition_penalty=1.8) for ids in prompts]
+        for request, ids in zip(requests, prompts):
+            list(request)
+            assert request.generated == reference(model, ids, 12, repetition_penalty=1.8)[:len(request.generated)]
+
+    def test_top_k_limits_sampled_tokens(self):
+        """Test that top-k keeps only the k most likely tokens."""
+        logits = torch.tensor([3.0, 2.0, 1.0, 0.0])
+        probs = token_probs(logits, temperature=1.0, top_p=1.0, top_k=2)
+        assert (probs > 0).tolist() == [True, True, False, False]
+        assert torch.isclose(probs.sum(), torch.tensor(1.0))
+
+    def test_cancel_leaves_others_running(self, model):
+        """Test that a cancelled sequence is retired without disturbing the rest of the batch."""
+        scheduler = GenerationScheduler(model, CharTokenizer(), max_batch_size=4)
+        cancelled = scheduler.submit([5, 6], max_new_tokens=50, temperature=0)
+        cancelled.cancel()
+        other = scheduler.submit([7, 8, 9], max_new_tokens=5, temperature=0)
+
+        list(cancelled)
+        list(other)
+        assert cancelled.finish_reason == 'cancelled'
+        assert other.generated == reference(model, [7, 8, 9], 5)[:len(other.generated)]
+
+    def test_prefix_cache_keeps_outputs(self, model):
+        """Test that prompts prefilled from a cached prefix decode exactly as without the cache."""
+        prefix_cache = PrefixCache(block_size=4)
+        scheduler = GenerationScheduler(model, CharTokenizer(), prefix_cache=prefix_cache)
+        system = [3, 4, 5, 6, 7, 8, 9, 10, 11]
+        for suffix in ([12], [13, 14], [15], [16, 17, 18]):
+            request = scheduler.submit(system + suffix, max_new_tokens=6, temperature=0)
+            list(request)
+            assert request.generated == reference(model, system + suffix, 6)[:len(request.generated)]
+        assert prefix_cache.get_stats()['prefill_tokens_saved'] == 16
+
+    def test_stop_sequence_and_deadline_end_generation(self, model):
+        """Test that a stop sequence ends the sequence early, without its text, and an expired deadline skips it."""
+        scheduler = GenerationScheduler(model, CharTokenizer())
+        full = scheduler.submit([5, 9, 3], max_new_tokens=20, temperature=0)
+        text = "".join(full)
+        stop = text[6:8]
+        stopped = scheduler.submit([5, 9, 3], max_new_tokens=20, temperature=0, stop=[stop])
+
+        assert "".join(stopped) == text[:text.index(stop)]
+        assert stopped.finish_reason == 'stop'
+        assert len(stopped.generated) < len(full.generated)
+
+        expired = scheduler.submit([5, 9, 3], max_new_tokens=20, temperature=0, deadline=time.monotonic())
+        assert list(expired) == [] and expired.finish_reason == 'deadline'
+
+    def test_failed_prefill_ends_only_that_request(self, model):
+        """Test that a request whose prefill raises ends with the error while the others still decode."""
+        scheduler = GenerationScheduler(model, CharTokenizer())
+        running = scheduler.submit([5, 6, 7], max_new_tokens=30, temperature=0)
+        next(iter(running))
+        # Token fora do vocabulário: o embedding falha no prefill
+        bad = scheduler.submit([5, 1000], max_new_tokens=5, temperature=0)
+        good = scheduler.submit([7, 8, 9], max_new_tokens=5, temperature=0)
+
+        with pytest.raises(IndexError):
+            list(bad)
+        assert bad.finish_reason == 'error'
+        list(good)
+        list(running)
+        assert good.generated == reference(model, [7, 8, 9], 5)[:len(good.generated)]
+        assert running.finish_reason in ('eos', 'length')
@@ -0,0 +1,58 @@
+"""
+Tests for the PrefixCache class.
+"""
+import torch
+from core.prefix_cache import PrefixCache
+
+def make_past(length, layers=2, batch=1):
+    """Fake attention cache whose values are the token positions, to check slicing"""
+    positions = torch.arange(length, dtype=torch.float32).view(1, 1, length, 1).expand(batch, 2, length, 4)
+    return tuple((positions.clone(), positions.clone()) for _ in range(layers))
+
+class TestPrefixCache:
+    def test_shared_prefix_is_cached_on_second_sight(self):
+        """Test that a prefix is stored once two prompts share it and reused by the next one."""
+        cache = PrefixCache(block_size=4)
+        system = list(range(10, 22))
+        first, second, third = system + [1, 2, 3], system + [4, 5], system + [6, 7, 8, 9, 1]
+
+        assert cache.match(first) == (None, 0)
+        cache.insert(first, make_past(len(first)))
+        assert cache.match(second) == (None, 0)
+        # Segunda linha de um batch com 2 colunas de padding à esquerda
+        cache.insert(second, make_past(len(second) + 2, batch=2), row=1, offset=2)
+
+        prefix, length = cache.match(third)
+        assert length == len(system)
+        assert prefix[0][0].shape == (1, 2, len(system), 4)
+        assert prefix[0][0][0, 0, :, 0].tolist() == [float(i) for i in range(2, 2 + len(system))]
+        stats = cache.get_stats()
+        assert stats['hits'] == 1 and stats['prefill_tokens_saved'] == len(system)
+
+    def test_lru_eviction_under_budget(self):
+        """Test that the least recently used prefix is evicted when the byte budget is exceeded."""
+        entry_bytes = sum(k.nbytes + v.nbytes for k, v in make_past(8))
+        cache = PrefixCache(max_bytes=2 * entry_bytes, block_size=8)
+        prompts = [[p] * 8 + [0] for p in (1, 2, 3)]
+        for prompt in prompts[:2]:
+            cache.insert(prompt, make_past(9))
+            cache.insert(prompt, make_past(9))
+        assert cache.match(prompts[0])[1] == 8
+
+        cache.insert(prompts[2], make_past(9))
+        cache.insert(prompts[2], make_past(9))
+        assert cache.get_stats()['bytes'] <= 2 * entry_bytes
+        assert cache.match(prompts[1]) == (None, 0)
+        assert cache.match(prompts[0])[1] == 8
+
+    def test_key_collision_is_a_miss(self, monkeypatch):
+        """Test that a prefix whose key collides with a cached one is not reused."""
+        monkeypatch.setattr(PrefixCache, '_chain', staticmethod(lambda key, block: b'same'))
+        cache = PrefixCache(block_size=4)
+        cached = [1, 2, 3, 4, 5]
+        cache.insert(cached, make_past(5))
+        cache.insert(cached, make_past(5))
+        assert cache.match(cached)[1] == 4
+
+        assert cache.match([9, 9, 9, 9, 5]) == (None, 0)
+        assert cache.get_stats()['misses'] == 1
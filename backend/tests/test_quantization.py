@@ -0,0 +1,44 @@
+"""
+Tests for the int8 quantization helpers.
+"""
+import pytest
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from core import quantization
+
+class ByteTokenizer:
+    """Token IDs are the text's bytes, enough for the perplexity check"""
+
+    def __call__(self, text, return_tensors=None):
+        return {'input_ids': torch.tensor([list(text.encode('utf-8'))])}
+
+def make_model():
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=256, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, max_position_embeddings=1024)
+    return LlamaForCausalLM(config).to(torch.bfloat16).eval()
+
+class TestQuantization:
+    def test_quantize_save_and_reload(self, tmp_path):
+        """Test that the checked int8 model saves and reloads with the same outputs."""
+        model = make_model()
+        report = quantization.quantize_checked(model, ByteTokenizer())
+        assert report['accepted'] and report['reference_dtype'] == 'bfloat16'
+        assert isinstance(model.model.layers[0].mlp.up_proj, torch.ao.nn.quantized.dynamic.Linear)
+        # Embeddings, norma final e cabeça de saída continuam em bf16
+        assert model.model.embed_tokens.weight.dtype == torch.bfloat16
+        assert model.lm_head.weight.dtype == torch.bfloat16
+
+        quantization.save_quantized(model, str(tmp_path), report)
+        reloaded = quantization.load_quantized(str(tmp_path))
+        input_ids = torch.tensor([[1, 2, 3, 4, 5]])
+        assert reloaded.lm_head.weight.dtype == torch.bfloat16
+        with torch.no_grad():
+            assert torch.allclose(model(input_ids).logits, reloaded(input_ids).logits)
+        assert quantization.read_report(str(tmp_path))['accepted']
+
+    def test_rejects_large_perplexity_increase(self):
+        """Test that quantization is refused when perplexity grows beyond the limit."""
+        with pytest.raises(quantization.QuantizationError) as rejected:
+            quantization.quantize_checked(make_model(), ByteTokenizer(), max_increase=-1.0)
+        assert not rejected.value.report['accepted']
@@ -0,0 +1,183 @@
+"""
+Tests for RAGPipeline ingestion: upload paths and locking.
+"""
+import io
+import threading
+import zlib
+import numpy as np
+import pytest
+from werkzeug.datastructures import FileStorage
+from core import rag_pipeline as rag_module
+from core.rag_pipeline import RAGPipeline
+
+def fake_embeddings(texts, model_name='encoder'):
+    """Deterministic 8-dimensional vectors standing in for the sentence encoder."""
+    return np.stack([
+        np.random.default_rng(zlib.crc32(f"{model_name}:{text}".encode('utf-8'))).standard_normal(8).astype(np.float32)
+        for text in texts
+    ])
+
+class CharCounter:
+    """LLM token counter stand-in with one token per character."""
+
+    def __init__(self, name='chars'):
+        self.tokenizer_name = name
+
+    def count_tokens(self, texts):
+        return self.tokenizer_name, [len(text) for text in texts]
+
+def upload(name, text):
+    return FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename=name)
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = RAGPipeline('docs', storage_dir=str(tmp_path / 'docs'))
+    pipeline.config.RAG_CHUNKER = 'characters'
+    pipeline.config.RAG_EMBED_BATCH_SIZE = 4
+    pipeline.config.RAG_UPLOAD_TMP_DIR = str(tmp_path / 'uploads')
+    pipeline._compute_embeddings = fake_embeddings
+    return pipeline
+
+def record_sources(pipeline):
+    sources = []
+    receive = pipeline._receive_upload
+
+    def recording(file, name):
+        source, size = receive(file, name)
+        sources.append(source)
+        return source, size
+
+    pipeline._receive_upload = recording
+    return sources
+
+TEXT = "\n".join(f"Line {i} of the document, with a few words to split." for i in range(200))
+
+class TestUpload:
+    def test_small_upload_stays_in_memory(self, pipeline, tmp_path):
+        """Test that an upload below RAG_IN_MEMORY_UPLOAD_KB is parsed without a temporary file."""
+        sources = record_sources(pipeline)
+        [result] = pipeline.process_documents([upload('small.txt', TEXT)])
+
+        assert result['status'] == 'processed'
+        assert isinstance(sources[0], io.BytesIO)
+        assert not (tmp_path / 'uploads').exists()
+        assert pipeline.index.ntotal == len(pipeline.chunk_ids) == len(pipeline.texts) > 4
+        assert "".join(pipeline.texts.read_range(0, 1)).startswith("Line 0")
+
+    def test_large_upload_is_spooled_and_removed(self, pipeline, tmp_path):
+        """Test that a larger upload goes through a temporary file, removed after indexing."""
+        pipeline.config.RAG_IN_MEMORY_UPLOAD_KB = 1
+        pipeline.config.RAG_UPLOAD_CHUNK_KB = 1
+        pipeline.config.RAG_TEXT_WINDOW_MB = 1
+        sources = record_sources(pipeline)
+        [result] = pipeline.process_documents([upload('large.txt', TEXT)])
+
+        assert result['status'] == 'processed' and result['size'] == len(TEXT.encode('utf-8'))
+        assert isinstance(sources[0], str) and sources[0].startswith(str(tmp_path / 'uploads'))
+        assert list((tmp_path / 'uploads').iterdir()) == []
+        assert pipeline.get_progress()[0]['bytes_spooled'] == result['size']
+
+        # Mesmo texto pelo caminho em memória: mesmos chunks
+        pipeline.config.RAG_IN_MEMORY_UPLOAD_KB = 4096
+        pipeline.process_documents([upload('again.txt', TEXT)])
+        texts = pipeline.texts.read_range(0, len(pipeline.chunk_ids))
+        by_doc = {1: [], 2: []}
+        for text, (doc_id, _) in zip(texts, pipeline.chunk_ids):
+            by_doc[doc_id].append(text)
+        assert by_doc[1] == by_doc[2]
+
+    def test_too_large_upload_is_rejected(self, pipeline, tmp_path):
+        """Test that RAG_MAX_UPLOAD_MB is enforced while spooling, leaving nothing behind."""
+        pipeline.config.RAG_IN_MEMORY_UPLOAD_KB = 1
+        pipeline.config.RAG_MAX_UPLOAD_MB = 0
+        [result] = pipeline.process_documents([upload('huge.txt', TEXT)])
+        assert result['status'] == 'error' and 'too large' in result['error']
+        assert list((tmp_path / 'uploads').iterdir()) == []
+        assert pipeline.documents == {} and pipeline.chunk_ids == []
+
+    def test_embeddings_are_computed_outside_the_write_lock(self, pipeline):
+        """Test that searches are not blocked while an upload's batches are encoded."""
+        held = []
+
+        def encode(texts):
+            held.append(pipeline._lock.writing)
+            return fake_embeddings(texts)
+
+        pipeline._compute_embeddings = encode
+        pipeline.process_documents([upload('doc.txt', TEXT)])
+        assert held and not any(held)
+        assert pipeline.writing is False
+
+    def test_document_ids_are_not_reused(self, pipeline, tmp_path):
+        """Test that a rolled back upload's document id is not given to the next one, also after reloading."""
+        pipeline.process_documents([upload('first.txt', TEXT)])
+        [failed] = pipeline.process_documents([upload('broken.xyz', TEXT)])
+        assert failed['status'] == 'error' and list(pipeline.documents) == [1]
+
+        [second] = pipeline.process_documents([upload('second.txt', TEXT)])
+        assert second['id'] == 3
+        assert {doc_id for doc_id, _ in pipeline.chunk_ids} == {1, 3}
+
+        reloaded = RAGPipeline('docs', storage_dir=str(tmp_path / 'docs'))
+        reloaded.load()
+        assert reloaded.next_document_id == 4
+
+    def test_llm_token_counts_are_stored_at_ingestion(self, pipeline, tmp_path):
+        """Test that results carry the LLM token counts from ingestion, persisted and tied to the tokenizer."""
+        pipeline.token_counter = CharCounter()
+        pipeline.process_documents([upload('doc.txt', TEXT)])
+        pipeline.token_counter = None
+        results = pipeline._search(fake_embeddings(['Line 3']), 5)
+        assert results and all(r['token_count'] is None for r in results)
+
+        reloaded = RAGPipeline('docs', storage_dir=str(tmp_path / 'docs'), token_counter=CharCounter())
+        reloaded.load()
+        results = reloaded._search(fake_embeddings(['Line 3']), 5)
+        assert results and all(r['token_count'] == len(r['chunk']) for r in results)
+        reloaded.token_counter = CharCounter('other')
+        assert all(r['token_count'] is None for r in reloaded._search(fake_embeddings(['Line 3']), 5))
+
+class TestMigration:
+    def test_ingest_during_migration_of_empty_collection(self, pipeline, monkeypatch):
+        """Test that uploads (one failing halfway) while an empty collection migrates end up in the new version."""
+        started, resume = threading.Event(), threading.Event()
+        set_migration = pipeline._set_migration
+
+        def pause_before_swap(**fields):
+            set_migration(**fields)
+            if fields.get('status') == 'building':
+                # Nada foi codificado (coleção vazia): a nova versão ainda não tem arquivo de vetores
+                started.set()
+                resume.wait(5)
+
+        pipeline._set_migration = pause_before_swap
+        monkeypatch.setattr(rag_module, 'get_encoder', lambda model_name: None)
+        monkeypatch.setattr(rag_module, 'encode_texts', lambda texts, model_name, batch_size=64: fake_embeddings(texts, model_name))
+        pipeline.config.RAG_MIGRATION_PAUSE_MS = 0
+        pipeline.config.RAG_MIGRATION_BATCH_SIZE = 3
+        pipeline.migrate_model('other-model')
+        assert started.wait(5)
+
+        # Falha depois do primeiro lote já anexado: o documento é desfeito e a migração precisa voltar ao início
+        calls = []
+
+        def failing(texts):
+            calls.append(len(texts))
+            if len(calls) > 1:
+                raise RuntimeError("encoder failed")
+            return fake_embeddings(texts)
+
+        pipeline._compute_embeddings = failing
+        assert pipeline.process_documents([upload('broken.txt', TEXT)])[0]['status'] == 'error'
+        pipeline._compute_embeddings = fake_embeddings
+        assert pipeline.process_documents([upload('ok.txt', TEXT[:2000])])[0]['status'] == 'processed'
+        resume.set()
+        pipeline._migration_thread.join(10)
+
+        status = pipeline.migration_status()
+        assert status['status'] == 'completed', status
+        assert pipeline.embedding_model == 'other-model'
+        count = len(pipeline.chunk_ids)
+        assert pipeline.index.ntotal == len(pipeline.vectors) == count > 0
+        expected = fake_embeddings(pipeline.texts.read_range(0, count), 'other-model')
+        np.testing.assert_array_equal(pipeline.vectors.view(0, count), expected)
@@ -0,0 +1,55 @@
+"""
+Tests for the ResponseCache class.
+"""
+import time
+import pytest
+from core.response_cache import ResponseCache
+
+USAGE = {'prompt_tokens': 3, 'completion_tokens': 2}
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'responses.db'), ttl_seconds=60, max_bytes=1024)
+
+class TestResponseCache:
+    def test_key_depends_on_model_prompt_and_params(self):
+        """Test that any difference in model, prompt tokens or parameters changes the key."""
+        key = ResponseCache.make_key('m:bf16', [1, 2, 3], {'temperature': 0, 'max_new_tokens': 8})
+        assert key == ResponseCache.make_key('m:bf16', [1, 2, 3], {'max_new_tokens': 8, 'temperature': 0})
+        assert key != ResponseCache.make_key('m:dynamic_int8', [1, 2, 3], {'temperature': 0, 'max_new_tokens': 8})
+        assert key != ResponseCache.make_key('m:bf16', [1, 2, 4], {'temperature': 0, 'max_new_tokens': 8})
+        assert key != ResponseCache.make_key('m:bf16', [1, 2, 3], {'temperature': 0, 'max_new_tokens': 9})
+
+    def test_hit_survives_reopening(self, cache, tmp_path):
+        """Test that stored responses are returned, also by a new instance on the same file."""
+        assert cache.get('k') is None
+        cache.put('k', 'Paris', USAGE, 1.5)
+        assert cache.get('k') == {'response': 'Paris', 'usage': USAGE, 'generation_seconds': 1.5}
+        cache.close()
+
+        reopened = ResponseCache(str(tmp_path / 'responses.db'), ttl_seconds=60, max_bytes=1024)
+        assert reopened.get('k')['response'] == 'Paris'
+        stats = reopened.get_stats()
+        assert stats['entries'] == 1 and stats['bytes'] == 5 and stats['hits'] == 1
+        assert stats['saved_generation_seconds'] == 1.5
+
+    def test_expired_entries_are_misses(self, cache):
+        """Test that entries older than the TTL are dropped on lookup."""
+        cache.ttl_seconds = 0.05
+        cache.put('k', 'Paris', USAGE, 1.0)
+        time.sleep(0.1)
+        assert cache.get('k') is None
+        assert cache.get_stats()['entries'] == 0
+
+    def test_least_recently_used_is_evicted(self, cache):
+        """Test that the byte budget evicts the least recently used responses first."""
+        for key in 'abc':
+            cache.put(key, key * 400, USAGE, 1.0)
+            time.sleep(0.01)
+        assert cache.get('a') is None
+        cache.get('b')
+        time.sleep(0.01)
+        cache.put('d', 'd' * 400, USAGE, 1.0)
+        assert cache.get('c') is None
+        assert cache.get('b') is not None and cache.get('d') is not None
+        assert cache.get_stats()['bytes'] <= 1024
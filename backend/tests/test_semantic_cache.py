@@ -0,0 +1,75 @@
+"""
+Tests for the SemanticCache class.
+"""
+import numpy as np
+import pytest
+from unittest.mock import patch
+from core.semantic_cache import SemanticCache
+
+class TestSemanticCache:
+    @pytest.fixture
+    def embedding(self):
+        """Random unit query embedding fixture."""
+        rng = np.random.default_rng(0)
+        return rng.normal(size=384).astype(np.float32)
+
+    def test_hit_on_similar_query(self, embedding):
+        """Test that a paraphrase with the same chunks hits the cache."""
+        cache = SemanticCache(threshold=0.9)
+        usage = {"prompt_tokens": 40, "completion_tokens": 2}
+        cache.store(embedding, ["1:0", "1:1"], "Paris", generation_seconds=12.0, finish_reason="eos", usage=usage)
+
+        paraphrase = embedding + 0.01 * np.ones_like(embedding)
+        hit = cache.lookup(paraphrase, ["1:1", "1:0"])
+        assert hit is not None
+        assert hit["answer"] == "Paris"
+        assert hit["finish_reason"] == "eos" and hit["usage"] == usage
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1.0
+        assert stats["saved_generation_seconds"] == 12.0
+
+    def test_miss_on_different_chunks(self, embedding):
+        """Test that a change in retrieved chunks invalidates the entry."""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(embedding, ["1:0"], "Paris", generation_seconds=1.0)
+        assert cache.lookup(embedding, ["2:0"]) is None
+        assert cache.get_stats()["misses"] == 1
+
+    def test_miss_on_different_generation_params(self, embedding):
+        """Test that an answer generated with another budget or temperature is not reused."""
+        cache = SemanticCache(threshold=0.9)
+        params = {"max_new_tokens": 64, "temperature": 0.0}
+        cache.store(embedding, ["1:0"], "Paris", generation_seconds=1.0, params=params)
+        assert cache.lookup(embedding, ["1:0"], {"max_new_tokens": 512, "temperature": 0.0}) is None
+        assert cache.lookup(embedding, ["1:0"], {"max_new_tokens": 64, "temperature": 0.7}) is None
+        assert cache.lookup(embedding, ["1:0"], dict(params))["answer"] == "Paris"
+
+    def test_miss_below_threshold(self, embedding):
+        """Test that dissimilar queries miss the cache."""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(embedding, ["1:0"], "Paris", generation_seconds=1.0)
+        assert cache.lookup(-embedding, ["1:0"]) is None
+
+    def test_ttl_expiration(self, embedding):
+        """Test that entries expire after the TTL."""
+        cache = SemanticCache(ttl_seconds=10)
+        with patch("core.semantic_cache.time.time", return_value=1000.0):
+            cache.store(embedding, ["1:0"], "Paris", generation_seconds=1.0)
+        with patch("core.semantic_cache.time.time", return_value=1011.0):
+            assert cache.lookup(embedding, ["1:0"]) is None
+        assert cache.get_stats()["expirations"] == 1
+
+    def test_lru_eviction(self):
+        """Test size-based eviction of the least recently used entry."""
+        cache = SemanticCache(max_entries=2)
+        vectors = np.eye(3, dtype=np.float32)
+        cache.store(vectors[0], ["a"], "first", generation_seconds=1.0)
+        cache.store(vectors[1], ["b"], "second", generation_seconds=1.0)
+        assert cache.lookup(vectors[0], ["a"]) is not None  # "first" becomes most recent
+        cache.store(vectors[2], ["c"], "third", generation_seconds=1.0)
+
+        assert cache.lookup(vectors[1], ["b"]) is None
+        assert cache.lookup(vectors[0], ["a"]) is not None
+        assert cache.get_stats()["evictions"] == 1
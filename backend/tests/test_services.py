@@ -0,0 +1,83 @@
+"""
+Tests for the ServiceContainer, the application factory and background model loading.
+"""
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from core.services import ServiceContainer
+from core.llm_manager import LLMManager, ModelNotReadyError
+from app import create_app
+
+@pytest.fixture
+def llm_manager():
+    llm = MagicMock()
+    llm.get_model_status.return_value = {'status': 'ready'}
+    llm.state, llm.state_error, llm.load_seconds = 'ready', None, 1.0
+    llm.is_ready.return_value = True
+    return llm
+
+@pytest.fixture
+def collection_manager():
+    collections = MagicMock()
+    collections.ready, collections.ready_error, collections.default_collection = True, None, 'default'
+    return collections
+
+class TestServiceContainer:
+    def test_services_are_lazy_and_shared(self, llm_manager):
+        """Test that a service is built once, on first access, with the shared dependencies."""
+        services = ServiceContainer(llm_manager=llm_manager)
+        assert not services.is_created('workflow_manager')
+
+        workflows = services.workflow_manager
+        assert services.workflow_manager is workflows
+        assert workflows.llm_manager is llm_manager
+        assert not services.is_created('memory_manager')
+
+    def test_unknown_override(self):
+        """Test that misspelled overrides are rejected."""
+        with pytest.raises(ValueError):
+            ServiceContainer(llm_model=object())
+
+    def test_app_uses_injected_services(self, llm_manager, collection_manager):
+        """Test that blueprint routes resolve managers from the app's container."""
+        services = ServiceContainer(llm_manager=llm_manager, collection_manager=collection_manager)
+        client = create_app(services).test_client()
+
+        response = client.get('/api/models/status')
+        assert response.status_code == 200
+        assert response.get_json() == {'status': 'ready'}
+        assert not services.is_created('memory_manager')
+
+class TestReadiness:
+    def test_live_and_ready(self, llm_manager, collection_manager):
+        """Test that /live always answers and /ready follows the model state."""
+        llm_manager.is_ready.return_value = False
+        llm_manager.state = 'loading_shards'
+        client = create_app(ServiceContainer(llm_manager=llm_manager, collection_manager=collection_manager)).test_client()
+
+        assert client.get('/live').status_code == 200
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['model']['state'] == 'loading_shards'
+
+        llm_manager.is_ready.return_value = True
+        assert client.get('/ready').status_code == 200
+
+    def test_background_loading(self):
+        """Test that the model loads in a background thread and generation is refused until then."""
+        release = threading.Event()
+
+        def fake_initialize(manager):
+            release.wait(5)
+            manager.model, manager.tokenizer = MagicMock(), MagicMock()
+
+        with patch.object(LLMManager, 'initialize_model', fake_initialize), \
+                patch.object(LLMManager, '_quantization_enabled', return_value=False):
+            llm = LLMManager(background=True)
+            assert llm.state == 'pending' and not llm.is_ready()
+            with pytest.raises(ModelNotReadyError):
+                llm.generate_response("hello")
+            release.set()
+            assert llm.wait_until_ready(5)
+        assert llm.state == 'ready'
+        llm.model.generate.assert_called_once()
@@ -0,0 +1,65 @@
+"""
+Tests for the sharded vector index and its worker pool.
+"""
+import threading
+import numpy as np
+import pytest
+from core.sharded_index import ShardPool, ShardedIndex
+from core.vector_index import NumpyFlatIndex
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ShardPool(3)
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def data():
+    """Random corpus and query fixture."""
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((500, 16)).astype(np.float32), rng.standard_normal((20, 16)).astype(np.float32)
+
+class TestShardedIndex:
+    def test_matches_unsharded_index(self, pool, data):
+        """Test that a sharded search returns the same neighbours as the single-process index."""
+        vectors, queries = data
+        sharded, flat = ShardedIndex(pool, 16), NumpyFlatIndex(16)
+        for start in range(0, len(vectors), 128):
+            sharded.add(vectors[start:start + 128])
+            flat.add(vectors[start:start + 128])
+
+        D, I = sharded.search(queries, 10)
+        expected_D, expected_I = flat.search(queries, 10)
+        np.testing.assert_array_equal(I, expected_I)
+        np.testing.assert_allclose(D, expected_D, rtol=1e-4, atol=1e-4)
+        np.testing.assert_array_equal(sharded.reconstruct_n(0, sharded.ntotal), vectors)
+        sharded.release()
+
+    def test_concurrent_searches(self, pool, data):
+        """Test that searches from many threads each get their own results."""
+        vectors, queries = data
+        sharded, flat = ShardedIndex(pool, 16), NumpyFlatIndex(16)
+        sharded.add(vectors)
+        flat.add(vectors)
+        expected = flat.search(queries, 5)[1]
+        results = [None] * len(queries)
+
+        def search(i):
+            results[i] = sharded.search(queries[i:i + 1], 5)[1][0]
+
+        threads = [threading.Thread(target=search, args=(i,)) for i in range(len(queries))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        np.testing.assert_array_equal(np.stack(results), expected)
+        sharded.release()
+
+    def test_fewer_vectors_than_k(self, pool):
+        """Test that missing neighbours are padded with -1 and infinite distances."""
+        sharded = ShardedIndex(pool, 4)
+        sharded.add(np.eye(4, dtype=np.float32)[:2])
+        D, I = sharded.search(np.zeros((1, 4), dtype=np.float32), 4)
+        assert sorted(I[0, :2]) == [0, 1]
+        assert list(I[0, 2:]) == [-1, -1] and np.isinf(D[0, 2:]).all()
+        sharded.release()
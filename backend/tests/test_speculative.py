@@ -0,0 +1,52 @@
+"""
+Tests for the SpeculativeDecoder class.
+"""
+import copy
+import pytest
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from core.generation_scheduler import GenerationScheduler
+from core.speculative import SpeculativeDecoder
+
+class CharTokenizer:
+    pad_token_id, eos_token_id = 0, 1
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord('a') + i - 2) for i in ids if i > 1)
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=28, hidden_size=32, intermediate_size=64, num_hidden_layers=3,
+                         num_attention_heads=4, max_position_embeddings=256, pad_token_id=0, eos_token_id=1)
+    return LlamaForCausalLM(config).eval()
+
+def generate(model, speculative, prompt, temperature=0, max_new_tokens=30):
+    scheduler = GenerationScheduler(model, CharTokenizer(), speculative=speculative)
+    request = scheduler.submit(prompt, max_new_tokens=max_new_tokens, temperature=temperature)
+    list(request)
+    return request
+
+class TestSpeculativeDecoder:
+    @pytest.mark.parametrize("layers", [3, 1])
+    def test_greedy_output_is_unchanged(self, model, layers):
+        """Test that greedy output matches plain decoding, with a perfect and with a weaker draft model."""
+        draft = copy.deepcopy(model)
+        draft.model.layers = draft.model.layers[:layers]
+        speculative = SpeculativeDecoder(model, draft, max_draft_tokens=4)
+        prompt = [5, 9, 3, 7]
+
+        expected = generate(model, None, prompt).generated
+        assert generate(model, speculative, prompt).generated == expected
+        stats = speculative.get_stats()
+        assert stats['steps'] > 0 and stats['drafted_tokens'] > 0
+        if layers == 3:
+            assert stats['acceptance_rate'] == 1.0 and stats['tokens_per_step'] > 1
+
+    def test_sampling_respects_max_new_tokens(self, model):
+        """Test that sampled speculative steps never run past the token budget."""
+        speculative = SpeculativeDecoder(model, copy.deepcopy(model), max_draft_tokens=8)
+        torch.manual_seed(1)
+        request = generate(model, speculative, [4, 4, 6], temperature=0.8, max_new_tokens=13)
+        assert len(request.generated) <= 13
+        assert request.finish_reason in ('eos', 'length')
@@ -0,0 +1,56 @@
+"""
+Tests for the ChunkTextStore class.
+"""
+import pytest
+from core.text_store import ChunkTextStore
+
+def make_texts(count):
+    return [f"chunk {i} ção " + "texto repetido " * (i % 13) for i in range(count)]
+
+@pytest.fixture
+def texts():
+    return make_texts(500)
+
+class TestChunkTextStore:
+    def test_roundtrip_and_compression(self, texts, tmp_path):
+        """Test that texts come back intact from compressed, reopened blocks."""
+        path = str(tmp_path / "chunks.dat")
+        store = ChunkTextStore(path, codec='zlib', block_bytes=2048)
+        store.append(texts[:300])
+        store.append(texts[300:])
+        store.flush()
+        store.close()
+
+        store = ChunkTextStore(path, block_bytes=2048)
+        assert len(store) == len(texts)
+        assert store.get([499, 0, 250, 0]) == [texts[499], texts[0], texts[250], texts[0]]
+        assert store.read_range(10, 40) == texts[10:40]
+        stats = store.get_stats()
+        assert stats['codec'] == 'zlib'
+        assert stats['blocks'] > 1
+        assert stats['compressed_bytes'] < stats['raw_bytes']
+
+    def test_cache_is_bounded(self, texts):
+        """Test that the hot cache keeps recently read chunks within its byte budget."""
+        store = ChunkTextStore(block_bytes=1024, cache_bytes=400)
+        store.append(texts)
+        store.flush()
+        store.get(range(100))
+        assert store.get_stats()['cache_bytes'] <= 400
+        store.get([99])
+        assert store.get_stats()['hits'] == 1
+
+    def test_truncate_reopens_partial_block(self, texts, tmp_path):
+        """Test that truncating inside a block keeps earlier rows, on disk as well."""
+        path = str(tmp_path / "chunks.dat")
+        store = ChunkTextStore(path, codec='zlib', block_bytes=1024)
+        store.append(texts)
+        store.flush()
+        store.truncate(123)
+        assert len(store) == 123
+        store.append(["novo"])
+        store.flush()
+        store.close()
+
+        store = ChunkTextStore(path)
+        assert store.read_range(0, len(store)) == texts[:123] + ["novo"]
@@ -0,0 +1,196 @@
+"""
+Tests for the vector index classes: exact, quantized and reduced indexes and the vector store.
+"""
+import threading
+import numpy as np
+import pytest
+from core.vector_index import (
+    NumpyFlatIndex, QuantizedFlatIndex, VectorStore, DimensionReducer, ReducedIndex, mmr_select
+)
+
+def brute_force(vectors, queries, k):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(distances, order, axis=1), order
+
+class TestNumpyFlatIndex:
+    @pytest.fixture
+    def data(self):
+        """Random corpus and query fixture."""
+        rng = np.random.default_rng(0)
+        return (
+            rng.standard_normal((1000, 32), dtype=np.float32),
+            rng.standard_normal((7, 32), dtype=np.float32)
+        )
+
+    def test_matches_brute_force_across_blocks(self, data):
+        """Test exact results when the corpus spans several blocks and adds."""
+        vectors, queries = data
+        index = NumpyFlatIndex(32, block_size=128)
+        index.add(vectors[:300])
+        index.add(vectors[300:])
+
+        D, I = index.search(queries, 10)
+        expected_D, expected_I = brute_force(vectors, queries, 10)
+        assert index.ntotal == 1000
+        assert (I == expected_I).all()
+        assert np.allclose(D, expected_D, rtol=1e-4, atol=1e-3)
+
+    def test_k_larger_than_corpus(self, data):
+        """Test FAISS-style padding when fewer than k vectors exist."""
+        vectors, queries = data
+        index = NumpyFlatIndex(32)
+        index.add(vectors[:3])
+
+        D, I = index.search(queries[:1], 5)
+        assert list(I[0, 3:]) == [-1, -1]
+        assert np.isinf(D[0, 3:]).all()
+        assert sorted(I[0, :3]) == [0, 1, 2]
+
+    def test_empty_index(self, data):
+        """Test searching an index without vectors."""
+        _, queries = data
+        D, I = NumpyFlatIndex(32).search(queries, 3)
+        assert (I == -1).all()
+
+    def test_concurrent_searches(self, data):
+        """Test that coalesced concurrent searches return each caller's own results."""
+        vectors, queries = data
+        index = NumpyFlatIndex(32, block_size=128)
+        index.add(vectors)
+        _, expected_I = brute_force(vectors, queries, 4)
+
+        results = {}
+        def search(i):
+            results[i] = index.search(queries[i % len(queries)], 4)[1]
+        threads = [threading.Thread(target=search, args=(i,)) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, found in results.items():
+            assert (found[0] == expected_I[i % len(queries)]).all()
+        assert index.get_stats()['searches'] == 32
+
+class TestQuantizedFlatIndex:
+    @pytest.fixture
+    def store(self, tmp_path):
+        """Memory-mapped vector store with a random corpus."""
+        rng = np.random.default_rng(1)
+        store = VectorStore(32, str(tmp_path / "vectors.f32"))
+        store.append(rng.standard_normal((500, 32), dtype=np.float32))
+        return store
+
+    @pytest.mark.parametrize("kind", ["float16", "int8"])
+    def test_rescoring_matches_exact_search(self, store, kind):
+        """Test that re-scored results match exact float32 search."""
+        vectors = store.view(0, len(store))
+        queries = np.random.default_rng(2).standard_normal((5, 32), dtype=np.float32)
+        index = QuantizedFlatIndex(32, store, kind=kind, rescore_factor=8)
+        index.add(vectors)
+
+        D, I = index.search(queries, 5)
+        expected_D, expected_I = brute_force(np.asarray(vectors), queries, 5)
+        assert (I == expected_I).all()
+        assert np.allclose(D, expected_D, rtol=1e-4, atol=1e-3)
+        assert index.bytes_per_vector < 32 * 4
+
+    def test_int8_range_widens_on_add(self, tmp_path):
+        """Test that codes are re-encoded when new vectors fall outside the range."""
+        store = VectorStore(4, str(tmp_path / "vectors.f32"))
+        index = QuantizedFlatIndex(4, store, kind="int8")
+        small = np.full((2, 4), 0.1, dtype=np.float32)
+        large = np.full((1, 4), 100.0, dtype=np.float32)
+        for batch in (small, large):
+            store.append(batch)
+            index.add(batch)
+
+        assert index.get_stats()["retrains"] == 1
+        assert np.allclose(index.reconstruct_n(0, 3), store.view(0, 3), atol=0.5)
+
+    def test_unknown_kind(self, store):
+        """Test that unsupported storage kinds are rejected."""
+        with pytest.raises(ValueError):
+            QuantizedFlatIndex(32, store, kind="int4")
+
+class TestVectorStore:
+    def test_append_reopen_and_truncate(self, tmp_path):
+        """Test that vectors persist across reopen and truncate drops uncommitted rows."""
+        path = str(tmp_path / "vectors.f32")
+        vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+        VectorStore(4, path).append(vectors)
+
+        store = VectorStore(4, path)
+        assert len(store) == 3
+        assert store.nbytes == 0
+        store.truncate(2)
+        assert np.array_equal(VectorStore(4, path).view(0, 3), vectors[:2])
+
+class TestDimensionReduction:
+    @pytest.fixture
+    def low_rank(self):
+        """Vectors of dimension 32 lying in an 8-dimensional subspace."""
+        rng = np.random.default_rng(3)
+        basis = rng.standard_normal((8, 32), dtype=np.float32)
+        return rng.standard_normal((400, 8), dtype=np.float32) @ basis + 5.0
+
+    def test_pca_preserves_distances_in_subspace(self, low_rank):
+        """Test that PCA to the intrinsic dimension keeps pairwise distances."""
+        reducer = DimensionReducer("pca", 32, 8).fit(low_rank)
+        reduced = reducer.transform(low_rank[:10])
+        original = np.linalg.norm(low_rank[0] - low_rank[1:10], axis=1)
+        projected = np.linalg.norm(reduced[0] - reduced[1:10], axis=1)
+        assert np.allclose(original, projected, rtol=1e-3)
+        assert reducer.explained_variance == pytest.approx(1.0)
+
+    def test_truncate_and_save_load(self, low_rank, tmp_path):
+        """Test truncation and the persisted reducer round trip."""
+        path = str(tmp_path / "reducer.npz")
+        reducer = DimensionReducer("pca", 32, 4).fit(low_rank)
+        reducer.save(path)
+        assert np.allclose(DimensionReducer.load(path).transform(low_rank), reducer.transform(low_rank))
+
+        truncate = DimensionReducer("truncate", 32, 4)
+        assert truncate.fitted
+        assert np.array_equal(truncate.transform(low_rank), low_rank[:, :4])
+
+    def test_invalid_target_dimension(self):
+        """Test that the target dimension must be smaller than the input."""
+        with pytest.raises(ValueError):
+            DimensionReducer("pca", 32, 32)
+
+    def test_reduced_index_rescoring(self, low_rank):
+        """Test that re-scoring in full dimension returns exact neighbours."""
+        store = VectorStore(32)
+        store.append(low_rank)
+        reducer = DimensionReducer("truncate", 32, 4)
+        index = ReducedIndex(NumpyFlatIndex(4), reducer, store, rescore_factor=100)
+        index.add(low_rank)
+
+        queries = low_rank[:3] + 0.01
+        _, I = index.search(queries, 5)
+        _, expected_I = brute_force(low_rank, queries, 5)
+        assert (I == expected_I).all()
+
+class TestMMR:
+    def test_lambda_one_keeps_relevance_order(self):
+        """Test that lambda 1 ranks candidates by cosine similarity to the query."""
+        rng = np.random.default_rng(4)
+        candidates = rng.standard_normal((20, 8), dtype=np.float32)
+        query = rng.standard_normal(8, dtype=np.float32)
+        cosine = candidates @ query / np.linalg.norm(candidates, axis=1)
+        assert list(mmr_select(query, candidates, 5, 1.0)) == list(np.argsort(-cosine)[:5])
+
+    def test_skips_near_duplicates(self):
+        """Test that near-identical candidates are not picked twice."""
+        base = np.eye(4, dtype=np.float32)
+        candidates = np.vstack([base[0], base[0] + 1e-3, base[0] + 2e-3, base[1] + 0.5 * base[0]])
+        query = base[0]
+        assert list(mmr_select(query, candidates, 2, 1.0)) == [0, 1]
+        assert list(mmr_select(query, candidates, 2, 0.3)) == [0, 3]
+
+    def test_k_larger_than_candidates(self):
+        """Test that every candidate is returned once when k exceeds their number."""
+        candidates = np.random.default_rng(5).standard_normal((3, 4), dtype=np.float32)
+        assert sorted(mmr_select(candidates[0], candidates, 10)) == [0, 1, 2]
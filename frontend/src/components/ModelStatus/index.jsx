@@ -24,9 +24,11 @@ function ModelStatus() {
       const response = await fetch('/api/model/status');
       const data = await response.json();
       
+      // `state` is the background loader stage (downloading, loading_shards, quantizing, warming, ready, error)
+      const ready = data.state ? data.state === 'ready' : data.model_loaded;
       setStatus({
-        state: data.model_loaded ? 'ready' : data.error ? 'error' : 'loading',
-        message: data.message || '',
+        state: ready ? 'ready' : data.error || data.state === 'error' ? 'error' : 'loading',
+        message: data.message || data.state || '',
         details: {
           device: data.device || 'unknown',
           memoryUsage: data.memory_usage || {},
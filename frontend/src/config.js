@@ -15,7 +15,7 @@ export const MODEL_CONFIG = {
 
 // File upload configuration
 export const UPLOAD_CONFIG = {
-    maxFileSize: 10 * 1024 * 1024, // 10MB
+    maxFileSize: 1024 * 1024 * 1024, // 1GB
     allowedTypes: ['.pdf', '.txt', '.doc', '.docx'],
     maxConcurrent: 5
 };
@@ -37,7 +37,7 @@ import {
 import axios from '../../services/axios';
 
 const SUPPORTED_TYPES = ['.pdf', '.txt', '.doc', '.docx'];
-const FILE_SIZE_LIMIT = 10 * 1024 * 1024; // 10MB
+const FILE_SIZE_LIMIT = 1024 * 1024 * 1024; // 1GB
 
 const steps = [
   'Upload Documents',
@@ -419,25 +419,14 @@ function RAGPipeline() {
     setError('');
     
     try {
-      const response = await axios.post('/rag/query', {
+      const response = await axios.post('/rag/answer', {
         query,
-        config
+        temperature: config.temperature,
+        max_new_tokens: config.maxTokens
       });
       
       setResults(response.data.results);
-      
-      const llmResponse = await axios.post('/prompt/generate', {
-        prompt: query,
-        config: {
-          temperature: config.temperature,
-          maxTokens: config.maxTokens
-        },
-        context: {
-          documents: response.data.results.map(r => r.text).join('\n\n')
-        }
-      });
-      
-      setResponse(llmResponse.data.response);
+      setResponse(response.data.answer);
     } catch (error) {
       setError(error.response?.data?.error || error.message || 'Error processing query');
     } finally {